@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Memory used by simulation building blocks, in bytes per instance.
+
+    python -m benchmarks.memory [number_of_instances]
+
+Allocations are measured with tracemalloc while creating N instances of
+each block, so everything the object holds (dict, arrays...) is counted.
+Each block is compared with the same class without __slots__.
+"""
+import sys
+import tracemalloc
+
+from ddcsequences.simulate.system import (
+    Dampening,
+    ValueCommandElement,
+    MixInputElement,
+    FlexibleInput,
+    ADD,
+    MIX,
+    LINEAR,
+    TRANSIENT,
+)
+
+
+def _dampening(cls):
+    d = cls(tau=10)
+    d.rise()
+    return d
+
+
+# name -> (class, factory building an instance of a given class)
+BLOCKS = {
+    "Dampening (after rise)": (Dampening, _dampening),
+    "ValueCommandElement": (ValueCommandElement, lambda cls: cls(20, 50)),
+    "MixInputElement": (MixInputElement, lambda cls: cls(20, 50)),
+    "FlexibleInput": (FlexibleInput, lambda cls: cls(20)),
+    "ADD": (ADD, lambda cls: cls([1, 2])),
+    "MIX": (
+        MIX,
+        lambda cls: cls([MixInputElement(-20, 10), MixInputElement(21, 90)]),
+    ),
+    "LINEAR": (LINEAR, lambda cls: cls(ValueCommandElement(0, 100), delta_max=20)),
+    "TRANSIENT": (
+        TRANSIENT,
+        lambda cls: cls(ValueCommandElement(0, 100), delta_max=20),
+    ),
+}
+
+
+def unslotted(cls):
+    """
+    Subclass of cls without __slots__ : slot names are shadowed by class
+    attributes, so the instance keeps its attributes in a __dict__ as
+    before. The slots of cls are still reserved (empty, 8 bytes each).
+    """
+    names = set()
+    for klass in cls.__mro__:
+        slots = getattr(klass, "__slots__", ())
+        names.update([slots] if isinstance(slots, str) else slots)
+    return type(cls.__name__, (cls,), dict.fromkeys(names))
+
+
+def bytes_per_instance(factory, n):
+    # classes and caches created by a first instance are not counted
+    factory()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [factory() for _ in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # the list holding the instances is not part of the cost
+    total -= sys.getsizeof(keep)
+    return total / n
+
+
+def main(n=2000):
+    """
+    Bytes per instance of every block, and of its unslotted equivalent
+    (nested elements keep their slots)
+    """
+    print("{:<25}{:>12}{:>12}{:>10}".format("Block", "slots", "no slots", "saved"))
+    for name, (cls, factory) in BLOCKS.items():
+        slotted = bytes_per_instance(lambda: factory(cls), n)
+        plain = unslotted(cls)
+        dynamic = bytes_per_instance(lambda: factory(plain), n)
+        print(
+            "{:<25}{:>12.0f}{:>12.0f}{:>9.0f}%".format(
+                name, slotted, dynamic, 100 * (1 - slotted / dynamic)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
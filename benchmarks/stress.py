@@ -0,0 +1,297 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Load generator : N simulated controllers x M points, to find where the
+framework falls over.
+
+    python -m benchmarks.stress --controllers 4 --points 200 --duration 60
+    python -m benchmarks.stress --hosts process --output stress.jsonl
+
+Each controller is a BAC0 lite device on its own local port, holding M
+generated objects : M / 2 valves, each with a command (AO) and a leaving
+temperature (AI). Every valve is bound to a simulated Valve equipment
+(command as input, temperature published with match_value), as
+build.create_equip does from a config.
+
+hosts "thread" runs the controllers in this process (their bacpypes
+threads compete with the test), "process" runs them in another process.
+
+Every tick (--period), <changes> random commands are written, every
+equipment takes a snapshot and <waits> pending conditions are polled
+(ConditionEngine). The report gives tick duration and lateness, write
+throughput and latency, poll time, CPU and memory. With --output, the
+report is appended as a JSON line, to follow the limits over time.
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # not on Windows
+    resource = None
+
+from ddcsequences import infos
+from ddcsequences.conditions import ConditionEngine
+from ddcsequences.simulate.build import create_equip
+from ddcsequences.simulate.equipment import Equipment
+
+FIRST_PORT = 47809
+FIRST_DEVICE_ID = 3000
+
+
+def object_names(points):
+    """
+    (command, temperature) names of every valve of a controller
+    """
+    return [("V{}-O".format(i), "V{}-T".format(i)) for i in range(points // 2)]
+
+
+def start_controller(index, points):
+    """
+    BAC0 lite device with the generated objects of one controller
+    """
+    import BAC0
+    from BAC0.core.devices.create_objects import create_AI, create_AO
+
+    device = BAC0.lite(port=FIRST_PORT + index, deviceId=FIRST_DEVICE_ID + index)
+    for i, (command, temperature) in enumerate(object_names(points)):
+        ao = create_AO(oid=i + 1, name=command, pv=0)
+        ao.description = "Valve {} command".format(i)
+        ai = create_AI(oid=i + 1, name=temperature, pv=20)
+        ai.description = "Valve {} leaving temperature".format(i)
+        device.this_application.add_object(ao)
+        device.this_application.add_object(ai)
+    return device
+
+
+def _address(device, index):
+    return (
+        "{}:{}".format(device.localIPAddr.addrTuple[0], FIRST_PORT + index),
+        device.Boid,
+    )
+
+
+def _host(controllers, points, ready, stop):
+    # target of the process holding the controllers (hosts="process")
+    devices = [start_controller(i, points) for i in range(controllers)]
+    ready.send([_address(device, i) for i, device in enumerate(devices)])
+    stop.wait()
+    for device in devices:
+        device.disconnect()
+
+
+def _stats(values):
+    values = np.asarray(values, dtype="float64")
+    if not len(values):
+        return {"mean": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "mean": float(values.mean()),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StressTest(object):
+    """
+    :controllers: (int) number of controllers
+    :points: (int) objects per controller
+    :hosts: (str) "thread" or "process", where the controllers run
+    :seed: (int) random command changes
+    """
+
+    HOSTS = ("thread", "process")
+
+    def __init__(self, controllers=1, points=20, hosts="thread", seed=None):
+        if hosts not in StressTest.HOSTS:
+            raise ValueError("Provide hosts as one of {}".format(StressTest.HOSTS))
+        self.controllers = controllers
+        self.points = points
+        self.hosts = hosts
+        self.random = random.Random(seed)
+        self.network = None
+        self.devices = []
+        self.equipments = []
+        self.inputs = []
+        self.outputs = []
+        self._hosted = []
+        self._process = None
+
+    def start(self):
+        """
+        Start the controllers, connect to them and bind the equipments
+        """
+        import BAC0
+
+        if self.hosts == "process":
+            context = multiprocessing.get_context("spawn")
+            parent, child = context.Pipe(duplex=False)
+            self._stop = context.Event()
+            self._process = context.Process(
+                target=_host,
+                args=(self.controllers, self.points, child, self._stop),
+                daemon=True,
+            )
+            self._process.start()
+            addresses = parent.recv()
+        else:
+            self._hosted = [
+                start_controller(i, self.points) for i in range(self.controllers)
+            ]
+            addresses = [_address(device, i) for i, device in enumerate(self._hosted)]
+
+        self.network = BAC0.lite()
+        for index, (address, boid) in enumerate(addresses):
+            self.bind(index, BAC0.device(address, boid, self.network, poll=0))
+        return self
+
+    def bind(self, index, device):
+        """
+        Valve equipments of one controller, as a config would create them
+        """
+        self.devices.append(device)
+        for command, temperature in object_names(self.points):
+            config = {
+                "class": "Valve",
+                "description": "Stress valve",
+                "statics": {"entering_temp": 20, "delta_T": 20, "tau": 5},
+                "inputs": {"modulation": command},
+                "outputs": {"leaving_temp": temperature},
+            }
+            name = "C{}.{}".format(index, command[:-2])
+            self.equipments.append(create_equip(device, config, name=name))
+            self.inputs.append((device, command))
+            self.outputs.append(device[temperature])
+
+    def run(self, duration=60, period=1, changes=10, waits=0):
+        """
+        Drive the plant for <duration> seconds, returns the report (dict)
+        """
+        engine = ConditionEngine(period=period)
+        for point in self.random.sample(self.outputs, min(waits, len(self.outputs))):
+            # never met : polled on every tick
+            engine.wait_for_value_gt(point, float("inf"), timeout=duration * 2)
+
+        ticks, lateness, writes, polls = [], [], [], []
+        cpu, start = time.process_time(), time.monotonic()
+        scheduled = start
+        while time.monotonic() - start < duration:
+            began = time.monotonic()
+            lateness.append(began - scheduled)
+            for device, name in self.random.sample(
+                self.inputs, min(changes, len(self.inputs))
+            ):
+                written = time.monotonic()
+                device[name] = self.random.uniform(0, 100)
+                writes.append(time.monotonic() - written)
+            for equipment in self.equipments:
+                equipment.snapshot()
+            if engine.pending:
+                polled = time.monotonic()
+                engine.poll()
+                polls.append(time.monotonic() - polled)
+            ended = time.monotonic()
+            ticks.append(ended - began)
+            scheduled += period
+            time.sleep(max(0, scheduled - ended))
+        elapsed = time.monotonic() - start
+
+        return {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "version": infos.__version__,
+            "hosts": self.hosts,
+            "controllers": self.controllers,
+            "points": self.points * self.controllers,
+            "equipments": len(self.equipments),
+            "waits": len(engine.pending),
+            "period": period,
+            "ticks": len(ticks),
+            "tick": _stats(ticks),
+            "lateness": _stats(lateness),
+            "writes": len(writes),
+            "writes_per_second": len(writes) / elapsed,
+            "write": _stats(writes),
+            "poll": _stats(polls),
+            "cpu_percent": 100 * (time.process_time() - cpu) / elapsed,
+            "max_rss_mb": _max_rss_mb(),
+        }
+
+    def stop(self):
+        for device in self.devices:
+            device.disconnect()
+        if self.network is not None:
+            self.network.disconnect()
+        for device in self._hosted:
+            device.disconnect()
+        if self._process is not None:
+            self._stop.set()
+            self._process.join(10)
+        for equipment in self.equipments:
+            Equipment.defined.pop(equipment.id, None)
+        self.devices, self.equipments, self.inputs, self.outputs = [], [], [], []
+
+
+def show(report):
+    print(
+        "{controllers} controllers ({hosts}), {points} points, "
+        "{equipments} equipments, {waits} waits".format(**report)
+    )
+    print("{:<12}{:>12}{:>12}{:>12}".format("ms", "mean", "p99", "max"))
+    for name in ("tick", "lateness", "write", "poll"):
+        stats = report[name]
+        print(
+            "{:<12}{:>12.2f}{:>12.2f}{:>12.2f}".format(
+                name, 1000 * stats["mean"], 1000 * stats["p99"], 1000 * stats["max"]
+            )
+        )
+    print("writes/s    {:>12.1f}".format(report["writes_per_second"]))
+    print("cpu %       {:>12.1f}".format(report["cpu_percent"]))
+    if report["max_rss_mb"] is not None:
+        print("max rss MB  {:>12.1f}".format(report["max_rss_mb"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--controllers", type=int, default=1)
+    parser.add_argument("--points", type=int, default=20, help="per controller")
+    parser.add_argument("--hosts", choices=StressTest.HOSTS, default="thread")
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--period", type=float, default=1, help="tick, seconds")
+    parser.add_argument("--changes", type=int, default=10, help="writes per tick")
+    parser.add_argument("--waits", type=int, default=0, help="pending conditions")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="append the report to this JSON lines file")
+    args = parser.parse_args()
+
+    test = StressTest(args.controllers, args.points, args.hosts, args.seed)
+    try:
+        test.start()
+        report = test.run(args.duration, args.period, args.changes, args.waits)
+    finally:
+        test.stop()
+    show(report)
+    if args.output:
+        with open(args.output, "a") as file:
+            file.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Accuracy of the TRANSIENT engines versus the step size.
+
+    python -m benchmarks.transient_accuracy
+
+A command profile (steps at known times) drives two TRANSIENT on the same
+VirtualClock, one per engine. For each step size h, the outputs are read
+every h seconds and compared with the continuous first-order response of
+the same profile.
+
+- dampening : the current model, superposition of Dampening curves
+  (1000 points grid, integer seconds, snapped to 1 above 0.99). It reads
+  the wall clock (system.dt), replaced here by a datetime following the
+  VirtualClock.
+- lag : the "lag" engine, one state advanced with exp(-h/tau)
+
+Both engines see a change only when the output is read, so the reference
+applies each step at the first read following it.
+"""
+
+import math
+from datetime import datetime, timedelta
+
+from ddcsequences.simulate import system
+from ddcsequences.simulate.system import TRANSIENT, ValueCommandElement
+from ddcsequences.tools import VirtualClock
+
+TAU = 10
+DELTA_MAX = 20
+DURATION = 240
+# (time in seconds, command in %)
+PROFILE = [(0, 100), (60, 30), (120, 80), (180, 0)]
+STEPS = [0.1, 0.5, 1, 2, 5, 10, 20]
+
+
+def command_at(t):
+    command = 0
+    for start, value in PROFILE:
+        if t >= start:
+            command = value
+    return command
+
+
+def ticks(h):
+    n = int(round(DURATION / h))
+    return [i * h for i in range(n + 1)]
+
+
+def changes(h):
+    """
+    (time seen, delta offset) of every command change, read every h seconds
+    """
+    _changes = []
+    last = 0
+    for t in ticks(h):
+        command = command_at(t)
+        if command != last:
+            _changes.append((t, (command - last) / 100 * DELTA_MAX))
+            last = command
+    return _changes
+
+
+def continuous(t, _changes):
+    return sum(
+        delta * (1 - math.exp(-(t - t0) / TAU)) for t0, delta in _changes if t >= t0
+    )
+
+
+def virtual_datetime(clock):
+    """
+    datetime class whose now() follows <clock>
+    """
+    origin = datetime(2020, 1, 1)
+
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return origin + timedelta(seconds=clock.time())
+
+    return VirtualDatetime
+
+
+def engines(h):
+    """
+    Outputs of a TRANSIENT of each engine, read every h seconds
+    """
+    clock = VirtualClock()
+    transients = {}
+    for engine in TRANSIENT.ENGINES:
+        element = ValueCommandElement(0, 0)
+        transients[engine] = (
+            element,
+            TRANSIENT(
+                element, delta_max=DELTA_MAX, tau=TAU, engine=engine, clock=clock.time
+            ),
+        )
+    result = {engine: [] for engine in transients}
+    wall, system.dt = system.dt, virtual_datetime(clock)
+    try:
+        for t in ticks(h):
+            clock.now = t
+            for engine, (element, transient) in transients.items():
+                element["command"] = command_at(t)
+                result[engine].append(transient.output)
+    finally:
+        system.dt = wall
+    return result
+
+
+def main():
+    print("tau = {} s, delta_max = {}".format(TAU, DELTA_MAX))
+    print("{:>8}{:>18}{:>18}".format("h (s)", "dampening max err", "lag max err"))
+    for h in STEPS:
+        _changes = changes(h)
+        reference = [continuous(t, _changes) for t in ticks(h)]
+        outputs = engines(h)
+        err_damp = max(abs(a - b) for a, b in zip(outputs["dampening"], reference))
+        err_lag = max(abs(a - b) for a, b in zip(outputs["lag"], reference))
+        print("{:>8}{:>18.4f}{:>18.2e}".format(h, err_damp, err_lag))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Cache between a sequence and its BAC0 device.
+
+Sequences and logging helpers resolve the same points and read the same
+values many times per step (controller["ZN-T"], point.value for the test,
+again for the log message, properties.name and description for var_name).
+A CachedDevice keeps :
+
+- point handles and their static properties (name, description, type,
+  units_state), for ever
+- present values (value, enumValue, boolValue), for <ttl> seconds
+
+Writes made through the cache (device[name] = value, point.write(),
+_set(), out_of_service(), release()) forget the cached value of the point.
+
+    controller = CachedDevice(bacnet_device, ttl=1)
+    AHU(controller)
+"""
+
+import operator
+
+from . import tools
+
+# Reads answered from the cache while they are not older than ttl
+READS = ("value", "enumValue", "boolValue")
+# Operations changing the point, the cached value is forgotten
+WRITES = ("write", "_set", "out_of_service", "release")
+PROPERTIES = ("name", "description", "type", "units_state")
+COMPARISONS = ("__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__")
+ARITHMETIC = (
+    "__add__",
+    "__radd__",
+    "__sub__",
+    "__rsub__",
+    "__mul__",
+    "__rmul__",
+    "__truediv__",
+    "__rtruediv__",
+)
+
+
+class _Properties(object):
+    """
+    Static properties of a point, read once. device is the cache so notes
+    made through point.properties.device reach the device.
+    """
+
+    def __init__(self, device, properties):
+        self.device = device
+        for name in PROPERTIES:
+            setattr(self, name, getattr(properties, name, None))
+
+
+def _make_read(op):
+    return property(lambda self: self._read(op))
+
+
+def _make_comparison(op):
+    compare = getattr(operator, op.strip("_"))
+
+    def comparison(self, other):
+        return compare(self._operand(other), other)
+
+    comparison.__name__ = op
+    return comparison
+
+
+def _make_arithmetic(op):
+    name = op.strip("_")
+    reflected = name.startswith("r")
+    calculate = getattr(operator, name[1:] if reflected else name)
+
+    def arithmetic(self, other):
+        if isinstance(other, CachedPoint):
+            other = other.value
+        if reflected:
+            return calculate(other, self.value)
+        return calculate(self.value, other)
+
+    arithmetic.__name__ = op
+    return arithmetic
+
+
+def _make_write(op):
+    def write(self, *args, **kwargs):
+        self.device.invalidate(self.name)
+        return getattr(self.point, op)(*args, **kwargs)
+
+    write.__name__ = op
+    return write
+
+
+class CachedPoint(object):
+    """
+    Handle of a point of a CachedDevice. Anything not cached is passed to
+    the BAC0 point (history, lastValue, match_value...).
+    """
+
+    __hash__ = object.__hash__
+
+    def __init__(self, device, name, point):
+        self.device = device
+        self.name = name
+        self.point = point
+        self.properties = _Properties(device, point.properties)
+
+    def _read(self, op):
+        return self.device._read(self.name, op)
+
+    def _operand(self, other):
+        # value the BAC0 point would compare with other
+        kind = self.properties.type or ""
+        if "multiState" in kind and isinstance(other, str):
+            return self.enumValue
+        if "binary" in kind and isinstance(other, bool):
+            return self.boolValue
+        return self.value
+
+    def __getattr__(self, name):
+        return getattr(self.point, name)
+
+    def __repr__(self):
+        return "CachedPoint({})".format(self.name)
+
+
+for _op in READS:
+    setattr(CachedPoint, _op, _make_read(_op))
+for _op in COMPARISONS:
+    setattr(CachedPoint, _op, _make_comparison(_op))
+for _op in ARITHMETIC:
+    setattr(CachedPoint, _op, _make_arithmetic(_op))
+for _op in WRITES:
+    setattr(CachedPoint, _op, _make_write(_op))
+
+
+class CachedDevice(object):
+    """
+    Proxy around a BAC0 device caching point handles, static properties
+    and present values.
+
+    :param device: BAC0 device
+    :param ttl: float, seconds a present value is reused (0 : always read)
+    :param clock: function giving seconds (default : tools.clock)
+    """
+
+    def __init__(self, device, ttl=1, clock=None):
+        self.device = device
+        self.ttl = ttl
+        self.clock = clock
+        self._points = {}
+        self._values = {}
+        self.reads = 0
+
+    def _now(self):
+        return self.clock() if self.clock else tools.clock.time()
+
+    def _read(self, name, op):
+        now = self._now()
+        try:
+            read_at, value = self._values[(name, op)]
+            if now - read_at < self.ttl:
+                return value
+        except KeyError:
+            pass
+        value = getattr(self[name].point, op)
+        self.reads += 1
+        self._values[(name, op)] = (now, value)
+        return value
+
+    def invalidate(self, name=None):
+        """
+        Forget the cached values of point <name>, or of every point
+        """
+        if name is None:
+            self._values.clear()
+        else:
+            for op in READS:
+                self._values.pop((name, op), None)
+
+    def read_multiple(self, points_list, **kwargs):
+        # values read by the batch replace the cached ones
+        for name in points_list:
+            self.invalidate(name)
+        return self.device.read_multiple(points_list, **kwargs)
+
+    def __getitem__(self, name):
+        try:
+            return self._points[name]
+        except KeyError:
+            point = CachedPoint(self, name, self.device[name])
+            self._points[name] = point
+            return point
+
+    def __setitem__(self, name, value):
+        self.invalidate(name)
+        self.device[name] = value
+
+    def __contains__(self, name):
+        return name in self._points or name in self.device
+
+    def note(self, note):
+        return self.device.note(note)
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
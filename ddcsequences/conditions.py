@@ -0,0 +1,351 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Wait for many conditions at once, reading each device once per cycle.
+
+The wait and check helpers of tools read their point every 2 seconds,
+one request per point. A ConditionEngine keeps every pending condition :
+on each cycle, the points are grouped by device and read with one
+ReadPropertyMultiple per device, then every condition is tested against
+the values of that read. Requests per cycle follow the number of
+devices, not the number of points.
+
+    engine = ConditionEngine()
+    engine.wait_for_state(controller["ZNT-STATE"], "Heating", timeout=600)
+    engine.wait_for_value_gt(controller["HTG-O"], 0)
+    engine.check_that(controller["SF-C"], True)
+    engine.run()
+
+read_values() gives the same batched read to code needing many points at
+once (ex. counting stages).
+"""
+
+import numpy as np
+
+from . import tools
+from .simulate.adapters import BinaryAdapter
+
+
+def read_values(points):
+    """
+    Present value of every point, with one read per device
+    (device.read_multiple). Points of devices without read_multiple
+    (simulated, recorded or replayed) are read one by one.
+
+    :param points: list of BAC0.point
+    :returns: list of values, in the order of points
+    """
+    devices = {}
+    for point in points:
+        device = point.properties.device
+        _device, _points = devices.setdefault(id(device), (device, {}))
+        _points[id(point)] = point
+
+    values = {}
+    for device, _points in devices.values():
+        read_multiple = getattr(device, "read_multiple", None)
+        if read_multiple is None:
+            for key, point in _points.items():
+                values[key] = point.value
+            continue
+        read_multiple([point.properties.name for point in _points.values()])
+        for key, point in _points.items():
+            values[key] = point.lastValue
+    return [values[id(point)] for point in points]
+
+
+def state_of(point, value):
+    """
+    Value from read_values as the helpers compare it : text of the state
+    of a multistate point, boolean of a binary point.
+    """
+    try:
+        kind = point.properties.type
+    except AttributeError:
+        return value
+    if "multiState" in kind and isinstance(value, int):
+        return point.properties.units_state[value - 1]
+    if "binary" in kind:
+        # same states as the simulated equipments ("1: active"...)
+        return BinaryAdapter._states.get(value, value)
+    return value
+
+
+class Condition(object):
+    """
+    A test made on the value of a point until it succeeds or times out.
+
+    :param point: BAC0.point
+    :param test: function of the value read, True when the condition is met
+    :param description: str completing the note on success (ex. "is 20")
+    :param expected: value shown in the timeout message
+    :param callback: function (optional) called on success
+    :param timeout: float
+    :param log_only: bool, when False, a timeout raises TimeoutError
+    """
+
+    def __init__(
+        self,
+        point,
+        test,
+        description,
+        expected,
+        *,
+        callback=None,
+        timeout=90,
+        log_only=True
+    ):
+        self.point = point
+        self.test = test
+        self.description = description
+        self.expected = expected
+        self.callback = callback
+        self.timeout = timeout
+        self.log_only = log_only
+        self.deadline = None
+        self.value = None
+        self.success = None
+        # set by the test when the condition can no longer succeed
+        self.failed = False
+
+    def __repr__(self):
+        return "{} {}".format(tools.var_name(self.point), self.description)
+
+
+class ConditionEngine(object):
+    """
+    Pending conditions, all evaluated from one batched read per cycle.
+
+    :param period: float, seconds between two cycles
+    """
+
+    def __init__(self, period=2):
+        self.period = period
+        self.pending = []
+        self.done = []
+
+    def add(self, condition):
+        condition.deadline = tools.clock.time() + condition.timeout
+        self.pending.append(condition)
+        return condition
+
+    def wait_for_state(
+        self, point, state, *, callback=None, timeout=180, log_only=True
+    ):
+        return self.add(
+            Condition(
+                point,
+                lambda value: value == state,
+                "is now in state {}".format(state),
+                state,
+                callback=callback,
+                timeout=timeout,
+                log_only=log_only,
+            )
+        )
+
+    def wait_for_state_not(
+        self, point, state, *, callback=None, timeout=180, log_only=True
+    ):
+        return self.add(
+            Condition(
+                point,
+                lambda value: value != state,
+                "left state {}".format(state),
+                "not {}".format(state),
+                callback=callback,
+                timeout=timeout,
+                log_only=log_only,
+            )
+        )
+
+    def wait_for_value_gt(
+        self, point, value, *, callback=None, timeout=90, maximum=None, log_only=True
+    ):
+        return self.add(
+            Condition(
+                point,
+                lambda _value: _value > value or (maximum and _value == maximum),
+                "is greater than {} (or has reached maximum value)".format(value),
+                "> {}".format(value),
+                callback=callback,
+                timeout=timeout,
+                log_only=log_only,
+            )
+        )
+
+    def wait_for_value_lt(
+        self, point, value, *, callback=None, timeout=90, minimum=None, log_only=True
+    ):
+        return self.add(
+            Condition(
+                point,
+                lambda _value: _value < value or (minimum and _value == minimum),
+                "is less than {} (or has reached minimum value)".format(value),
+                "< {}".format(value),
+                callback=callback,
+                timeout=timeout,
+                log_only=log_only,
+            )
+        )
+
+    def check_that(self, point, value, *, callback=None, timeout=90, log_only=True):
+        return self.add(
+            Condition(
+                point,
+                lambda _value: _value == value,
+                "is {}".format(value),
+                value,
+                callback=callback,
+                timeout=timeout,
+                log_only=log_only,
+            )
+        )
+
+    def check_isclose(
+        self,
+        point,
+        value,
+        *,
+        rtol=1e-02,
+        atol=1e-02,
+        callback=None,
+        timeout=90,
+        log_only=True
+    ):
+        return self.add(
+            Condition(
+                point,
+                lambda _value: np.isclose(_value, value, rtol=rtol, atol=atol),
+                "is close to {}".format(value),
+                value,
+                callback=callback,
+                timeout=timeout,
+                log_only=log_only,
+            )
+        )
+
+    def detect_rise(
+        self,
+        point,
+        *,
+        maximum=None,
+        callback=None,
+        timeout=300,
+        log_only=True,
+        confidence=0.99
+    ):
+        """
+        Streaming version of tools.detect_rise_in_output : succeeds once a
+        rise is clear or maximum is reached, fails once a drop is clear.
+        """
+        return self._detect(point, 1, maximum, callback, timeout, log_only, confidence)
+
+    def detect_drop(
+        self,
+        point,
+        *,
+        minimum=None,
+        callback=None,
+        timeout=300,
+        log_only=True,
+        confidence=0.99
+    ):
+        """
+        Streaming version of tools.detect_drop_in_output
+        """
+        return self._detect(point, -1, minimum, callback, timeout, log_only, confidence)
+
+    def _detect(self, point, direction, limit, callback, timeout, log_only, confidence):
+        detector = tools.TrendDetector(confidence=confidence)
+        trend = "rising" if direction > 0 else "dropping"
+        condition = Condition(
+            point,
+            None,
+            "is {}".format(trend),
+            trend,
+            callback=callback,
+            timeout=timeout,
+            log_only=log_only,
+        )
+
+        def test(value):
+            if limit is not None and (value - limit) * direction >= 0:
+                return True
+            detector.add(tools.clock.time(), value)
+            found = detector.trend()
+            condition.failed = found == -direction
+            return found == direction
+
+        condition.test = test
+        return self.add(condition)
+
+    def poll(self):
+        """
+        One cycle : read every pending point (one request per device),
+        then test every pending condition. Returns the number of
+        conditions still pending.
+        """
+        if not self.pending:
+            return 0
+        points = [condition.point for condition in self.pending]
+        values = read_values(points)
+        now = tools.clock.time()
+        pending, resolved, timeouts = [], [], []
+        for condition, value in zip(self.pending, values):
+            condition.value = state_of(condition.point, value)
+            device = condition.point.properties.device
+            if condition.test(condition.value):
+                condition.success = True
+                tools.add_note(
+                    device,
+                    "{} {} (value = {})".format(
+                        tools.var_name(condition.point),
+                        condition.description,
+                        condition.value,
+                    ),
+                )
+            elif condition.failed or now > condition.deadline:
+                condition.success = False
+                if condition.failed:
+                    msg = "Failed : {} in wrong state ({} != {})".format(
+                        tools.var_name(condition.point),
+                        condition.value,
+                        condition.expected,
+                    )
+                else:
+                    msg = "Timeout : {} in wrong state ({} != {}) after {} sec".format(
+                        tools.var_name(condition.point),
+                        condition.value,
+                        condition.expected,
+                        condition.timeout,
+                    )
+                tools.add_error(device, msg)
+                if not condition.log_only:
+                    timeouts.append(msg)
+            else:
+                pending.append(condition)
+                continue
+            resolved.append(condition)
+        self.pending = pending
+        self.done.extend(resolved)
+        # callbacks may add conditions, they are polled on the next cycle
+        for condition in resolved:
+            if condition.success and condition.callback is not None:
+                condition.callback()
+        if timeouts:
+            raise TimeoutError("\n".join(timeouts))
+        return len(self.pending)
+
+    def run(self):
+        """
+        Poll until every condition succeeded or timed out.
+        Returns True when all of them succeeded.
+        """
+        while self.poll():
+            tools.clock.sleep(self.period)
+        return all(condition.success for condition in self.done)
@@ -8,11 +8,151 @@
 Functions and objects related to PID testing
 """
 import logging
+from collections import namedtuple
 
+import numpy as np
+import pandas as pd
+
+from . import tools
 from .tools import detect_rise_in_output, detect_drop_in_output, var_name
 
 log = logging.getLogger("sequence.pid")
 
+StepResponse = namedtuple(
+    "StepResponse",
+    [
+        "gain",
+        "time_constant",
+        "dead_time",
+        "overshoot",
+        "settling_time",
+        "kp",
+        "ti",
+        "r2",
+    ],
+)
+StepResponse.__doc__ = """
+First order plus dead time model of a step response, with the measured
+overshoot (%) and settling time (2 % band), and a suggested PI tuning
+(SIMC : tau_c = dead time, kp = tau / (gain (tau_c + dead time)),
+ti = min(tau, 4 (tau_c + dead time))). r2 tells how well the model fits.
+"""
+
+
+def _grid(span, dt, size):
+    dead_times = np.linspace(0, span / 2, size)
+    time_constants = np.geomspace(max(dt, span / 1000), 2 * span, size)
+    return (np.repeat(dead_times, size), np.tile(time_constants, size))
+
+
+def _fit(t, y, dead_times, time_constants):
+    """
+    Least squares of y = a + b f(t) for every candidate f (one per dead
+    time and time constant) at once. a and b have a closed form for each
+    candidate, so the whole grid is a few matrix products.
+
+    :returns: index of the best candidate, a, b, r2 (one per row of y)
+    """
+    elapsed = np.clip(t[None, :] - dead_times[:, None], 0, None)
+    basis = -np.expm1(-elapsed / time_constants[:, None])
+    basis_c = basis - basis.mean(axis=1, keepdims=True)
+    y_c = y - y.mean(axis=1, keepdims=True)
+    s_ff = np.einsum("ij,ij->i", basis_c, basis_c)
+    s_fy = y_c @ basis_c.T
+    s_yy = np.einsum("ij,ij->i", y_c, y_c)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        explained = np.where(s_ff > 0, s_fy**2 / s_ff, 0)
+    best = np.argmax(explained, axis=1)
+    rows = np.arange(len(y))
+    b = s_fy[rows, best] / s_ff[best]
+    a = y.mean(axis=1) - b * basis.mean(axis=1)[best]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(s_yy > 0, explained[rows, best] / s_yy, 1)
+    return best, a, b, r2
+
+
+def fit_fopdt(t, y, step=1, step_time=None, size=60):
+    """
+    Fit a first order plus dead time model on the response y to a step
+    of <step> made at <step_time> :
+
+        y = y0 + gain * step * (1 - exp(-(t - step_time - dead_time) / tau))
+
+    The grid of dead times and time constants is evaluated at once, then
+    refined around the best point. y may hold many responses (one row per
+    loop, same t) fitted together.
+
+    :param t: array of times in seconds
+    :param y: array of values, or 2D array (one row per response)
+    :param step: float or array, size of the step of the input
+    :param step_time: float, time of the step (default : t[0])
+    :param size: int, points of the grid for each parameter
+    :returns: StepResponse (fields are arrays when y is 2D)
+    """
+    t = np.asarray(t, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    single = y.ndim == 1
+    y = np.atleast_2d(y)
+    if len(t) < 3 or y.shape[1] != len(t):
+        raise ValueError("Provide at least 3 samples, as many times as values")
+    step_time = t[0] if step_time is None else step_time
+    t = t - step_time
+    span = t[-1]
+    dt = np.median(np.diff(t))
+
+    dead_times, time_constants = _grid(span, dt, size)
+    best, a, b, r2 = _fit(t, y, dead_times, time_constants)
+    dead_time, tau = dead_times[best], time_constants[best]
+    # finer grid around the best point of each response
+    ratio = (2 * span / max(dt, span / 1000)) ** (1 / (size - 1))
+    for i in range(len(y)):
+        fine_dead = np.linspace(
+            max(0, dead_time[i] - span / 2 / (size - 1)),
+            dead_time[i] + span / 2 / (size - 1),
+            15,
+        )
+        fine_tau = np.geomspace(tau[i] / ratio, tau[i] * ratio, 15)
+        _dead, _tau = np.repeat(fine_dead, 15), np.tile(fine_tau, 15)
+        _best, _a, _b, _r2 = _fit(t, y[i : i + 1], _dead, _tau)
+        if _r2[0] >= r2[i]:
+            dead_time[i], tau[i] = _dead[_best[0]], _tau[_best[0]]
+            a[i], b[i], r2[i] = _a[0], _b[0], _r2[0]
+
+    gain = b / np.asarray(step, dtype="float64")
+    overshoot, settling_time = _performance(t, y)
+    # SIMC tuning, tight control : tau_c = dead time
+    tau_c = np.maximum(dead_time, dt)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kp = tau / (gain * (tau_c + dead_time))
+    ti = np.minimum(tau, 4 * (tau_c + dead_time))
+
+    result = StepResponse(gain, tau, dead_time, overshoot, settling_time, kp, ti, r2)
+    if single:
+        result = StepResponse(*(float(np.asarray(v).ravel()[0]) for v in result))
+    return result
+
+
+def _performance(t, y, band=0.02):
+    """
+    Overshoot (% of the change) and settling time (s after the step) of
+    each response, from the samples after the step
+    """
+    after = t >= 0
+    t, y = t[after], y[:, after]
+    initial = y[:, :1]
+    final = y[:, -max(1, len(t) // 20) :].mean(axis=1, keepdims=True)
+    change = final - initial
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = np.where(change != 0, (y - final) / change, 0)
+    overshoot = np.clip(relative.max(axis=1), 0, None) * 100
+    outside = np.abs(relative) > band
+    # last sample outside the band, settled from the next one
+    last = np.where(
+        outside.any(axis=1), len(t) - 1 - np.argmax(outside[:, ::-1], axis=1), -1
+    )
+    settling_time = np.where(last < 0, 0, t[np.minimum(last + 1, len(t) - 1)])
+    return overshoot, settling_time
+
 
 class PID_Loop:
     """
@@ -34,8 +174,9 @@ class PID_Loop:
         self.offset = offset
         self.direct_acting = direct_acting
         self.name = name
+        self.responses = []
 
-    def validate(self, *, callback=None, timeout=180):
+    def validate(self, *, callback=None, timeout=180, analyze_for=None):
         """
         This function will validate if a PID loop is acting correctly.
         
@@ -95,7 +236,10 @@ class PID_Loop:
         :param name: str (Name of the PID for logging)
         :param callback: function (optional)
         :param timeout: float
-        
+        :param analyze_for: float (optional) seconds to keep trending the output
+                            after each step, then fit its response (see
+                            step_response), kept in responses
+
         """
 
         res = 0
@@ -121,8 +265,10 @@ class PID_Loop:
                 "Setting process value (%s) higher than setpoint (%s)"
                 % (var_name(self.pv), self.setpoint.value)
             )
+            since = pd.Timestamp.now()
             self.pv._set(self.setpoint + self.offset)
             result = detect_rise_in_output(self.output, timeout=300, maximum=100)
+            self._analyze(since, analyze_for)
             if result:
                 log.info(
                     "PID (%s) is working correctly, there has been a rise in the value"
@@ -135,8 +281,10 @@ class PID_Loop:
                 "Setting process value (%s) lower than setpoint (%s)"
                 % (var_name(self.pv), self.setpoint.value)
             )
+            since = pd.Timestamp.now()
             self.pv._set(self.setpoint - self.offset)
             result = detect_drop_in_output(self.output, timeout=300, minimum=0)
+            self._analyze(since, analyze_for)
             if result:
                 log.info(
                     "PID (%s) is working correctly, there has been a drop in the value"
@@ -152,8 +300,10 @@ class PID_Loop:
                 "Setting process value (%s) lower than setpoint (%s)"
                 % (var_name(self.pv), self.setpoint.value)
             )
+            since = pd.Timestamp.now()
             self.pv._set(self.setpoint - self.offset)
             result = detect_rise_in_output(self.output, timeout=300, maximum=100)
+            self._analyze(since, analyze_for)
             if result:
                 log.info(
                     "PID (%s) is working correctly, there has been a rise in the value"
@@ -165,8 +315,10 @@ class PID_Loop:
                 "Setting process value (%s) higher than setpoint (%s)"
                 % (var_name(self.pv), self.setpoint.value)
             )
+            since = pd.Timestamp.now()
             self.pv._set(self.setpoint + self.offset)
             result = detect_drop_in_output(self.output, timeout=300, minimum=0)
+            self._analyze(since, analyze_for)
             if result:
                 log.info(
                     "PID (%s) is working correctly, there has been a drop in the value"
@@ -185,6 +337,48 @@ class PID_Loop:
         if callback is not None:
             callback()
 
+    def _analyze(self, since, analyze_for):
+        if not analyze_for:
+            return
+        tools.clock.sleep(analyze_for)
+        try:
+            response = self.step_response(since)
+        except (AttributeError, IndexError, ValueError, TypeError) as error:
+            log.warning("PID (%s) response not analyzed : %s" % (self.name, error))
+            return
+        self.responses.append(response)
+        log.info(
+            "PID (%s) response : gain %.3g, time constant %.3g s, dead time "
+            "%.3g s, overshoot %.1f %%, settling time %.3g s. Suggested : "
+            "kp %.3g, ti %.3g s"
+            % (
+                self.name,
+                response.gain,
+                response.time_constant,
+                response.dead_time,
+                response.overshoot,
+                response.settling_time,
+                response.kp,
+                response.ti,
+            )
+        )
+
+    def step_response(self, since):
+        """
+        Fit the response of the output to the PV step made at <since>
+        (see fit_fopdt), from the trends (history) of both points.
+
+        :param since: timestamp of the step
+        :returns: StepResponse
+        """
+        output, pv = self.output.history, self.pv.history
+        before, after = pv[pv.index < since], pv[pv.index >= since]
+        step = after.iloc[-1] - before.iloc[-1]
+        # last output value before the step is the start of the response
+        output = output[output.index >= output.index[output.index < since][-1]]
+        t = (output.index - pd.Timestamp(since)).total_seconds().values
+        return fit_fopdt(np.maximum(t, 0), output.values, step=step, step_time=0)
+
 
 class Flow_PID_Loop(PID_Loop):
     """
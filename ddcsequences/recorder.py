@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Record and replay the BACnet I/O of a test sequence.
+
+A RecordingDevice wraps a BAC0 device. Every read, comparison, write and
+note made through it is written with a timestamp to a gzipped JSON lines
+file. A ReplayDevice opens that file and answers the same reads, in the
+same order, without network. Writes are compared with the recorded ones
+and any difference is kept in ReplayDevice.divergences.
+
+    recorder = RecordingDevice(controller, "ahu.rec.gz")
+    AHU(recorder)
+    ...
+    recorder.close()
+
+    device = ReplayDevice("ahu.rec.gz")
+    with device.virtual_time():
+        AHU(device)
+    print(device.divergences)
+"""
+
+import gzip
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from . import tools
+
+log = logging.getLogger("sequence.recorder")
+
+FORMAT_VERSION = 1
+
+# Operations giving a value (answered by the replay)
+READS = ("value", "lastValue", "enumValue", "boolValue")
+OPERATORS = (
+    "__eq__",
+    "__ne__",
+    "__lt__",
+    "__le__",
+    "__gt__",
+    "__ge__",
+    "__add__",
+    "__radd__",
+    "__sub__",
+    "__rsub__",
+    "__mul__",
+    "__rmul__",
+    "__truediv__",
+    "__rtruediv__",
+)
+# Operations acting on the device (checked by the replay)
+WRITES = ("write", "_set", "out_of_service", "release")
+# Operations linking simulation to the device (not checked)
+CALLS = ("match", "match_value")
+PROPERTIES = ("name", "description", "type", "units_state")
+
+
+class ReplayError(Exception):
+    pass
+
+
+def _encode(value):
+    """
+    JSON friendly version of an argument or a result
+    """
+    if isinstance(value, (RecordingPoint, ReplayPoint)):
+        return {"point": value.name}
+    if hasattr(value, "item"):
+        # numpy scalars
+        value = value.item()
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _key(name, op, args):
+    return "{}|{}|{}".format(name, op, json.dumps(args))
+
+
+class _Properties(object):
+    """
+    Static properties of a point, with .device pointing to the proxy so
+    notes made through point.properties.device are recorded too.
+    """
+
+    def __init__(self, device, **properties):
+        self.device = device
+        for k, v in properties.items():
+            setattr(self, k, v)
+
+
+def _make_operator(op):
+    def operator(self, *args):
+        return self._op(op, *args)
+
+    operator.__name__ = op
+    return operator
+
+
+def _make_read(op):
+    return property(lambda self: self._op(op))
+
+
+class _PointProxy(object):
+    """
+    Common interface of RecordingPoint and ReplayPoint. Each operation
+    goes through _op(op, *args).
+    """
+
+    __hash__ = object.__hash__
+
+    def __init__(self, device, name):
+        self.device = device
+        self.name = name
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.name)
+
+
+for _op in READS:
+    setattr(_PointProxy, _op, _make_read(_op))
+for _op in OPERATORS + WRITES + CALLS:
+    setattr(_PointProxy, _op, _make_operator(_op))
+
+
+class RecordingPoint(_PointProxy):
+    def __init__(self, device, name, point):
+        super().__init__(device, name)
+        self.point = point
+        _prop = point.properties
+        self.properties = _Properties(
+            device, **{k: getattr(_prop, k, None) for k in PROPERTIES}
+        )
+        device._record(name, "properties", [], _encode_dict(self.properties))
+
+    def _op(self, op, *args):
+        _args = [a.point if isinstance(a, RecordingPoint) else a for a in args]
+        if op in READS:
+            result = getattr(self.point, op)
+        else:
+            result = getattr(self.point, op)(*_args)
+        self.device._record(self.name, op, [_encode(a) for a in args], result)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.point, name)
+
+
+class ReplayPoint(_PointProxy):
+    def __init__(self, device, name):
+        super().__init__(device, name)
+        self.properties = _Properties(device, **device._next(name, "properties", []))
+
+    def _op(self, op, *args):
+        _args = [_encode(a) for a in args]
+        if op in WRITES:
+            return self.device._check_write(self.name, op, _args)
+        elif op in CALLS:
+            return None
+        return self.device._next(self.name, op, _args)
+
+
+def _encode_dict(properties):
+    return {k: _encode(getattr(properties, k, None)) for k in PROPERTIES}
+
+
+class RecordingDevice(object):
+    """
+    Proxy around a BAC0 device writing every I/O to <filename>.
+    """
+
+    def __init__(self, device, filename):
+        self.device = device
+        self.filename = filename
+        self._file = gzip.open(filename, "wt")
+        self._t0 = time.time()
+        self._points = {}
+        self._write_line({"version": FORMAT_VERSION, "t0": self._t0})
+
+    def _write_line(self, data):
+        self._file.write(json.dumps(data) + "\n")
+
+    def _record(self, name, op, args, result):
+        self._write_line(
+            {
+                "t": round(time.time() - self._t0, 3),
+                "point": name,
+                "op": op,
+                "args": args,
+                "result": _encode(result) if op != "properties" else result,
+            }
+        )
+
+    def __getitem__(self, name):
+        try:
+            return self._points[name]
+        except KeyError:
+            point = RecordingPoint(self, name, self.device[name])
+            self._points[name] = point
+            return point
+
+    def __setitem__(self, name, value):
+        self.device[name] = value
+        self._record(name, "write", [_encode(value)], None)
+
+    def __contains__(self, name):
+        result = name in self.device
+        self._record(name, "contains", [], result)
+        return result
+
+    def note(self, note):
+        self._record(None, "note", [note], None)
+        return self.device.note(note)
+
+    def close(self):
+        self._file.close()
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+
+class ReplayDevice(object):
+    """
+    Device answering reads from a recording. Reads of a point are served in
+    recorded order, the last value being held once the recording is
+    exhausted. Writes differing from the recording are kept in divergences.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.notes = []
+        self.divergences = []
+        self._events = defaultdict(deque)
+        self._last = {}
+        self._points = {}
+        self.duration = 0
+        with gzip.open(filename, "rt") as file:
+            header = json.loads(file.readline())
+            if header.get("version") != FORMAT_VERSION:
+                raise ReplayError("Unsupported recording format : {}".format(header))
+            for line in file:
+                event = json.loads(line)
+                self.duration = event["t"]
+                self._events[_key(event["point"], event["op"], event["args"])].append(
+                    event
+                )
+                if event["op"] in WRITES:
+                    self._events[(event["point"], "writes")].append(event)
+
+    def _next(self, name, op, args):
+        key = _key(name, op, args)
+        try:
+            result = self._events[key].popleft()["result"]
+        except IndexError:
+            try:
+                result = self._last[key]
+            except KeyError:
+                raise ReplayError(
+                    "{} {}{} was not recorded".format(name, op, tuple(args))
+                )
+        self._last[key] = result
+        return result
+
+    def _check_write(self, name, op, args):
+        try:
+            expected = self._events[(name, "writes")].popleft()
+        except IndexError:
+            expected = None
+        if expected is None or expected["op"] != op or expected["args"] != args:
+            divergence = {
+                "point": name,
+                "op": op,
+                "args": args,
+                "expected": expected,
+            }
+            log.warning("Write diverges from recording : {}".format(divergence))
+            self.divergences.append(divergence)
+
+    def __getitem__(self, name):
+        try:
+            return self._points[name]
+        except KeyError:
+            point = ReplayPoint(self, name)
+            self._points[name] = point
+            return point
+
+    def __setitem__(self, name, value):
+        self._check_write(name, "write", [_encode(value)])
+
+    def __contains__(self, name):
+        return self._next(name, "contains", [])
+
+    def note(self, note):
+        self.notes.append(note)
+
+    @contextmanager
+    def virtual_time(self):
+        """
+        Run the wait and check helpers on a VirtualClock (no real waiting)
+        """
+        old = tools.use_clock(tools.VirtualClock())
+        try:
+            yield
+        finally:
+            tools.use_clock(old)
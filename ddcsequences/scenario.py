@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Test sequences described in a YAML (or JSON) file instead of Python.
+
+    name: AHU heating
+    timeout: 180            # default of every step (optional)
+    steps:
+        occupied:
+            write: {OCC-SCHEDULE: Occupied}
+        eff_occ:
+            wait_for_state: [EFF-OCC, Occupied]
+            after: occupied
+        heating_demand:
+            write: {ZN-T: 17}
+        heating:
+            wait_for_state: {point: ZNT-STATE, state: Heating, timeout: 600}
+            after: heating_demand
+        reheat:
+            detect_rise: {point: RH-O, maximum: 100}
+            after: [heating, eff_occ]
+
+Actions : write, note, wait_for_state, wait_for_state_not,
+wait_for_value_gt, wait_for_value_lt, check_that, check_isclose,
+detect_rise, detect_drop. Arguments are a list (positional) or a dict.
+A step starts once every step named in "after" succeeded, a step
+following a failed one is skipped.
+
+A Scenario is validated when it is created (actions, arguments and their
+names, dependencies, cycles). compile() resolves every point once and gives a
+Schedule. Running it, independent branches progress together : their
+waits and checks are conditions of one ConditionEngine, read with one
+request per device per cycle.
+
+    schedule = Scenario.open("ahu_heating.yaml").compile(controller)
+    schedule.run()
+    schedule.results    # step -> True, False or None (skipped)
+"""
+
+import inspect
+import json
+from collections import namedtuple
+
+from yaml import load, FullLoader
+
+from . import tools
+from .conditions import ConditionEngine
+
+# action -> positional arguments, the first one is always a point name
+ACTIONS = {
+    "wait_for_state": ("point", "state"),
+    "wait_for_state_not": ("point", "state"),
+    "wait_for_value_gt": ("point", "value"),
+    "wait_for_value_lt": ("point", "value"),
+    "check_that": ("point", "value"),
+    "check_isclose": ("point", "value"),
+    "detect_rise": ("point",),
+    "detect_drop": ("point",),
+    "write": None,
+    "note": None,
+}
+# step keys that are not actions
+OPTIONS = ("after", "timeout", "log_only")
+
+Step = namedtuple("Step", ["name", "action", "args", "kwargs", "after"])
+
+
+class ScenarioError(Exception):
+    pass
+
+
+def _keywords(action):
+    """
+    Keyword arguments of the ConditionEngine method of an action (callback
+    is given by the Schedule)
+    """
+    parameters = inspect.signature(getattr(ConditionEngine, action)).parameters
+    return [
+        name
+        for name, parameter in parameters.items()
+        if parameter.kind == parameter.KEYWORD_ONLY and name != "callback"
+    ]
+
+
+def _step(name, definition, defaults):
+    if not isinstance(definition, dict):
+        raise ScenarioError("Step {} : provide a mapping".format(name))
+    actions = [key for key in definition if key not in OPTIONS]
+    if len(actions) != 1 or actions[0] not in ACTIONS:
+        raise ScenarioError(
+            "Step {} : provide one action as one of {}".format(name, list(ACTIONS))
+        )
+    action = actions[0]
+    arguments = definition[action]
+    after = definition.get("after") or []
+    after = [after] if isinstance(after, str) else list(after)
+
+    if action == "write":
+        if not isinstance(arguments, dict) or not arguments:
+            raise ScenarioError("Step {} : provide write as point: value".format(name))
+        return Step(name, action, (), dict(arguments), after)
+    if action == "note":
+        return Step(name, action, (str(arguments),), {}, after)
+
+    names = ACTIONS[action]
+    kwargs = {k: definition[k] for k in ("timeout", "log_only") if k in definition}
+    kwargs = dict(defaults, **kwargs)
+    if isinstance(arguments, dict):
+        arguments = dict(arguments)
+        args = tuple(arguments.pop(each, None) for each in names)
+        kwargs.update(arguments)
+    else:
+        arguments = [arguments] if isinstance(arguments, str) else list(arguments)
+        args = tuple(arguments[: len(names)])
+        if len(arguments) > len(names):
+            raise ScenarioError("Step {} : too many arguments".format(name))
+    if len(args) != len(names) or any(each is None for each in args):
+        raise ScenarioError("Step {} : provide {}".format(name, ", ".join(names)))
+    keywords = _keywords(action)
+    unknown = sorted(set(kwargs) - set(keywords))
+    if unknown:
+        raise ScenarioError(
+            "Step {} : unknown arguments {}, provide one of {}".format(
+                name, unknown, keywords
+            )
+        )
+    return Step(name, action, args, kwargs, after)
+
+
+class Scenario(object):
+    """
+    Validated scenario, see module documentation for the format.
+
+    :param definition: dict (content of the file)
+    """
+
+    def __init__(self, definition):
+        self.name = definition.get("name", "Scenario")
+        self.period = definition.get("period", 2)
+        defaults = {
+            k: definition[k] for k in ("timeout", "log_only") if k in definition
+        }
+        steps = definition.get("steps") or {}
+        if not isinstance(steps, dict):
+            raise ScenarioError("Provide steps as a mapping name: step")
+        self.steps = {name: _step(name, step, defaults) for name, step in steps.items()}
+        self.order = self._sort()
+
+    @classmethod
+    def open(cls, filename):
+        with open(filename, "r") as file:
+            if filename.endswith(".json"):
+                return cls(json.load(file))
+            return cls(load(file, Loader=FullLoader))
+
+    def _sort(self):
+        """
+        Steps in an order respecting dependencies (Kahn)
+        """
+        waiting = {}
+        for step in self.steps.values():
+            for each in step.after:
+                if each not in self.steps:
+                    raise ScenarioError(
+                        "Step {} : unknown step {} in after".format(step.name, each)
+                    )
+            waiting[step.name] = len(set(step.after))
+        order = [name for name, count in waiting.items() if count == 0]
+        for name in order:
+            for step in self.steps.values():
+                if name in step.after:
+                    waiting[step.name] -= 1
+                    if waiting[step.name] == 0:
+                        order.append(step.name)
+        if len(order) != len(self.steps):
+            cycle = sorted(set(self.steps) - set(order))
+            raise ScenarioError("Steps depending on each other : {}".format(cycle))
+        return order
+
+    @property
+    def points(self):
+        """
+        Names of every point used by the scenario
+        """
+        names = set()
+        for step in self.steps.values():
+            if step.action == "write":
+                names.update(step.kwargs)
+            elif step.action != "note":
+                names.add(step.args[0])
+        return sorted(names)
+
+    def compile(self, controller):
+        return Schedule(self, controller)
+
+    def __repr__(self):
+        return "Scenario | {} | {} steps".format(self.name, len(self.steps))
+
+
+class Schedule(object):
+    """
+    Scenario bound to a controller : points resolved, dependents of each
+    step known. run() can be called again to repeat the scenario.
+    """
+
+    def __init__(self, scenario, controller):
+        self.scenario = scenario
+        self.controller = controller
+        self.points = {}
+        for name in scenario.points:
+            try:
+                self.points[name] = controller[name]
+            except (KeyError, ValueError) as error:
+                raise ScenarioError("Point {} not found ({})".format(name, error))
+        self._dependents = {name: [] for name in scenario.steps}
+        for step in scenario.steps.values():
+            for each in set(step.after):
+                self._dependents[each].append(step.name)
+        self.results = {}
+
+    def run(self):
+        """
+        Run every step, independent branches together.
+        Returns True when every step succeeded.
+        """
+        steps = self.scenario.steps
+        self.results = {name: None for name in steps}
+        self._waiting = {name: len(set(step.after)) for name, step in steps.items()}
+        self._conditions = {}
+        self.engine = ConditionEngine(period=self.scenario.period)
+        for name in self.scenario.order:
+            if self._waiting[name] == 0:
+                self._start(steps[name])
+        self.engine.run()
+        for name, condition in self._conditions.items():
+            self.results[name] = condition.success
+        return all(self.results.values())
+
+    def _start(self, step):
+        if step.action == "write":
+            written = [
+                tools.adjust(self.points[name], value)
+                for name, value in step.kwargs.items()
+            ]
+            if all(written):
+                self._done(step.name)
+            else:
+                # the steps following it are skipped
+                self.results[step.name] = False
+        elif step.action == "note":
+            tools.add_note(self.controller, step.args[0])
+            self._done(step.name)
+        else:
+            point = self.points[step.args[0]]
+            self._conditions[step.name] = getattr(self.engine, step.action)(
+                point,
+                *step.args[1:],
+                callback=lambda: self._done(step.name),
+                **step.kwargs
+            )
+
+    def _done(self, name):
+        self.results[name] = True
+        for each in self._dependents[name]:
+            self._waiting[each] -= 1
+            if self._waiting[each] == 0:
+                self._start(self.scenario.steps[each])
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Point adapters are created once, when a BAC0 point is attached to an
+equipment or a system input. They know the kind of point they wrap so
+reading the last value does not need type or string checks every time.
+"""
+from BAC0.core.devices.Points import Point, BooleanPoint, EnumPoint
+
+
+class PointAdapter(object):
+    """
+    Base adapter : read the lastValue of the point (no network read).
+    Any other attribute is forwarded to the point so the adapter can be
+    used where the point was expected (.value, .properties, .write...).
+    """
+
+    def __init__(self, point):
+        self.point = point
+
+    def read(self, convert_boolean=False):
+        return self.point.lastValue
+
+    def __getattr__(self, name):
+        return getattr(self.point, name)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.point)
+
+
+class AnalogAdapter(PointAdapter):
+    pass
+
+
+class MultiStateAdapter(PointAdapter):
+    pass
+
+
+class BinaryAdapter(PointAdapter):
+    """
+    Binary points give states as strings. Conversion tables are built once,
+    convert_boolean gives 0-100 so a binary command can drive a modulation.
+    """
+
+    _states = {
+        "active": True,
+        "1: active": True,
+        True: True,
+        "inactive": False,
+        "0: inactive": False,
+        False: False,
+    }
+    _percent = {state: 100 if value else 0 for state, value in _states.items()}
+
+    def read(self, convert_boolean=False):
+        _value = self.point.lastValue
+        if convert_boolean:
+            return self._percent.get(_value, _value)
+        return self._states.get(_value, _value)
+
+
+def adapt(value):
+    """
+    Wrap a BAC0 point in the adapter matching its type.
+    Anything else (numbers, systems, adapters) is returned as is.
+    """
+    if not isinstance(value, Point):
+        return value
+    if isinstance(value, BooleanPoint):
+        return BinaryAdapter(value)
+    elif isinstance(value, EnumPoint):
+        return MultiStateAdapter(value)
+    return AnalogAdapter(value)
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Evaluate an equipment over a whole input time series at once.
+
+The equipment runs on a simulated clock, so no time is spent waiting for
+transients. Outputs are returned as numpy arrays, one value per time step.
+
+    valve = Valve(mode="heating", entering_temp=60, delta_T=20, tau=30)
+    result = simulate(
+        valve,
+        {"modulation": lambda t: np.where(t >= 60, 100, 0)},
+        t=np.arange(0, 600, 1.0),
+    )
+    result["leaving_temp"]      # array of 600 values
+"""
+
+import inspect
+
+import numpy as np
+import pandas as pd
+
+from .equipment import OnOffDevice, Snapshot
+from ..tools import VirtualClock
+
+# Public methods of the base classes that are not outputs
+_NOT_OUTPUTS = set(dir(OnOffDevice)) - {"status"}
+
+
+def input_values(inputs, t):
+    """
+    Inputs can be scalars, arrays (one value per time step) or callables
+    of the time array. Returns a dict of arrays shaped like t.
+    """
+    values = {}
+    for name, entry in inputs.items():
+        if callable(entry):
+            entry = entry(t)
+        values[name] = np.broadcast_to(np.asarray(entry), np.shape(t)).copy()
+    return values
+
+
+def outputs_of(equipment):
+    """
+    Names of the methods of <equipment> giving a value without argument
+    (flow, pressure, leaving_temp, status...), OUTPUTS when declared
+    """
+    if equipment.OUTPUTS:
+        return list(equipment.OUTPUTS)
+    names = []
+    for name, member in inspect.getmembers(type(equipment), inspect.isfunction):
+        if name.startswith("_") or name in _NOT_OUTPUTS:
+            continue
+        if len(inspect.signature(member).parameters) == 1:
+            names.append(name)
+    return names
+
+
+def play(clock, t, inputs, readers):
+    """
+    Step <clock> through t. At each step, write the inputs that changed
+    then call every reader.
+
+    :inputs: (list) (object, attribute, list of values)
+    :readers: (list) callables
+    :returns: list of arrays, one per reader, time steps first (a reader
+              giving arrays, like Room.temperature, gives (time steps, zones))
+    """
+    last = [None] * len(inputs)
+    data = [[None] * len(t) for _ in readers]
+    for i, now in enumerate(t):
+        clock.now = now
+        for k, (obj, attribute, values) in enumerate(inputs):
+            # writing an input refreshes the equipment, only do it on change
+            if values[i] != last[k]:
+                setattr(obj, attribute, values[i])
+                last[k] = values[i]
+        for j, read in enumerate(readers):
+            data[j][i] = read()
+    return [np.asarray(values, dtype="float64") for values in data]
+
+
+def _time(index):
+    if isinstance(index, pd.DatetimeIndex):
+        return (index - index[0]).total_seconds().values
+    return np.asarray(index, dtype="float64")
+
+
+def simulate(equipment, inputs, t=None, outputs=None):
+    """
+    Run <equipment> through an input time series in one pass.
+
+    The transients of the equipment are switched to the lag engine on a
+    simulated clock (see Equipment.use_clock) and stay that way, use a
+    dedicated instance.
+
+    :equipment: (Equipment or EquipmentGroup)
+    :inputs: (DataFrame or dict) attribute -> scalar, array or callable of t.
+             A DataFrame index gives t when t is not provided (seconds, or
+             timestamps counted from the first one).
+    :t: (array) simulation times in seconds
+    :outputs: (list) methods to record, default : every output of the
+              equipment
+
+    :returns: (dict) output name -> array of len(t) (len(t) x zones for
+              outputs giving arrays)
+    """
+    if isinstance(inputs, pd.DataFrame):
+        if t is None:
+            t = _time(inputs.index)
+        inputs = {column: inputs[column].values for column in inputs.columns}
+    if t is None:
+        raise ValueError("Provide t, or inputs as a DataFrame indexed by time")
+    t = np.asarray(t, dtype="float64")
+    if outputs is None:
+        outputs = outputs_of(equipment)
+
+    clock = VirtualClock(start=t[0] if len(t) else 0)
+    equipment.use_clock(clock.time)
+    _inputs = [
+        (equipment, name, values.tolist())
+        for name, values in input_values(inputs, t).items()
+    ]
+    # requested outputs of a time step come from one refresh of the equipment
+    snapshot = Snapshot(
+        equipment,
+        max_age=0,
+        clock=clock.time,
+        outputs=[name for name in outputs if name in equipment.OUTPUTS],
+    )
+    readers = [snapshot.reader(name) for name in outputs]
+    data = play(clock, t, _inputs, readers)
+    return dict(zip(outputs, data))
@@ -1,6 +1,10 @@
+import inspect
+
 from yaml import load, dump, FullLoader
 
-from .equipment import Equipment, EquipmentGroup
+from .equipment import Equipment, EquipmentGroup, Snapshot
+from .system import REPLAY
+from .replay import Trend
 
 from .equipments import (
     Chiller,
@@ -11,6 +15,9 @@ from .equipments import (
     Tank,
     Valve,
     Fan,
+    Room,
+    AHU,
+    HydronicLoop,
 )
 
 
@@ -35,9 +42,18 @@ def create_equip(controller, config=None, name=None):
         add_property:
             level0:
                 proximity: [LT-2G, 0]
+        replay:
+            variable1:
+                file: history.csv (or .parquet, .npy)
+                column: name_of_column (optional)
+                speed: 1 (optional, trend seconds per second)
+                cache: true (optional, parsed trend kept in file.npy)
 
     Inputs and outputs sections will generate a match_value between the
-    variable of the equipment and the BAC0 point.
+    variable of the equipment and the BAC0 point. Outputs are read from a
+    shared snapshot (see Equipment.snapshot) so one refresh serves them all.
+
+    Replay section will feed the variable with a recorded trend (see REPLAY).
 
 
     """
@@ -49,24 +65,38 @@ def create_equip(controller, config=None, name=None):
         "Tank": Tank,
         "MixedAirDamper": MixedAirDampers,
         "Fan": Fan,
+        "Room": Room,
+        "AHU": AHU,
+        "HydronicLoop": HydronicLoop,
     }
     controller = controller
     try:
-        _equip = _classes[config["class"]](name=name, description=config["description"])
+        _class = _classes[config["class"]]
+        description = config["description"]
     except KeyError:
         raise ConfigFileError(
             "Can't create an equipment of type {}.".format(config["class"])
         )
+    _statics = dict(config.get("statics") or {})
     try:
-        for k, v in config["statics"].items():
-            if k == "members":
-                _members = [Equipment.defined[each] for each in v]
-                setattr(_equip, "members", _members)
-                continue
-            if v:
-                setattr(_equip, k, v)
-    except (AttributeError, KeyError):
-        pass
+        if _statics.get("members"):
+            _statics["members"] = [
+                Equipment.defined[each] for each in _statics["members"]
+            ]
+    except KeyError:
+        del _statics["members"]
+    # Statics known by the constructor are given to it so values used to
+    # build the systems (tau, delta_T, max_flow...) are taken into account.
+    _accepted = inspect.signature(_class.__init__).parameters
+    _kwargs = {
+        k: v
+        for k, v in _statics.items()
+        if k in _accepted and k not in ("name", "description") and v is not None
+    }
+    _equip = _class(name=name, description=description, **_kwargs)
+    for k, v in _statics.items():
+        if k not in _kwargs and v:
+            setattr(_equip, k, v)
     try:
         for k, v in config["inputs"].items():
             if v and controller:
@@ -74,15 +104,27 @@ def create_equip(controller, config=None, name=None):
                 setattr(_equip, k, var)
     except (AttributeError, KeyError):
         pass
+    try:
+        for k, v in config["replay"].items():
+            trend = Trend.open(v["file"], column=v.get("column"), cache=v.get("cache"))
+            replay = REPLAY(
+                trend, name=k, start=v.get("start"), speed=v.get("speed", 1)
+            )
+            setattr(_equip, k, replay)
+    except (AttributeError, KeyError):
+        pass
     try:
         for property_name, params in config["add_property"].items():
             _equip._add_property(property_name, params)
     except (AttributeError, KeyError):
         pass
     try:
-        for k, v in config["outputs"].items():
-            if v and controller:
-                controller[v].match_value(getattr(_equip, k))
+        # output points are published from one snapshot of the equipment,
+        # holding only the outputs bound to a point
+        _bound = {k: v for k, v in config["outputs"].items() if v and controller}
+        _snapshot = Snapshot(_equip, outputs=[k for k in _equip.OUTPUTS if k in _bound])
+        for k, v in _bound.items():
+            controller[v].match_value(_snapshot.reader(k))
     except (AttributeError, KeyError):
         pass
 
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Checkpoint of a running simulation, so a long test can resume after a
+crash (or on another machine) without starting again from cold.
+
+    checkpoint = Checkpoint("soak.ckpt")    # every defined equipment
+    checkpoint.save()                       # ex. every few minutes
+
+    # later, plant built again from the same config
+    Checkpoint("soak.ckpt").restore()
+
+Saved :
+
+- equipments : internal values of __dict__ (status, level, zone
+  temperatures...) and inputs holding values (inputs bound to points are
+  left alone)
+- systems : attributes listed in STATE (last value, changes and lag state
+  of TRANSIENT, integral of PID...) and the position of their noise stream
+- tools.clock, when it is a VirtualClock
+
+The file is a sequence of pickled frames. save() appends only the fields
+that changed since the previous save, every <compact_every> saves the file
+is written again as one frame (atomic replace). A frame cut by a crash is
+ignored, restore() uses the frames before it.
+
+On restore, times are moved by the time elapsed since the save (wall clock
+for datetimes, clock of the system for seconds) : a transient resumes where
+it was saved instead of rising again from its start.
+"""
+
+import os
+import pickle
+from datetime import datetime as dt
+
+import numpy as np
+
+from .. import tools
+from .equipment import Equipment
+from .system import System, Dampening
+
+# equipment attributes never saved
+SKIPPED = ("name", "id", "description", "clock", "_frozen")
+# attributes holding a time in seconds of the clock of their owner
+CLOCK_FIELDS = ("_updated", "_clock_0")
+NOISE_STATE = ("_rng", "_buffer", "_index", "_tail", "_offset")
+# reading of the clock of an owner when it was saved
+_CLOCK = "<clock>"
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def _plain(value):
+    if isinstance(value, (list, tuple)):
+        return all(_plain(each) for each in value)
+    if isinstance(value, dict):
+        return all(_plain(each) for each in value.values())
+    return value is None or isinstance(
+        value, (bool, int, float, str, np.generic, np.ndarray)
+    )
+
+
+def _shift(value, delta):
+    """
+    Datetimes of value (also inside Dampening of TRANSIENT changes)
+    moved by delta
+    """
+    if isinstance(value, dt):
+        return value + delta
+    if isinstance(value, Dampening):
+        if value.t0 is not None:
+            value.t0 += delta
+        return value
+    if isinstance(value, list):
+        return [_shift(each, delta) for each in value]
+    if isinstance(value, tuple):
+        return tuple(_shift(each, delta) for each in value)
+    return value
+
+
+def _systems(equipment):
+    roots = list(getattr(equipment, "systems", None) or [])
+    roots += [each for each in equipment.__dict__.values() if isinstance(each, System)]
+    found = []
+    for root in roots:
+        for system in root.walk():
+            if all(system is not each for each in found):
+                found.append(system)
+    return found
+
+
+class Checkpoint(object):
+    """
+    :filename: (str)
+    :equipments: (list) Equipment or EquipmentGroup, members included
+                 (default : every defined equipment)
+    :compact_every: (int) saves appended before the file is written again
+    """
+
+    def __init__(self, filename, equipments=None, compact_every=50):
+        self.filename = filename
+        self.equipments = equipments
+        self.compact_every = compact_every
+        self._owners = None
+        self._saved = {}
+        self._frames = 0
+
+    def owners(self):
+        """
+        (key, object, attributes) of everything saved, attributes None for
+        an equipment (its __dict__). Found once, the plant does not change.
+        """
+        if self._owners is not None:
+            return self._owners
+        equipments = self.equipments
+        if equipments is None:
+            equipments = list(Equipment.defined.values())
+        stack, found = list(equipments), {}
+        while stack:
+            equipment = stack.pop(0)
+            stack.extend(getattr(equipment, "members", None) or [])
+            if isinstance(equipment, Equipment):
+                found.setdefault(equipment.id, equipment)
+
+        owners, seen = [], set()
+        for key, equipment in found.items():
+            owners.append((key, equipment, None))
+            for i, system in enumerate(_systems(equipment)):
+                if id(system) in seen:
+                    continue
+                seen.add(id(system))
+                _key = "{}/{}".format(key, i)
+                owners.append((_key, system, type(system).STATE))
+                if system.noise is not None:
+                    owners.append(("{}/noise".format(_key), system.noise, NOISE_STATE))
+        self._owners = owners
+        return owners
+
+    @staticmethod
+    def _state(owner, attributes):
+        if attributes is None:
+            state = {
+                name: value
+                for name, value in owner.__dict__.items()
+                if name not in SKIPPED and _plain(value)
+            }
+        else:
+            state = {name: getattr(owner, name, None) for name in attributes}
+        if any(name in state for name in CLOCK_FIELDS):
+            state[_CLOCK] = owner.clock()
+        return state
+
+    def save(self):
+        """
+        Write the fields changed since the last save.
+        Returns the number of fields written.
+        """
+        frame = {}
+        for key, owner, attributes in self.owners():
+            for name, value in self._state(owner, attributes).items():
+                data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                if self._saved.get((key, name)) != data:
+                    self._saved[(key, name)] = data
+                    frame[(key, name)] = data
+        header = {
+            "saved": dt.now(),
+            "clock": (
+                tools.clock.now if isinstance(tools.clock, tools.VirtualClock) else None
+            ),
+        }
+        if self._frames == 0 or self._frames >= self.compact_every:
+            temporary = "{}.tmp".format(self.filename)
+            with open(temporary, "wb") as file:
+                pickle.dump((header, self._saved), file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.filename)
+            self._frames = 1
+        else:
+            with open(self.filename, "ab") as file:
+                pickle.dump((header, frame), file, pickle.HIGHEST_PROTOCOL)
+            self._frames += 1
+        return len(frame)
+
+    @staticmethod
+    def load(filename):
+        """
+        (header of the last frame, key -> pickled field) of a file
+        """
+        header, saved = None, {}
+        with open(filename, "rb") as file:
+            while True:
+                try:
+                    header_, frame = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError):
+                    # end of file, or last frame cut by a crash
+                    break
+                header = header_
+                saved.update(frame)
+        if header is None:
+            raise CheckpointError("No checkpoint in {}".format(filename))
+        return header, saved
+
+    def restore(self):
+        """
+        Put the saved state back. Returns the number of fields restored.
+        """
+        header, saved = self.load(self.filename)
+        if header["clock"] is not None and isinstance(tools.clock, tools.VirtualClock):
+            tools.clock.now = header["clock"]
+        delta = dt.now() - header["saved"]
+        fields = {}
+        for (key, name), data in saved.items():
+            fields.setdefault(key, {})[name] = data
+
+        count = 0
+        for key, owner, attributes in self.owners():
+            state = {
+                name: pickle.loads(data) for name, data in fields.get(key, {}).items()
+            }
+            elapsed = owner.clock() - state.pop(_CLOCK) if _CLOCK in state else 0
+            for name, value in state.items():
+                value = _shift(value, delta)
+                if name in CLOCK_FIELDS and value is not None:
+                    value += elapsed
+                if attributes is None:
+                    if not _plain(owner.__dict__.get(name)):
+                        # now bound to a point
+                        continue
+                    # internal state : do not trigger Equipment.__setattr__
+                    owner.__dict__[name] = value
+                else:
+                    setattr(owner, name, value)
+                count += 1
+        # the next save writes the whole file again
+        self._saved = {}
+        self._frames = 0
+        return count
+
+    def __repr__(self):
+        return "Checkpoint | {} | {} frames".format(self.filename, self._frames)
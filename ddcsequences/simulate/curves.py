@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Manufacturer curves of fans and pumps.
+
+A Curve is a table of flow, head and power at rated speed. At another speed
+the affinity laws apply (r = speed / rated speed) :
+
+    flow x r, head x r^2, power x r^3
+
+Values are read by linear interpolation (np.interp) in arrays prepared
+once, and every method accepts arrays of speeds, so many fans or pumps
+are evaluated at once.
+
+Units are the ones of the table (l/s, kPa, kW or cfm, inWC, hp...), the
+system resistance k uses the same : head = static + k * flow^2.
+"""
+
+import math
+
+import numpy as np
+
+
+class Curve(object):
+    """
+    :flow: (list) flows at rated speed, increasing
+    :head: (list) head (pressure) at each flow
+    :power: (list) shaft power at each flow (optional)
+    :speed: (float) rated speed of the table, %
+    """
+
+    def __init__(self, flow, head, power=None, speed=100):
+        self.flow = np.asarray(flow, dtype="float64")
+        self.head = np.asarray(head, dtype="float64")
+        self.power = (
+            np.asarray(power, dtype="float64")
+            if power is not None
+            else np.zeros_like(self.flow)
+        )
+        if not (len(self.flow) == len(self.head) == len(self.power) >= 2):
+            raise ValueError("Provide at least 2 points, as many flows as heads")
+        if np.any(np.diff(self.flow) <= 0) or np.any(np.diff(self.head) > 0):
+            raise ValueError("Provide flows increasing and heads not increasing")
+        self.speed = speed
+        self._reversed_flow = self.flow[::-1].copy()
+        self._k = None
+        self._balance = None
+
+    @classmethod
+    def create(cls, curve):
+        """
+        Curve from a Curve or a dict (ex. statics of a YAML file)
+        """
+        if curve is None or isinstance(curve, Curve):
+            return curve
+        return cls(**curve)
+
+    def _ratio(self, speed):
+        return np.asarray(speed, dtype="float64") / self.speed
+
+    def head_at(self, flow, speed=None):
+        r = self._ratio(self.speed if speed is None else speed)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rated = np.where(r > 0, np.asarray(flow) / r, 0)
+        return r**2 * np.interp(rated, self.flow, self.head)
+
+    def power_at(self, flow, speed=None):
+        r = self._ratio(self.speed if speed is None else speed)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rated = np.where(r > 0, np.asarray(flow) / r, 0)
+        return r**3 * np.interp(rated, self.flow, self.power)
+
+    def system_k(self, flow):
+        """
+        Resistance of a system crossing the curve at <flow>, rated speed
+        """
+        return float(np.interp(flow, self.flow, self.head)) / flow**2
+
+    def operating_flow(self, speed, k, static=0):
+        """
+        Flow where the curve at <speed> meets the system curve
+        head = static + k * flow^2.
+
+        At rated flow x, the curve gives r^2 * head(x) and the system
+        static + k * r^2 * x^2, so head(x) - k * x^2 = static / r^2. The
+        left side falls with x and is tabulated once for a given k.
+        """
+        if k != self._k:
+            self._k = k
+            # reversed so np.interp gets increasing abscissas
+            self._balance = (self.head - k * self.flow**2)[::-1]
+        r = self._ratio(speed)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            target = np.where(r > 0, static / r**2, np.inf)
+        x = np.interp(target, self._balance, self._reversed_flow, left=self.flow[-1])
+        x = np.where(target > self._balance[-1], 0, x)
+        return r * x
+
+    def operating_point(self, speed, k, static=0):
+        """
+        (flow, head, power) at <speed> on the system curve
+        """
+        flow = self.operating_flow(speed, k, static)
+        return flow, self.head_at(flow, speed), self.power_at(flow, speed)
+
+    def __repr__(self):
+        return "Curve | {} points | {} to {} at {}%".format(
+            len(self.flow), self.flow[0], self.flow[-1], self.speed
+        )
+
+
+def amps(power_kw, volts=600, power_factor=0.85, efficiency=0.9, phases=3):
+    """
+    Current drawn by a motor giving <power_kw> on its shaft
+    """
+    factor = math.sqrt(3) if phases == 3 else 1
+    return np.asarray(power_kw) * 1000 / (factor * volts * power_factor * efficiency)
+
+
+class CurveOutputs(object):
+    """
+    flow, pressure and amperage of a fan or a pump (Equipment mixin). With
+    a curve, they follow the operating point at the speed given by the
+    TRANSIENT (_equipment), else a percent of max_flow, delta_p and
+    max_amperage.
+    """
+
+    def _operating_point(self):
+        # flow, pressure and amperage of one snapshot share the same point
+        key = (max(0, self._equipment.last_value), self.get_value(self.system_k))
+        if self.__dict__.get("_point_key") != key:
+            self.__dict__.update(
+                _point_key=key, _point=self.curve.operating_point(*key)
+            )
+        return self._point
+
+    def flow(self):
+        self.refresh()
+        if self.curve is not None:
+            return float(self._operating_point()[0])
+        return (self._equipment.last_value / 100) * self.max_flow
+
+    def pressure(self):
+        self.refresh()
+        if self.curve is not None:
+            return self.succion_pressure + float(self._operating_point()[1])
+        return self.succion_pressure + (
+            (self._equipment.last_value / 100) * self.delta_p
+        )
+
+    def amperage(self):
+        self.refresh()
+        if self.curve is not None and self.curve.power.any():
+            return float(amps(self._operating_point()[2], volts=self.volts))
+        return (self._equipment.last_value / 100) * self.max_amperage
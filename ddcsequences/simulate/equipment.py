@@ -10,8 +10,9 @@ import time
 import BAC0
 from BAC0.core.devices.Points import Point
 
+from .adapters import PointAdapter, adapt
 
-from functools import wraps
+from functools import partial, wraps
 
 from .system import (
     System,
@@ -26,9 +27,25 @@ from .system import (
     TRANSIENT,
     PASSTHRU,
     SELECT,
+    PID,
 )
 
 
+def _frozen_outputs(equipment, outputs=None):
+    """
+    Refresh <equipment> once and read its outputs (default : OUTPUTS) from
+    that state, its refresh() does nothing while they are read
+    """
+    outputs = equipment.OUTPUTS if outputs is None else outputs
+    equipment.refresh()
+    # __dict__ : do not trigger Equipment.__setattr__
+    equipment.__dict__["_frozen"] = True
+    try:
+        return {name: getattr(equipment, name)() for name in outputs}
+    finally:
+        equipment.__dict__["_frozen"] = False
+
+
 class EquipmentGroup:
     """
     Group of equipements serving one goal.
@@ -43,6 +60,10 @@ class EquipmentGroup:
 
     ids = 0
     defined = {}
+    # output methods, in order, given together by snapshot()
+    OUTPUTS = ()
+    # set by snapshot() while outputs are read from one refresh
+    _frozen = False
 
     def __init__(self, name=None, members=None, description=None):
         if name:
@@ -57,12 +78,25 @@ class EquipmentGroup:
         EquipmentGroup.defined[self.id] = self
 
     def refresh(self):
+        if self._frozen:
+            return
         try:
             for equipment in self.equipments:
                 equipment.refresh()
         except AttributeError:
             pass
 
+    def use_clock(self, clock):
+        for equipment in self.members or []:
+            equipment.use_clock(clock)
+
+    def snapshot(self, outputs=None):
+        """
+        Every output of the group (or <outputs> only) from one refresh, as
+        a dict
+        """
+        return _frozen_outputs(self, outputs)
+
     def __repr__(self):
         return "{}".format(self.name)
 
@@ -73,6 +107,47 @@ class EquipmentGroup:
         raise AttributeError("Equipment not found")
 
 
+class Snapshot(object):
+    """
+    Outputs of an equipment read together : readers of single outputs
+    (ex. BAC0 match_value of each output point) share one snapshot, taken
+    again once it is older than <max_age> seconds.
+
+    :equipment: (Equipment or EquipmentGroup)
+    :max_age: (float) seconds
+    :clock: (callable) time source in seconds (default : time.monotonic)
+    :outputs: (list) outputs evaluated (default : every output), ex. the
+              ones bound to points
+    """
+
+    def __init__(self, equipment, max_age=1, clock=None, outputs=None):
+        self.equipment = equipment
+        self.max_age = max_age
+        self.clock = clock if clock else time.monotonic
+        self.outputs = outputs
+        self._values = None
+        self._taken = None
+
+    def values(self):
+        now = self.clock()
+        if self._taken is None or now - self._taken > self.max_age:
+            self._values = self.equipment.snapshot(self.outputs)
+            self._taken = now
+        return self._values
+
+    def value(self, name):
+        return self.values()[name]
+
+    def reader(self, name):
+        """
+        Callable giving output <name>. Outputs not declared in OUTPUTS
+        (ex. switches added with add_property) are read directly.
+        """
+        if name not in self.equipment.OUTPUTS:
+            return getattr(self.equipment, name)
+        return partial(self.value, name)
+
+
 class Equipment:
     """
     Base class for an equipment which is in fact 
@@ -82,23 +157,28 @@ class Equipment:
 
     ids = 0
     defined = {}
+    # name -> system answering equipment[name], rebuilt when systems is bound
+    # (a tuple, so it can only change by being bound again)
+    _index = {}
+    # output methods, in order, given together by snapshot()
+    OUTPUTS = ()
+    # set by snapshot() while outputs are read from one refresh
+    _frozen = False
 
     @staticmethod
     def get_value(value, convert_boolean=False):
-        if isinstance(value, Point):
-            _value = value.lastValue
-            if _value == "active" or value == "1: active":
-                if convert_boolean:
-                    return 100
-                else:
-                    return True
-            elif _value == "inactive" or _value == "0: inactive":
-                if convert_boolean:
-                    return 0
-                else:
-                    return False
-            else:
-                return _value
+        """
+        Points attached to an equipment are stored as adapters (see
+        __setattr__) that already know how to convert their value.
+        """
+        if isinstance(value, PointAdapter):
+            return value.read(convert_boolean)
+        elif isinstance(value, System):
+            # ex. a REPLAY system used as an input
+            return value.output
+        elif isinstance(value, Point):
+            # not bound through __setattr__ (ex. given to get_value directly)
+            return adapt(value).read(convert_boolean)
         else:
             return value
 
@@ -120,6 +200,8 @@ class Equipment:
             pass
 
     def refresh(self):
+        if self._frozen:
+            return
         self._call(self._on_refresh)
         try:
             for system in self.systems:
@@ -127,23 +209,69 @@ class Equipment:
         except AttributeError:
             pass
 
+    def snapshot(self, outputs=None):
+        """
+        Refresh once and give every output (see OUTPUTS), or <outputs>
+        only, as a dict. The outputs are read from the same state, the
+        methods do not refresh again while they are read.
+        """
+        return _frozen_outputs(self, outputs)
+
     def _on_refresh(self):
         self._call(self.update_equipment)
 
+    def use_clock(self, clock):
+        """
+        Run the transients of this equipment with the lag engine on <clock>
+        (callable giving seconds) instead of the wall clock. Used to simulate
+        faster than real time (see sweep). Call it before the first refresh.
+        """
+        for each in getattr(self, "systems", []):
+            for system in each.walk():
+                if isinstance(system, TRANSIENT):
+                    system.engine = "lag"
+                    system.clock = clock
+                elif isinstance(system, PID):
+                    system.clock = clock
+
     def __repr__(self):
         # self.refresh()
         return "{} | {}\n{}".format(self.name, self.__class__, self.__dict__)
 
+    @staticmethod
+    def index_systems(systems):
+        """
+        Map every name a system answers to with the first system of the
+        list holding it, so equipment[name] is a single dict lookup.
+        """
+        index = {}
+        for system in reversed(systems):
+            for name in system.keys():
+                index[name] = system
+        return index
+
     def __getitem__(self, name):
-        for system in self.systems:
-            try:
-                return system[name]
-            except:
-                pass
-        return self.__dict__[name]
+        try:
+            system = self._index[name]
+        except KeyError:
+            # not indexed (ex. "output") : first system answering to it
+            for system in getattr(self, "systems", []):
+                try:
+                    return system[name]
+                except AttributeError:
+                    pass
+            return self.__dict__[name]
+        return system[name]
 
     def __setattr__(self, name, value):
-        self.__dict__[name] = value
+        if name == "systems":
+            value = tuple(value)
+            self.__dict__["_index"] = Equipment.index_systems(value)
+        # BAC0 points are wrapped in an adapter once, here, at binding time,
+        # also the points of a list (ex. one per pump of a HydronicLoop)
+        if type(value) in (list, tuple):
+            value = type(value)(adapt(each) for each in value)
+        self.__dict__[name] = adapt(value)
         try:
             for system in self.systems:
                 system.output
@@ -5,3 +5,6 @@ from .pump import Pump, ParallelPumps
 from .tank import Tank
 from .valve import Valve
 from .fan import Fan
+from .room import Room
+from .ahu import AHU
+from .hydronic import HydronicLoop
@@ -19,8 +19,162 @@ from ...simulate.system import (
     PASSTHRU,
     SELECT,
 )
+from .damper import MixedAirDampers
+from .dx_cooling import DX_Cooling_Stage
+from .fan import Fan
+from .valve import Valve
 
 
 class AHU(EquipmentGroup):
-    def __init__(self):
-        pass
+    """
+    Air handling unit made of its own sub-equipments, in air path order :
+    mixed air dampers, heating valve, DX cooling stage and supply fan.
+
+    Values travel from one member to the next inside the AHU (mixed air
+    temperature enters the heating coil, its leaving temperature enters
+    the cooling coil) instead of through BAC0 points. Inputs set on the
+    AHU do nothing until a refresh, which updates every member once, in
+    that order, and keeps the results in AHU.values :
+
+        "MA-T" mixed air temperature
+        "DA-T" discharge air temperature
+        "SF-S" supply fan status
+        "SF-FLOW" supply air flow
+        "SA-SP" supply air static pressure
+
+    Note : inputs may also be BAC0.core.devices.Point
+
+    :supply_fan_command: (boolean)
+    :supply_fan_modulation: (float) %
+    :damper_command: (float) % of outdoor air
+    :outdoor_air_temp: (float)
+    :return_air_temp: (float)
+    :heating_command: (float) %
+    :cooling_command: (float) %
+    """
+
+    OUTPUTS = (
+        "mixed_air_temp",
+        "discharge_air_temp",
+        "supply_fan_status",
+        "supply_air_flow",
+        "static_pressure",
+    )
+
+    def __init__(
+        self,
+        name=None,
+        description=None,
+        supply_fan_command=False,
+        supply_fan_modulation=100,
+        damper_command=0,
+        outdoor_air_temp=0,
+        return_air_temp=21,
+        heating_command=0,
+        cooling_command=0,
+        heating_delta_T=25,
+        cooling_delta_T=12,
+        max_flow=2000,
+        static_pressure=250,
+        tau=10,
+    ):
+        self.supply_fan_command = supply_fan_command
+        self.supply_fan_modulation = supply_fan_modulation
+        self.damper_command = damper_command
+        self.outdoor_air_temp = outdoor_air_temp
+        self.return_air_temp = return_air_temp
+        self.heating_command = heating_command
+        self.cooling_command = cooling_command
+
+        super().__init__(name=name, description=description)
+        self.dampers = MixedAirDampers(name="{}.dampers".format(self.name), tau=tau)
+        self.heating_coil = Valve(
+            name="{}.heating_coil".format(self.name),
+            mode="heating",
+            delta_T=heating_delta_T,
+            tau=tau,
+        )
+        self.cooling_coil = DX_Cooling_Stage(
+            name="{}.cooling_coil".format(self.name),
+            delta_T=cooling_delta_T,
+            min_temperature=float("-inf"),
+            tau=tau,
+        )
+        self.supply_fan = Fan(
+            name="{}.supply_fan".format(self.name),
+            max_flow=max_flow,
+            delta_p=static_pressure,
+        )
+        self.members = [
+            self.dampers,
+            self.heating_coil,
+            self.cooling_coil,
+            self.supply_fan,
+        ]
+        self.values = {}
+
+    @staticmethod
+    def _feed(equipment, **inputs):
+        """
+        Write all inputs of a member, then refresh it once (setting them
+        one by one would refresh the member for each of them).
+        """
+        equipment.__dict__.update(inputs)
+        equipment.refresh()
+
+    def refresh(self):
+        if self._frozen:
+            return self.values
+        _get = Equipment.get_value
+        self._feed(
+            self.dampers,
+            damper_command=_get(self.damper_command),
+            outdoor_air_temp=_get(self.outdoor_air_temp),
+            return_air_temp=_get(self.return_air_temp),
+        )
+        mixed_air = self.dampers._temperature.last_value
+
+        self._feed(
+            self.heating_coil,
+            modulation=_get(self.heating_command),
+            entering_temp=mixed_air,
+        )
+        self._feed(
+            self.cooling_coil,
+            modulation=_get(self.cooling_command, convert_boolean=True),
+            entering_temp=self.heating_coil._temperature.last_value,
+        )
+        self._feed(
+            self.supply_fan,
+            # kept as read : OnOffDevice compares it with True / False
+            start_command=_get(self.supply_fan_command),
+            modulation=_get(self.supply_fan_modulation),
+        )
+        fan = self.supply_fan._equipment.last_value / 100
+        self.values = {
+            "MA-T": float(mixed_air),
+            "DA-T": float(self.cooling_coil._temperature.last_value),
+            "SF-S": self.supply_fan._status,
+            "SF-FLOW": fan * self.supply_fan.max_flow,
+            "SA-SP": self.supply_fan.succion_pressure + fan * self.supply_fan.delta_p,
+        }
+        return self.values
+
+    def _value(self, key):
+        # refresh, unless the outputs are read together by snapshot()
+        return self.refresh()[key]
+
+    def mixed_air_temp(self):
+        return self._value("MA-T")
+
+    def discharge_air_temp(self):
+        return self._value("DA-T")
+
+    def supply_fan_status(self):
+        return self._value("SF-S")
+
+    def supply_air_flow(self):
+        return self._value("SF-FLOW")
+
+    def static_pressure(self):
+        return self._value("SA-SP")
@@ -26,6 +26,8 @@ class Chiller(OnOffDevice):
     Basic approximation of a chiller
     """
 
+    OUTPUTS = ("chwlt", "cwlt", "chwet", "cwet", "status")
+
     def __init__(
         self,
         name=None,
@@ -22,6 +22,8 @@ from ...simulate.system import (
 
 
 class MixedAirDampers(Equipment):
+    OUTPUTS = ("mixed_air_temp", "mixed_air_co2")
+
     def __init__(
         self,
         name=None,
@@ -100,8 +102,8 @@ class MixedAirDampers(Equipment):
 
     def mixed_air_temp(self):
         self.refresh()
-        return self._temperature.output
+        return self._temperature.last_value
 
     def mixed_air_co2(self):
         self.refresh()
-        return self._co2.output
+        return self._co2.last_value
@@ -22,6 +22,8 @@ from ...simulate.system import (
 
 
 class DX_Cooling_Stage(Equipment):
+    OUTPUTS = ("leaving_temp",)
+
     def __init__(
         self,
         name=None,
@@ -70,4 +72,4 @@ class DX_Cooling_Stage(Equipment):
 
     def leaving_temp(self):
         self.refresh()
-        return self._temperature.output
+        return self._temperature.last_value
@@ -4,6 +4,7 @@
 # Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
 #
 # Licensed under LGPLv3, see file LICENSE in this source tree.
+from ...simulate.curves import Curve, CurveOutputs
 from ...simulate.equipment import Equipment, EquipmentGroup, OnOffDevice
 from ...simulate.system import (
     System,
@@ -20,8 +21,11 @@ from ...simulate.system import (
     SELECT,
 )
 
+# pumps in parallel, also importable from here
+from .pump import ParallelPumps
 
-class Fan(OnOffDevice):
+
+class Fan(CurveOutputs, OnOffDevice):
     """
     A Fan is an OnOffDevice to which we add a TRANSIENT system
     This system will model the way flow and pressure are impacted 
@@ -34,8 +38,16 @@ class Fan(OnOffDevice):
     :succion_pressure: (float) typical pressure of loop, should drop when pump is running by simulation can't do that right now
     :delta_p : (float) increase in pressure when pump is running at max flow
     :max_flox: (flow) flow when pump is running at 100% modulation, when TRANSIENT effect is over
+    :curve: (Curve or dict) manufacturer curve (flow, head, power in kW). When
+            given, flow, pressure and amperage follow the curve and the
+            affinity laws at the speed given by the TRANSIENT
+    :system_k: (float) system resistance (head = k * flow^2), default : the
+               system crosses the curve at max_flow
+    :volts: (float) motor voltage, for amperage from the curve power
     """
 
+    OUTPUTS = ("flow", "pressure", "amperage", "status")
+
     def __init__(
         self,
         start_command=False,
@@ -44,6 +56,9 @@ class Fan(OnOffDevice):
         delta_p=150,
         max_flow=2000,
         amperage=1,
+        curve=None,
+        system_k=None,
+        volts=600,
         name=None,
         description=None,
     ):
@@ -55,6 +70,11 @@ class Fan(OnOffDevice):
         self.delta_p = delta_p
         self.modulation = modulation
         self.max_amperage = amperage
+        self.curve = Curve.create(curve)
+        if self.curve is not None and system_k is None:
+            system_k = self.curve.system_k(max_flow)
+        self.system_k = system_k
+        self.volts = volts
 
         self._equipment = TRANSIENT(
             ValueCommandElement(0, 0),
@@ -75,41 +95,8 @@ class Fan(OnOffDevice):
             self._equipment.input["command"] = Equipment.get_value(self.modulation)
         self._equipment.output
 
-    def flow(self):
-        self.refresh()
-        return (self._equipment.last_value / 100) * self.max_flow
-
-    def pressure(self):
-        self.refresh()
-        return self.succion_pressure + (
-            (self._equipment.last_value / 100) * self.delta_p
-        )
-
-    def amperage(self):
-        self.refresh()
-        return (self._equipment.last_value / 100) * self.max_amperage
-
     def _on_start(self):
         self._equipment.input["command"] = Equipment.get_value(self.modulation)
 
     def _on_stop(self):
         self._equipment.input["command"] = 0
-
-
-class ParallelPumps(EquipmentGroup):
-    def __init__(self, members=None, name=None, description=None):
-        super().__init__(name=name, description=description, members=members)
-
-    def flow(self):
-        self.refresh()
-        _flow = 0
-        for each in self.members:
-            _flow += each.flow()
-        return _flow
-
-    def pressure(self):
-        self.refresh()
-        _pressure = 0
-        for each in self.members:
-            _pressure += each.pressure()
-        return _pressure
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+import numpy as np
+
+from ...simulate.equipment import Equipment
+from ...simulate.hydronic import Network
+
+
+class HydronicLoop(Equipment):
+    """
+    Direct return loop : pumps in parallel feeding <branches> coils, each
+    with its control valve, along a supply and a return main. Flows and
+    pressures come from a Network solved on each refresh (steady state).
+
+    Node names : "suction", "supply_i" and "return_i" (i = 0 is the
+    branch nearest to the pumps). The differential pressure sensor is
+    across the last branch, the usual place for DP reset.
+
+    Note : inputs may be scalars (same for all), lists or
+    BAC0.core.devices.Point
+
+    :pump_commands: (boolean) start / stop of each pump
+    :pump_speeds: (float) % of each pump
+    :valve_positions: (float) % of each valve
+    :head: (float) shutoff head of a pump at full speed, kPa
+    :max_flow: (float) flow of a pump at zero head, l/s
+    :valve_cv: (float) Cv of the valves
+    :coil_k: (float) resistance of a coil, kPa / (l/s)^2
+    :main_k: (float) resistance of a main segment between two branches
+    """
+
+    OUTPUTS = (
+        "flow",
+        "pump_flows",
+        "branch_flows",
+        "pump_head",
+        "differential_pressure",
+    )
+
+    def __init__(
+        self,
+        pumps=2,
+        branches=10,
+        pump_commands=False,
+        pump_speeds=100,
+        valve_positions=100,
+        head=250,
+        max_flow=40,
+        valve_cv=10,
+        coil_k=5,
+        main_k=0.01,
+        name=None,
+        description=None,
+    ):
+        super().__init__(name=name, description=description)
+        network = Network(reference="suction")
+        for i in range(pumps):
+            network.add_pump("P{}".format(i), "suction", "supply_0", head, max_flow)
+        for i in range(branches):
+            network.add_valve(
+                "V{}".format(i),
+                "supply_{}".format(i),
+                "return_{}".format(i),
+                cv=valve_cv,
+                k=coil_k,
+            )
+            if i + 1 < branches:
+                network.add_pipe(
+                    "S{}".format(i),
+                    "supply_{}".format(i),
+                    "supply_{}".format(i + 1),
+                    main_k,
+                )
+                network.add_pipe(
+                    "R{}".format(i),
+                    "return_{}".format(i + 1),
+                    "return_{}".format(i),
+                    main_k,
+                )
+        network.add_pipe("return", "return_0", "suction", main_k)
+        self.__dict__.update(
+            network=network,
+            pumps=pumps,
+            branches=branches,
+            _pumps=[network.branches["P{}".format(i)] for i in range(pumps)],
+            _valves=[network.branches["V{}".format(i)] for i in range(branches)],
+        )
+        self.pump_speeds = pump_speeds
+        self.valve_positions = valve_positions
+        self.pump_commands = pump_commands
+
+    @staticmethod
+    def _values(value, n, convert_boolean=False):
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return [Equipment.get_value(v, convert_boolean) for v in value]
+        return [Equipment.get_value(value, convert_boolean)] * n
+
+    def update_equipment(self):
+        network = self.network
+        if not network._compiled:
+            network._compile()
+        network.running[self._pumps] = self._values(
+            self.pump_commands, self.pumps, convert_boolean=True
+        )
+        network.speed[self._pumps] = self._values(self.pump_speeds, self.pumps)
+        network.position[self._valves] = self._values(
+            self.valve_positions, self.branches
+        )
+        network.solve()
+
+    def flow(self):
+        self.refresh()
+        return self.network.flow("return")
+
+    def pump_flows(self):
+        self.refresh()
+        return self.network.flows[self._pumps]
+
+    def branch_flows(self):
+        self.refresh()
+        return self.network.flows[self._valves]
+
+    def pump_head(self):
+        self.refresh()
+        return self.network.differential("supply_0", "suction")
+
+    def differential_pressure(self):
+        self.refresh()
+        last = self.branches - 1
+        return self.network.differential(
+            "supply_{}".format(last), "return_{}".format(last)
+        )
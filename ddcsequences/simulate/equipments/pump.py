@@ -4,6 +4,7 @@
 # Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
 #
 # Licensed under LGPLv3, see file LICENSE in this source tree.
+from ...simulate.curves import Curve, CurveOutputs
 from ...simulate.equipment import Equipment, EquipmentGroup, OnOffDevice
 from ...simulate.system import (
     System,
@@ -21,7 +22,7 @@ from ...simulate.system import (
 )
 
 
-class Pump(OnOffDevice):
+class Pump(CurveOutputs, OnOffDevice):
     """
     A pump is an OnOffDevice to which we add a TRANSIENT system
     This system will model the way flow and pressure are impacted 
@@ -34,8 +35,16 @@ class Pump(OnOffDevice):
     :succion_pressure: (float) typical pressure of loop, should drop when pump is running by simulation can't do that right now
     :delta_p : (float) increase in pressure when pump is running at max flow
     :max_flox: (flow) flow when pump is running at 100% modulation, when TRANSIENT effect is over
+    :curve: (Curve or dict) manufacturer curve (flow, head, power in kW). When
+            given, flow, pressure and amperage follow the curve and the
+            affinity laws at the speed given by the TRANSIENT
+    :system_k: (float) system resistance (head = k * flow^2), default : the
+               system crosses the curve at max_flow
+    :volts: (float) motor voltage, for amperage from the curve power
     """
 
+    OUTPUTS = ("flow", "pressure", "amperage", "status")
+
     def __init__(
         self,
         start_command=False,
@@ -44,6 +53,9 @@ class Pump(OnOffDevice):
         delta_p=5,
         max_flow=400,
         amperage=1,
+        curve=None,
+        system_k=None,
+        volts=600,
         name=None,
         description=None,
     ):
@@ -55,6 +67,11 @@ class Pump(OnOffDevice):
         self.delta_p = delta_p
         self.modulation = modulation
         self.max_amperage = amperage
+        self.curve = Curve.create(curve)
+        if self.curve is not None and system_k is None:
+            system_k = self.curve.system_k(max_flow)
+        self.system_k = system_k
+        self.volts = volts
 
         self._equipment = TRANSIENT(
             ValueCommandElement(0, 0),
@@ -75,20 +92,6 @@ class Pump(OnOffDevice):
             self._equipment.input["command"] = Equipment.get_value(self.modulation)
         self._equipment.output
 
-    def flow(self):
-        self.refresh()
-        return (self._equipment.last_value / 100) * self.max_flow
-
-    def pressure(self):
-        self.refresh()
-        return self.succion_pressure + (
-            (self._equipment.last_value / 100) * self.delta_p
-        )
-
-    def amperage(self):
-        self.refresh()
-        return (self._equipment.last_value / 100) * self.max_amperage
-
     def _on_start(self):
         self._equipment.input["command"] = Equipment.get_value(self.modulation)
 
@@ -97,6 +100,14 @@ class Pump(OnOffDevice):
 
 
 class ParallelPumps(EquipmentGroup):
+    """
+    Pumps in parallel, each one giving its own flow against its own
+    pressure. For pumps interacting with each other and with the valves
+    of the loop, use HydronicLoop.
+    """
+
+    OUTPUTS = ("flow", "pressure")
+
     def __init__(self, members=None, name=None, description=None):
         super().__init__(name=name, description=description, members=members)
 
@@ -108,11 +119,9 @@ class ParallelPumps(EquipmentGroup):
         return _flow
 
     def pressure(self):
+        # pumps in parallel share the same header, pressures do not add up
         self.refresh()
-        _pressure = 0
-        for each in self.members:
-            _pressure += each.pressure()
-        return _pressure
+        return max(each.pressure() for each in self.members)
 
 
 class Heater(Equipment):
@@ -121,4 +130,4 @@ class Heater(Equipment):
         self.systems = [self._equipment]
 
     def set_flow(self, value):
-        self._equipment.ls = value
+        self._equipment.flow_ls = value
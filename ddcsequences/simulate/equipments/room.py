@@ -4,6 +4,10 @@
 # Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
 #
 # Licensed under LGPLv3, see file LICENSE in this source tree.
+import time
+
+import numpy as np
+
 from ...simulate.equipment import Equipment, EquipmentGroup, OnOffDevice
 from ...simulate.system import (
     System,
@@ -20,9 +24,128 @@ from ...simulate.system import (
     SELECT,
 )
 
+# Heat carried by 1 l/s of air for 1 degC (1.2 kg/m3 x 1.006 kJ/kg.K), kW
+AIR_KW_PER_LS = 1.2 * 1.006 / 1000
+
 
 class Room(Equipment):
-    def __init__(self):
-        pass
-        # idea...
-        # would be a MIX
+    """
+    Zones modeled as a lumped RC thermal network (one node per zone).
+
+        C dT/dt = air (Ts - T) + UA (To - T) + gains
+
+    where air = supply_flow * 1.2 * 1.006 / 1000 (kW/K). Inputs are held
+    between two refreshes so the network is advanced with its exact
+    solution, whatever the time elapsed. Every value can be a scalar
+    (shared by all zones), an array of <zones> values or a BAC0 point.
+    All zones advance together in one numpy operation.
+
+    :zones: (int) number of zones
+    :supply_temp: (float) supply air temperature, degC
+    :supply_flow: (float) supply air flow, l/s
+    :outdoor_temp: (float) degC
+    :gains: (float) internal gains (people, lights, sun), kW
+    :ua: (float) envelope conductance, kW/K
+    :capacitance: (float) thermal capacitance of air and furniture, kJ/K
+    :temperature: (float) initial zone temperature, degC
+    :clock: (callable) time source in seconds (default : time.monotonic)
+    """
+
+    OUTPUTS = ("temperature", "return_temp")
+
+    def __init__(
+        self,
+        zones=1,
+        supply_temp=13,
+        supply_flow=0,
+        outdoor_temp=20,
+        gains=0,
+        ua=0.05,
+        capacitance=1000,
+        temperature=21,
+        clock=None,
+        name=None,
+        description=None,
+    ):
+        super().__init__(name=name, description=description)
+        self.zones = zones
+        self.ua = ua
+        self.capacitance = capacitance
+        self.clock = clock if clock else time.monotonic
+        self.supply_temp = supply_temp
+        self.supply_flow = supply_flow
+        self.outdoor_temp = outdoor_temp
+        self.gains = gains
+        self._set_state(
+            _temperature=self._array(temperature).copy(),
+            _updated=None,
+            _in_force=None,
+        )
+        self.refresh()
+
+    def _set_state(self, **state):
+        # internal state, not an input : do not trigger Equipment.__setattr__
+        self.__dict__.update(state)
+
+    def _array(self, value):
+        return np.broadcast_to(
+            np.asarray(Equipment.get_value(value), dtype="float64"), (self.zones,)
+        )
+
+    def use_clock(self, clock):
+        self._set_state(clock=clock, _updated=None)
+        self.refresh()
+
+    def update_equipment(self):
+        """
+        Advance the zones to now with the inputs in force since the last
+        update, then take the current inputs.
+        """
+        now = self.clock()
+        if self._updated is not None and now > self._updated:
+            air, supply, ua, outdoor, gains, capacitance = self._in_force
+            conductance = air + ua
+            with np.errstate(divide="ignore", invalid="ignore"):
+                balance = np.where(
+                    conductance > 0,
+                    (air * supply + ua * outdoor + gains) / conductance,
+                    0,
+                )
+            elapsed = now - self._updated
+            alpha = np.exp(-elapsed * conductance / capacitance)
+            self._temperature[:] = np.where(
+                conductance > 0,
+                balance + (self._temperature - balance) * alpha,
+                self._temperature + gains * elapsed / capacitance,
+            )
+        self._set_state(
+            _updated=now,
+            _in_force=(
+                self._array(self.supply_flow) * AIR_KW_PER_LS,
+                self._array(self.supply_temp),
+                self._array(self.ua),
+                self._array(self.outdoor_temp),
+                self._array(self.gains),
+                self._array(self.capacitance),
+            ),
+        )
+
+    def _result(self, values):
+        return float(values[0]) if self.zones == 1 else values
+
+    def temperature(self):
+        """
+        Zone temperatures (float when there is only one zone)
+        """
+        self.refresh()
+        return self._result(self._temperature.copy())
+
+    def return_temp(self):
+        """
+        Return air temperature : zones mixed by their supply flow
+        """
+        self.refresh()
+        flow = self._array(self.supply_flow)
+        if flow.sum() <= 0:
+            return float(self._temperature.mean())
+        return float(np.average(self._temperature, weights=flow))
@@ -4,6 +4,9 @@
 # Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
 #
 # Licensed under LGPLv3, see file LICENSE in this source tree.
+import time
+from bisect import bisect_left, bisect_right
+
 from ...simulate.equipment import Equipment, EquipmentGroup, OnOffDevice
 from ...simulate.system import (
     System,
@@ -21,49 +24,157 @@ from ...simulate.system import (
 )
 
 
+class Switch(object):
+    """
+    Level switch of one tank, created by Tank._add_property. Called, it
+    gives the state of the switch (so it can be used as an output, like
+    the methods of other equipments).
+    """
+
+    __slots__ = ("tank", "index")
+
+    def __init__(self, tank, index):
+        self.tank = tank
+        self.index = index
+
+    def __call__(self):
+        self.tank.refresh()
+        return self.index < self.tank._switches_on
+
+    def __repr__(self):
+        return "Switch {} of {}".format(self.index, self.tank.name)
+
+
 class Tank(Equipment):
-    @staticmethod
-    def getprop(self, name, i):
-        """
-        This method is used to dynamically create properties based on number of switches.
-        As the function returned is dynamic and will change based on equipment, 
-        this must be done at the equipment level, not the base class level.
+    """
+    Tank with level switches.
 
-        Works with _add_property(), see below.
-        """
+    Without volume, the level (%) is an input (value or BAC0 point). With a
+    volume, the level is a state integrated from the flows going in and
+    out of the tank, held between two refreshes :
 
-        def xget(self):
-            self.refresh()
-            try:
-                return lambda: self.proximity()[i]
-            except IndexError:
-                return False
+        level += (inflow - outflow) * elapsed / volume * 100
 
-        return xget
+    Flows can be values, BAC0 points, systems, callables (ex. the flow
+    method of a Pump) or a list of them (added together). Writing level
+    forces the state, level_percent() reads it.
 
-    def __init__(self, number_of_switches=5, level=0, name=None, description=None):
-        super().__init__(name=name, description=description)
+    Switch i is on when the level reaches thresholds[i] (by default, evenly
+    spaced at the middle of each 100 / number_of_switches band). With
+    hysteresis, a switch goes on at threshold + hysteresis / 2 and off at
+    threshold - hysteresis / 2. Switches are found with a bisection in
+    the sorted thresholds.
+
+    :number_of_switches: (int)
+    :level: (float) level in %, or initial level when volume is given
+    :volume: (float) capacity, in the volume unit of the flows x seconds
+    :inflow: flows entering the tank
+    :outflow: flows leaving the tank
+    :thresholds: (list) level of each switch in %
+    :hysteresis: (float) dead band of the switches in %
+    :clock: (callable) time source in seconds (default : time.monotonic)
+    """
+
+    OUTPUTS = ("level_percent", "proximity")
 
-        self.number_of_switches = number_of_switches
+    def __init__(
+        self,
+        number_of_switches=5,
+        level=0,
+        volume=None,
+        inflow=0,
+        outflow=0,
+        thresholds=None,
+        hysteresis=0,
+        clock=None,
+        name=None,
+        description=None,
+    ):
+        super().__init__(name=name, description=description)
+        if thresholds is None:
+            band = 100 / number_of_switches
+            thresholds = [(i + 0.5) * band for i in range(number_of_switches)]
+        thresholds = sorted(thresholds)
+        self._set_state(
+            number_of_switches=len(thresholds),
+            thresholds=thresholds,
+            hysteresis=hysteresis,
+            _upper=[t + hysteresis / 2 for t in thresholds],
+            _lower=[t - hysteresis / 2 for t in thresholds],
+            _switches_on=None,
+            _updated=None,
+            _level=None,
+            _net=0,
+            clock=clock if clock else time.monotonic,
+        )
+        self.volume = volume
+        self.inflow = inflow
+        self.outflow = outflow
         self.level = level
-        self.output_list = [False] * number_of_switches
+
+    def _set_state(self, **state):
+        # internal state, not an input : do not trigger Equipment.__setattr__
+        self.__dict__.update(state)
+
+    def use_clock(self, clock):
+        self._set_state(clock=clock, _updated=None)
+        self.refresh()
+
+    @staticmethod
+    def _flow(value):
+        if isinstance(value, (list, tuple)):
+            return sum(Tank._flow(each) for each in value)
+        if callable(value):
+            return value()
+        return Equipment.get_value(value)
+
+    def update_equipment(self):
+        level = Equipment.get_value(self.level)
+        now = self.clock()
+        if (
+            self.volume
+            and self._updated is not None
+            # a level written since the last update is taken as is
+            and level == self._level
+        ):
+            # flows in force since the last update
+            level += self._net * (now - self._updated) / self.volume * 100
+            level = min(100, max(0, level))
+            self._set_state(level=level)
+        self._set_state(
+            _updated=now,
+            _level=level,
+            _net=(
+                self._flow(self.inflow) - self._flow(self.outflow) if self.volume else 0
+            ),
+        )
+        self._update_switches(level)
+
+    def _update_switches(self, level):
+        on = bisect_right(self._upper, level)
+        if self._switches_on is not None and self.hysteresis:
+            # between its two thresholds, a switch keeps its state
+            off = bisect_left(self._lower, level)
+            on = max(on, min(self._switches_on, off))
+        self._set_state(_switches_on=on)
+
+    def level_percent(self):
+        """
+        Level in %, after integrating the flows up to now
+        """
+        self.refresh()
+        return self._level
 
     def proximity(self):
-        _number_of_switches = self.number_of_switches
-        _level_per_switch = 100 / _number_of_switches
-        a = range(0, 101, int(_level_per_switch))
-        base = [True] * _number_of_switches
-        find = Equipment.get_value(self.level)
-        idx = min(range(len(a)), key=lambda i: abs(a[i] - find))
-        mask = [
-            True if i < idx else False
-            for i, x in enumerate(range(0, _number_of_switches))
-        ]
-        return base and mask
+        """
+        State of every switch, lowest first
+        """
+        self.refresh()
+        return [i < self._switches_on for i in range(self.number_of_switches)]
 
     def _add_property(self, name, arg):
         """
         Called by generate for parameters declared with a add_property key in the yaml file.
+        Adds a Switch (callable) to this tank only.
         """
-        self.__setattr__("_" + name, None)
-        setattr(self.__class__, name, property(Tank.getprop(self, name, arg)))
+        self._set_state(**{name: Switch(self, arg)})
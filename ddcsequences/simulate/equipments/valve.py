@@ -24,6 +24,7 @@ from ...simulate.system import (
 
 class Valve(Equipment):
     _modes = ["heating", "cooling"]
+    OUTPUTS = ("leaving_temp", "leaving_flow")
 
     def __init__(
         self,
@@ -90,8 +91,8 @@ class Valve(Equipment):
 
     def leaving_temp(self):
         self.refresh()
-        return self._temperature.output
+        return self._temperature.last_value
 
     def leaving_flow(self):
         self.refresh()
-        return self._leaving_flow.output
+        return self._leaving_flow.last_value
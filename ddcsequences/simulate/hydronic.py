@@ -0,0 +1,307 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Steady state hydronic network : flow in every branch and pressure at every
+node, solved together.
+
+Units : flow in l/s, pressure in kPa.
+
+Each branch goes from one node to another and is made of, in series :
+
+- a fixed resistance k : dp = k * q * |q| (pipes, coils, fittings)
+- optionally a valve : q = 0.024 * Cv * f(position) * sqrt(dp)
+  (Cv in US gpm/psi^0.5, f linear or equal percentage)
+- optionally a pump : dp = head * speed^2 - head * (q / max_flow)^2
+  (affinity laws), with a check valve so it never flows backward
+
+The solver is a Newton (global gradient) iteration. Every branch is
+evaluated at once with numpy and the mass balance of every node is solved
+as one linear system, so a network of hundreds of branches is solved in a
+few iterations. The last solution is the starting point of the next solve.
+
+    net = Network()
+    net.add_pump("P1", "suction", "supply", head=250, max_flow=40)
+    net.add_pipe("main", "supply", "coil", k=0.05)
+    net.add_valve("V1", "coil", "return", cv=10, position=50)
+    net.add_pipe("return", "return", "suction", k=0.05)
+    net.solve()
+    net.flow("V1"), net.differential("coil", "return")
+"""
+
+import numpy as np
+
+# l/s per (Cv * kPa^0.5) : 1 gpm = 0.06309 l/s, 1 psi = 6.895 kPa
+CV_TO_SI = 0.06309 / 6.895**0.5
+
+
+class NetworkError(Exception):
+    pass
+
+
+class Network(object):
+    """
+    :reference: (str) node held at 0 kPa, default : first node created
+    :tolerance: (float) largest mass imbalance accepted at a node, l/s
+    :max_iterations: (int)
+    """
+
+    KINDS = ("pipe", "valve", "pump")
+    CHARACTERISTICS = ("linear", "equal_percentage")
+
+    def __init__(self, reference=None, tolerance=1e-6, max_iterations=50):
+        self.reference = reference
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.nodes = {}
+        self.branches = {}
+        self._definitions = []
+        self._compiled = False
+        self.pressures = None
+        self.flows = None
+        self.iterations = 0
+
+    def _node(self, name):
+        if name not in self.nodes:
+            self.nodes[name] = len(self.nodes)
+            self._compiled = False
+        return self.nodes[name]
+
+    def _add(self, name, start, end, **definition):
+        if name in self.branches:
+            raise ValueError("Branch {} already exists".format(name))
+        self.branches[name] = len(self._definitions)
+        definition.update(start=self._node(start), end=self._node(end))
+        self._definitions.append(definition)
+        self._compiled = False
+
+    def add_pipe(self, name, start, end, k):
+        """
+        :k: (float) resistance, kPa / (l/s)^2
+        """
+        if k <= 0:
+            raise ValueError("Provide pipe resistance k > 0")
+        self._add(name, start, end, kind="pipe", k=k)
+
+    def add_valve(
+        self,
+        name,
+        start,
+        end,
+        cv,
+        position=100,
+        characteristic="equal_percentage",
+        rangeability=50,
+        k=0,
+    ):
+        """
+        :cv: (float) flow coefficient fully open
+        :position: (float) opening in %
+        :k: (float) resistance in series (coil, piping), kPa / (l/s)^2
+        """
+        if characteristic not in Network.CHARACTERISTICS:
+            raise ValueError(
+                "Provide valve characteristic as one of {}".format(
+                    Network.CHARACTERISTICS
+                )
+            )
+        self._add(
+            name,
+            start,
+            end,
+            kind="valve",
+            k=k,
+            cv=cv,
+            position=position,
+            equal_percentage=characteristic == "equal_percentage",
+            rangeability=rangeability,
+        )
+
+    def add_pump(self, name, start, end, head, max_flow, speed=100, running=True, k=0):
+        """
+        Pump moving water from start (suction) to end (discharge).
+
+        :head: (float) shutoff head at full speed, kPa
+        :max_flow: (float) flow at zero head, full speed, l/s
+        :speed: (float) %
+        :running: (bool)
+        """
+        self._add(
+            name,
+            start,
+            end,
+            kind="pump",
+            k=k,
+            head=head,
+            max_flow=max_flow,
+            speed=speed,
+            running=running,
+        )
+
+    def _compile(self):
+        definitions = self._definitions
+        n = len(definitions)
+
+        def column(key, default=0.0):
+            return np.array([d.get(key, default) for d in definitions], dtype="float64")
+
+        self._kind = np.array([Network.KINDS.index(d["kind"]) for d in definitions])
+        self._is_valve = self._kind == 1
+        self._is_pump = self._kind == 2
+        self.k = column("k")
+        self.cv = column("cv")
+        self.position = column("position", 100)
+        self.rangeability = column("rangeability", 50)
+        self._equal_percentage = column("equal_percentage").astype(bool)
+        self.head = column("head")
+        self.max_flow = column("max_flow", 1)
+        self.speed = column("speed", 100)
+        self.running = column("running").astype(bool)
+
+        self._start = column("start").astype(int)
+        self._end = column("end").astype(int)
+        # flat positions of (start, start), (end, end), (start, end) and
+        # (end, start) in the n x n Laplacian of the nodes
+        size = len(self.nodes)
+        self._laplacian_index = np.concatenate(
+            (
+                self._start * size + self._start,
+                self._end * size + self._end,
+                self._start * size + self._end,
+                self._end * size + self._start,
+            )
+        )
+        # the reference node is not solved, its pressure is 0
+        self._reference = self.nodes.get(self.reference, 0)
+        self._solved = np.arange(len(self.nodes)) != self._reference
+        if self.pressures is None or len(self.pressures) != len(self.nodes):
+            self.pressures = np.zeros(len(self.nodes))
+        self.flows = np.zeros(n)
+        self._compiled = True
+
+    def set(self, name, **values):
+        """
+        Change a branch : set("V1", position=30), set("P1", speed=80)
+        """
+        if not self._compiled:
+            self._compile()
+        i = self.branches[name]
+        for key, value in values.items():
+            getattr(self, key)[i] = value
+
+    def _characteristics(self):
+        """
+        Resistance (dp = r * q * |q|, inf when closed) and pump head of
+        every branch
+        """
+        position = np.clip(self.position, 0, 100) / 100
+        fraction = np.where(
+            self._equal_percentage,
+            self.rangeability ** (position - 1),
+            position,
+        )
+        fraction = np.where(position > 0, fraction, 0)
+        valve_flow = CV_TO_SI * self.cv * fraction
+        on = self.running & (self.speed > 0)
+        with np.errstate(divide="ignore"):
+            resistance = (
+                self.k
+                + np.where(self._is_valve, 1 / valve_flow**2, 0)
+                + np.where(self._is_pump, self.head / self.max_flow**2, 0)
+            )
+        resistance = np.where(self._is_pump & ~on, np.inf, resistance)
+        head = np.where(self._is_pump & on, self.head * (self.speed / 100) ** 2, 0)
+        return resistance, head
+
+    def solve(self):
+        """
+        Solve flows and pressures for the current positions, speeds and
+        pump states. Returns the branch flows.
+
+        Global gradient algorithm (Todini and Pilati, the one of EPANET) :
+        each branch is linearized around its flow, the node pressures are
+        solved from the mass balance, then flows are corrected. Pumps
+        with a head lower than the pressure against them are closed
+        (check valve).
+        """
+        if not self._compiled:
+            self._compile()
+        resistance, head = self._characteristics()
+        n = len(self.nodes)
+        start, end, solved = self._start, self._end, self._solved
+        flows = self.flows.copy()
+        if not flows.any():
+            # any non zero start avoids a first step on the gradient floor
+            flows[:] = 1.0
+        pressures = self.pressures.copy()
+        pumps = self._is_pump
+        backflow = np.zeros(len(flows), dtype=bool)
+
+        for iteration in range(self.max_iterations):
+            closed = ~np.isfinite(resistance) | backflow
+            r = np.where(closed, 0, resistance)
+            # dp(q) = r q |q| - head, gradient 2 r |q| (kept away from 0)
+            gradient = np.maximum(2 * r * np.abs(flows), 1e-6)
+            weight = np.where(closed, 0, 1 / gradient)
+            correction = np.where(
+                closed, 0, (r * flows * np.abs(flows) - head) / gradient
+            )
+
+            # mass balance : L p = -A (q - y), L weighted Laplacian
+            source = flows - correction
+            rhs = np.bincount(end, source, n) - np.bincount(start, source, n)
+            laplacian = np.bincount(
+                self._laplacian_index,
+                np.concatenate((weight, weight, -weight, -weight)),
+                n * n,
+            ).reshape(n, n)[solved][:, solved]
+            # nodes isolated by closed branches are held at 0
+            diagonal = np.diag_indices_from(laplacian)
+            laplacian[diagonal] = np.where(
+                laplacian[diagonal] > 0, laplacian[diagonal], 1
+            )
+            pressures = np.zeros(n)
+            try:
+                pressures[solved] = np.linalg.solve(laplacian, rhs[solved])
+            except np.linalg.LinAlgError:
+                # part of the network cut from the reference (pumps off,
+                # valves closed) : its pressure is undefined
+                pressures[solved] = np.linalg.lstsq(laplacian, rhs[solved])[0]
+
+            drop = pressures[start] - pressures[end]
+            new_flows = np.where(closed, 0, source + weight * drop)
+            # check valves : close pumps pushed backward, reopen them
+            # once their head overcomes the pressure against them
+            _backflow = pumps & np.where(
+                backflow, drop + head < 0, new_flows < -self.tolerance
+            )
+            change = np.max(np.abs(new_flows - flows)) if len(flows) else 0
+            flows = new_flows
+            if change < self.tolerance and np.array_equal(_backflow, backflow):
+                break
+            backflow = _backflow
+        else:
+            raise NetworkError(
+                "Network did not converge, last change : {:.3g} l/s".format(change)
+            )
+        self.iterations = iteration
+        self.pressures = pressures
+        self.flows = flows
+        return flows
+
+    def flow(self, name):
+        return float(self.flows[self.branches[name]])
+
+    def pressure(self, node):
+        return float(self.pressures[self.nodes[node]])
+
+    def differential(self, high, low):
+        return self.pressure(high) - self.pressure(low)
+
+    def __repr__(self):
+        return "Network | {} nodes | {} branches".format(
+            len(self.nodes), len(self.branches)
+        )
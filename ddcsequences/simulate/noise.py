@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Seeded noise streams used for the random_error of systems.
+
+Each stream owns a numpy Generator and produces its samples in blocks, so
+reading the next value is an index in an array. Given the same seed, a
+stream gives the same sequence, which makes a simulation reproducible.
+
+Profiles :
+
+- uniform : uniform noise between -1 and 1 (times random_error)
+- colored : first-order (AR(1)) filtered noise, <correlation> between
+  consecutive samples, same variance as uniform
+- quantized : uniform noise rounded to multiples of <resolution>
+- drift : uniform noise plus a random walk moving <drift> per sample
+"""
+
+import numpy as np
+
+
+class Noise(object):
+    """
+    A reproducible source of noise.
+
+    :seed: (int) seed of the generator, None will use fresh entropy
+    :profile: (str) one of Noise.PROFILES
+    :block: (int) number of samples generated at once
+    :correlation: (float) colored profile, 0 <= correlation < 1
+    :resolution: (float) quantized profile, step in units of random_error
+    :drift: (float) drift profile, std of the random walk step per sample
+    """
+
+    PROFILES = ("uniform", "colored", "quantized", "drift")
+
+    def __init__(
+        self,
+        seed=None,
+        profile="uniform",
+        block=1024,
+        correlation=0.9,
+        resolution=0.1,
+        drift=0.01,
+    ):
+        if profile not in Noise.PROFILES:
+            raise ValueError(
+                "Provide noise profile as one of {}".format(Noise.PROFILES)
+            )
+        self.seed_sequence = (
+            seed
+            if isinstance(seed, np.random.SeedSequence)
+            else np.random.SeedSequence(seed)
+        )
+        self.profile = profile
+        self.block = block
+        self.correlation = correlation
+        self.resolution = resolution
+        self.drift = drift
+        self._rng = np.random.default_rng(self.seed_sequence)
+        self._buffer = None
+        self._index = 0
+        self._kernel = None
+        self._tail = None
+        self._offset = 0.0
+
+    def spawn(self):
+        """
+        New independent stream with the same profile. Children are derived
+        from the seed, so the n-th child is always the same stream.
+        """
+        (child,) = self.seed_sequence.spawn(1)
+        return Noise(
+            seed=child,
+            profile=self.profile,
+            block=self.block,
+            correlation=self.correlation,
+            resolution=self.resolution,
+            drift=self.drift,
+        )
+
+    def _colored(self, white):
+        # time along the first axis, one series per column (ex. sensors)
+        if self._kernel is None:
+            a = self.correlation
+            length = max(1, int(np.ceil(np.log(1e-6) / np.log(a)))) if a > 0 else 1
+            # AR(1) impulse response, scaled to keep the variance of the input
+            self._kernel = np.sqrt(1 - a**2) * a ** np.arange(length)
+        columns = white.shape[1:]
+        if self._tail is None or self._tail.shape[1:] != columns:
+            self._tail = np.zeros((len(self._kernel) - 1,) + columns)
+        full = np.concatenate((self._tail, white))
+        if len(self._kernel) > 1:
+            self._tail = full[-(len(self._kernel) - 1) :]
+        series = full.reshape(len(full), -1)
+        filtered = [
+            np.convolve(series[:, i], self._kernel, mode="valid")
+            for i in range(series.shape[1])
+        ]
+        return np.stack(filtered, axis=-1).reshape(white.shape)
+
+    def generate(self, size):
+        """
+        Next <size> samples of the stream as an array (array speed for many
+        sensors, or to fill the internal block).
+        """
+        samples = self._rng.uniform(-1, 1, size)
+        if self.profile == "colored":
+            samples = self._colored(np.atleast_1d(samples)).reshape(np.shape(samples))
+        elif self.profile == "quantized":
+            samples = np.round(samples / self.resolution) * self.resolution
+        elif self.profile == "drift":
+            walk = self._offset + np.cumsum(
+                self._rng.normal(0, self.drift, np.size(samples))
+            )
+            self._offset = walk[-1]
+            samples = samples + walk.reshape(np.shape(samples))
+        return samples
+
+    def sample(self):
+        if self._buffer is None or self._index >= len(self._buffer):
+            self._buffer = self.generate(self.block).tolist()
+            self._index = 0
+        value = self._buffer[self._index]
+        self._index += 1
+        return value
+
+    def apply(self, value, amplitude):
+        return value + amplitude * self.sample()
+
+    def __repr__(self):
+        return "Noise | profile : {} | entropy : {}".format(
+            self.profile, self.seed_sequence.entropy
+        )
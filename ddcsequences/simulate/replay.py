@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Recorded time series used to drive simulated inputs (see REPLAY system).
+
+A Trend is kept as a 2 x (n + 1) float64 array (time in seconds, value) saved
+in a .npy file and opened with memory mapping. The first column is a header
+holding the interpolate flag. Only the pages around the time
+being read are loaded, so a long history costs almost no RAM.
+
+Sources :
+
+- BAC0 history (pandas Series with a DatetimeIndex) : Trend.from_series
+- CSV (ex. point.history.to_csv()) : Trend.from_csv
+- Parquet (needs pyarrow) : Trend.from_parquet
+- .npy written by Trend.save : Trend.load
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+_STATES = {"active": 1, "inactive": 0}
+
+
+def _state(value):
+    """
+    BAC0 binary and multistate values : "active", "1: active", "2: Heating"
+    """
+    if isinstance(value, str):
+        state = value.split(":")[0].strip()
+        return _STATES.get(state, state)
+    return value
+
+
+def _seconds(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    return index.values.astype("datetime64[ns]").astype("int64") / 1e9
+
+
+class Trend(object):
+    """
+    Time series read at any time by interpolation.
+
+    :t: (array) time in seconds, increasing
+    :values: (array)
+    :interpolate: (bool) linear interpolation between samples. Use False for
+                  binary and multistate trends (value held until next sample)
+    """
+
+    def __init__(self, t, values, interpolate=True, name=None):
+        if len(t) != len(values) or len(t) == 0:
+            raise ValueError(
+                "Trend needs the same (non zero) number of times and values"
+            )
+        self.t = t
+        self.values = values
+        self.interpolate = interpolate
+        self.name = name
+        self._last = 0
+
+    @property
+    def start(self):
+        return float(self.t[0])
+
+    @property
+    def end(self):
+        return float(self.t[-1])
+
+    def __len__(self):
+        return len(self.t)
+
+    def _index(self, t):
+        """
+        Index i so t[i] <= t < t[i+1]. Sequential reads (the usual case when
+        following a clock) are solved without a search.
+        """
+        i = self._last
+        _t = self.t
+        if _t[i] <= t and (i + 1 == len(_t) or t < _t[i + 1]):
+            return i
+        if i + 2 < len(_t) and _t[i + 1] <= t < _t[i + 2]:
+            i += 1
+        else:
+            i = max(0, int(np.searchsorted(_t, t, side="right")) - 1)
+        self._last = i
+        return i
+
+    def value_at(self, t):
+        """
+        Value at time t (seconds). Before the first sample or after the
+        last one, the first or last value is held.
+        """
+        if t <= self.t[0]:
+            return float(self.values[0])
+        if t >= self.t[-1]:
+            return float(self.values[-1])
+        i = self._index(t)
+        v0 = float(self.values[i])
+        if not self.interpolate:
+            return v0
+        t0, t1 = float(self.t[i]), float(self.t[i + 1])
+        return v0 + (float(self.values[i + 1]) - v0) * (t - t0) / (t1 - t0)
+
+    def save(self, filename):
+        header = np.array([[float(self.interpolate)], [0.0]])
+        data = np.hstack((header, np.vstack((self.t, self.values)))).astype("float64")
+        np.save(filename, data)
+
+    @classmethod
+    def load(cls, filename, name=None):
+        data = np.load(filename, mmap_mode="r")
+        return cls(data[0, 1:], data[1, 1:], interpolate=bool(data[0, 0]), name=name)
+
+    @classmethod
+    def from_series(cls, series, interpolate=True, cache=None):
+        """
+        From a pandas Series indexed by timestamps (BAC0 point.history).
+        If cache is a filename, the trend is saved there and memory mapped.
+        """
+        series = series.dropna().sort_index()
+        values = pd.to_numeric(series, errors="coerce")
+        if values.isna().any():
+            # binary / multistate histories are held, not interpolated
+            values = pd.to_numeric(series.map(_state), errors="raise")
+            interpolate = False
+        trend = cls(
+            _seconds(series.index),
+            values.values.astype("float64"),
+            interpolate=interpolate,
+            name=series.name,
+        )
+        if cache:
+            trend.save(cache)
+            return cls.load(cache, name=series.name)
+        return trend
+
+    @classmethod
+    def from_csv(cls, filename, column=None, interpolate=True, cache=None):
+        """
+        First column is the timestamp. With cache, the parsed trend is saved
+        next to the file (filename.npy, or cache if it is a filename) and
+        reused while the CSV is unchanged.
+        """
+        return cls._cached(
+            filename,
+            lambda: pd.read_csv(filename, index_col=0, parse_dates=True),
+            column,
+            interpolate,
+            cache,
+        )
+
+    @classmethod
+    def from_parquet(cls, filename, column=None, interpolate=True, cache=None):
+        return cls._cached(
+            filename, lambda: pd.read_parquet(filename), column, interpolate, cache
+        )
+
+    @classmethod
+    def open(cls, filename, column=None, interpolate=True, cache=None):
+        """
+        Open a trend file based on its extension (.npy, .parquet or CSV)
+        """
+        if filename.endswith(".npy"):
+            return cls.load(filename, name=column)
+        elif filename.endswith(".parquet"):
+            return cls.from_parquet(filename, column, interpolate, cache)
+        return cls.from_csv(filename, column, interpolate, cache)
+
+    @classmethod
+    def _cached(cls, filename, reader, column, interpolate, cache):
+        if cache is True:
+            npy = "{}.{}.npy".format(filename, column) if column else filename + ".npy"
+        else:
+            npy = cache
+        if (
+            cache
+            and os.path.exists(npy)
+            and os.path.getmtime(npy) >= os.path.getmtime(filename)
+        ):
+            return cls.load(npy, name=column)
+        df = reader()
+        series = df[column] if column else df.iloc[:, 0]
+        return cls.from_series(
+            series, interpolate=interpolate, cache=npy if cache else None
+        )
+
+    def __repr__(self):
+        return "Trend {} | {} samples".format(self.name, len(self))
@@ -0,0 +1,445 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Simulation running in its own process.
+
+In a notebook or a test, BAC0 threads, pandas and plotting share the GIL
+with the simulation and delay its ticks. A SimulationProcess builds the
+equipments of a config (build.generate, without controller) in another
+process and refreshes them every <period> seconds. Clients talk to it
+through a local socket (multiprocessing.connection), every call handles
+many names at once :
+
+    simulation = SimulationProcess("plant.yaml", period=1)
+    client = simulation.start()
+    client.set({"AHU1.damper_command": 30, "CH1.start_command": True})
+    client.get(["AHU1.mixed_air_temp", "CH1.chwlt"])
+    client.subscribe(["CH1.chwlt"])
+    client.updates()        # [(tick, {"CH1.chwlt": 7.2}), ...]
+    client.timing()         # duration and lateness of the ticks
+    simulation.stop()
+
+Names are "<equipment>.<attribute>". Outputs (OUTPUTS) are answered from
+the snapshot of the last tick, other attributes are read when asked
+(methods are called). The process can also publish every tick in a
+SharedState block (see shared.py).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+# calls a client can make
+METHODS = ("get", "set", "subscribe", "names", "timing", "ping", "stop")
+
+
+class SimulationError(Exception):
+    pass
+
+
+class _Client(object):
+    """
+    One connection to the server. Replies and updates share the
+    connection, each send holds its lock. Updates are queued by the tick
+    and sent by a thread of the client, so a slow client never blocks the
+    tick : once <size> updates wait, the oldest are dropped.
+    """
+
+    def __init__(self, connection, size=100):
+        self.connection = connection
+        self.names = []
+        self.queue = deque(maxlen=size)
+        self.dropped = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def send(self, message):
+        with self._lock:
+            self.connection.send(message)
+
+    def put(self, tick, values):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(("update", tick, {name: values[name] for name in self.names}))
+        self._ready.set()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._send_updates, daemon=True)
+            self._thread.start()
+
+    def _send_updates(self):
+        while not self.closed:
+            self._ready.wait()
+            self._ready.clear()
+            while self.queue and not self.closed:
+                try:
+                    self.send(self.queue.popleft())
+                except (OSError, EOFError):
+                    self.closed = True
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+        self.connection.close()
+
+
+class SimulationServer(object):
+    """
+    Equipments and tick loop, inside the simulation process.
+
+    :config: (dict or filename) build.generate format
+    :period: (float) seconds between ticks
+    :shared: (str) name of a SharedState block to publish (optional)
+    :history: (int) ticks kept for the timing statistics
+    """
+
+    def __init__(self, config, period=1, shared=None, history=1000):
+        from .build import generate
+        from .shared import SharedState
+
+        registries = generate(None, config)
+        self.equipments = {}
+        for registry in (registries["equipments"], registries["groups"]):
+            self.equipments.update(registry)
+        self.period = period
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.tick = 0
+        self.values = {}
+        self.clients = []
+        self._durations = deque(maxlen=history)
+        self._lateness = deque(maxlen=history)
+        self.shared = (
+            SharedState(self.equipments.values(), name=shared) if shared else None
+        )
+
+    def _equipment(self, name):
+        equipment, attribute = name.rsplit(".", 1)
+        try:
+            return self.equipments[equipment], attribute
+        except KeyError:
+            raise KeyError("No equipment {}".format(equipment))
+
+    def refresh(self):
+        values = {}
+        for name, equipment in self.equipments.items():
+            for output, value in equipment.snapshot().items():
+                values["{}.{}".format(name, output)] = value
+        self.values = values
+        self.tick += 1
+        if self.shared is not None:
+            self.shared.publish()
+        # queued only, sent by the thread of each client
+        for client in self.clients:
+            if client.names and not client.closed:
+                client.put(self.tick, values)
+
+    def run(self):
+        """
+        Tick loop, on a fixed schedule (a late tick does not move the
+        next ones)
+        """
+        start = time.monotonic()
+        scheduled = start
+        while not self.stopped.is_set():
+            began = time.monotonic()
+            with self.lock:
+                self.refresh()
+            ended = time.monotonic()
+            self._lateness.append(began - scheduled)
+            self._durations.append(ended - began)
+            scheduled += self.period
+            if scheduled < ended:
+                # skip the ticks already missed
+                scheduled += (ended - scheduled) // self.period * self.period
+                scheduled += self.period
+            self.stopped.wait(max(0, scheduled - time.monotonic()))
+
+    def handle(self, connection):
+        """
+        Answer the calls of one client
+        """
+        client = _Client(connection)
+        with self.lock:
+            self.clients.append(client)
+        while not self.stopped.is_set() and not client.closed:
+            try:
+                method, args = connection.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                try:
+                    if method not in METHODS:
+                        raise SimulationError("Unknown call {}".format(method))
+                    reply = ("reply", getattr(self, "_" + method)(client, *args))
+                except Exception as error:
+                    reply = ("error", "{}: {}".format(type(error).__name__, error))
+            # sent outside the lock of the tick
+            try:
+                client.send(reply)
+            except (OSError, EOFError):
+                break
+            if method == "stop":
+                # the reply is sent, the tick loop can end
+                self.stopped.set()
+        with self.lock:
+            self.clients.remove(client)
+        client.close()
+
+    def serve(self, listener):
+        def accept():
+            while not self.stopped.is_set():
+                try:
+                    connection = listener.accept()
+                except Exception:
+                    # closed, or a client with the wrong key
+                    continue
+                threading.Thread(
+                    target=self.handle, args=(connection,), daemon=True
+                ).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        try:
+            self.run()
+        finally:
+            with self.lock:
+                listener.close()
+                if self.shared is not None:
+                    self.shared.close()
+
+    # calls
+    def _get(self, client, names):
+        result = []
+        for name in names:
+            try:
+                result.append(self.values[name])
+                continue
+            except KeyError:
+                pass
+            equipment, attribute = self._equipment(name)
+            value = getattr(equipment, attribute)
+            result.append(value() if callable(value) else value)
+        return result
+
+    def _set(self, client, values):
+        for name, value in values.items():
+            equipment, attribute = self._equipment(name)
+            setattr(equipment, attribute, value)
+        return len(values)
+
+    def _subscribe(self, client, names):
+        unknown = [name for name in names if name not in self.values]
+        if unknown:
+            raise KeyError("Not outputs : {}".format(unknown))
+        client.names = list(names)
+        return self.tick
+
+    def _names(self, client):
+        return list(self.values)
+
+    def _timing(self, client):
+        durations = np.array(self._durations)
+        lateness = np.array(self._lateness)
+        if not len(durations):
+            durations = lateness = np.zeros(1)
+        return {
+            "pid": os.getpid(),
+            "ticks": self.tick,
+            "period": self.period,
+            "duration_mean": float(durations.mean()),
+            "duration_max": float(durations.max()),
+            "lateness_mean": float(lateness.mean()),
+            "lateness_p99": float(np.percentile(lateness, 99)),
+            "lateness_max": float(lateness.max()),
+            "load": float(durations.mean() / self.period),
+            # updates this client did not read in time
+            "dropped": client.dropped,
+        }
+
+    def _ping(self, client):
+        return time.monotonic()
+
+    def _stop(self, client):
+        # stopped by handle() once the reply is sent
+        return self.tick
+
+
+def serve(config, period, shared, authkey, ready):
+    """
+    Target of the simulation process : build, tell the parent where to
+    connect, then tick until stopped.
+    """
+    try:
+        server = SimulationServer(config, period=period, shared=shared)
+        # outputs known before the first client connects
+        server.refresh()
+        listener = Listener(authkey=authkey)
+    except Exception as error:
+        ready.send(("error", "{}: {}".format(type(error).__name__, error)))
+        return
+    ready.send(("ready", listener.address))
+    ready.close()
+    server.serve(listener)
+
+
+class SimulationClient(object):
+    """
+    Connection to a simulation process.
+
+    :address: address of the listener (SimulationProcess.address)
+    :authkey: (bytes)
+    """
+
+    def __init__(self, address, authkey):
+        self.connection = Client(address, authkey=authkey)
+        self._updates = deque()
+
+    def _call(self, method, *args):
+        self.connection.send((method, args))
+        while True:
+            message = self.connection.recv()
+            if message[0] == "update":
+                self._updates.append(message[1:])
+                continue
+            kind, result = message
+            if kind == "error":
+                raise SimulationError(result)
+            return result
+
+    def get(self, names):
+        """
+        Values of many names, in order
+        """
+        return self._call("get", list(names))
+
+    def set(self, values):
+        """
+        Write many inputs (dict name -> value)
+        """
+        return self._call("set", dict(values))
+
+    def subscribe(self, names):
+        """
+        Receive the values of outputs <names> after every tick
+        (empty list : stop). Returns the current tick.
+        """
+        return self._call("subscribe", list(names))
+
+    def updates(self, timeout=0):
+        """
+        Updates received since the last call, as (tick, values). Waits up
+        to <timeout> seconds for the first one.
+        """
+        while self.connection.poll(timeout):
+            message = self.connection.recv()
+            if message[0] == "update":
+                self._updates.append(message[1:])
+            timeout = 0
+        updates = list(self._updates)
+        self._updates.clear()
+        return updates
+
+    def names(self):
+        return self._call("names")
+
+    def timing(self):
+        """
+        Tick statistics measured by the simulation process (seconds)
+        """
+        return self._call("timing")
+
+    def ping(self):
+        """
+        Round trip time of a call, seconds
+        """
+        start = time.monotonic()
+        self._call("ping")
+        return time.monotonic() - start
+
+    def stop(self):
+        return self._call("stop")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SimulationProcess(object):
+    """
+    :config: (dict or filename) equipments, build.generate format. They
+             are built without controller : inputs are set by clients.
+    :period: (float) seconds between ticks
+    :shared: (str) name of a SharedState block published every tick
+    """
+
+    def __init__(self, config, period=1, shared=None):
+        self.config = config
+        self.period = period
+        self.shared = shared
+        self.authkey = os.urandom(16)
+        self.address = None
+        self.process = None
+        self.client = None
+
+    def start(self, timeout=60):
+        """
+        Start the process, returns a connected SimulationClient
+        """
+        context = multiprocessing.get_context("spawn")
+        parent, child = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=serve,
+            args=(self.config, self.period, self.shared, self.authkey, child),
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+        if not parent.poll(timeout):
+            self.process.terminate()
+            raise SimulationError("Simulation process did not start")
+        kind, result = parent.recv()
+        if kind == "error":
+            self.process.join()
+            raise SimulationError(result)
+        self.address = result
+        self.client = self.connect()
+        return self.client
+
+    def connect(self):
+        """
+        Another client (ex. for another thread or process)
+        """
+        return SimulationClient(self.address, self.authkey)
+
+    def stop(self, timeout=5):
+        if self.process is None:
+            return
+        try:
+            self.client.stop()
+            self.client.close()
+        except (OSError, EOFError, SimulationError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+
+    def __repr__(self):
+        return "SimulationProcess | {} | period {} s".format(
+            "running" if self.process else "stopped", self.period
+        )
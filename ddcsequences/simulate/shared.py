@@ -0,0 +1,230 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Outputs of simulated equipments published in shared memory, so other
+processes (notebooks, reports, BACnet publishers) read the latest values
+without asking the simulation.
+
+    # simulation process
+    shared = SharedState([ahu, chiller], name="plant")
+    while True:
+        ...
+        shared.publish()
+
+    # any other process
+    plant = SharedStateReader("plant")
+    plant.read()["chiller.chwlt"]
+
+Layout of the block (fixed when it is created) :
+
+    header    4 x uint64 : sequence, pid of the writer, layout size, values
+    layout    JSON list of [name, offset, size]
+    values    float64 (booleans as 0 / 1, arrays flattened)
+
+Consistency is a seqlock : the writer makes the sequence odd, copies the
+values, then makes it even again. A reader copies the values between two
+reads of the sequence and starts over if it changed or was odd, it never
+blocks the writer.
+
+This module only needs numpy, readers do not import the simulation.
+"""
+
+import json
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+HEADER = 4
+_SEQUENCE, _PID, _LAYOUT, _COUNT = range(HEADER)
+
+
+def _floats(value):
+    return np.asarray(np.nan if value is None else value, dtype="float64").ravel()
+
+
+def _values_offset(layout_size):
+    # values aligned on 8 bytes
+    return (HEADER * 8 + layout_size + 7) // 8 * 8
+
+
+class SharedState(object):
+    """
+    Writer of the block.
+
+    :equipments: (list) Equipment or EquipmentGroup, members included,
+                 their OUTPUTS are published as "<name>.<output>"
+    :name: (str) name of the block (default : generated, see .name)
+    :extra: (dict) name -> callable, other values to publish (ex. state
+            of a PID : {"ahu.pid": lambda: pid._integral})
+    """
+
+    def __init__(self, equipments, name=None, extra=None):
+        self.equipments = self._walk(equipments)
+        self.extra = dict(extra or {})
+        staged = self._collect()
+        layout, offset = [], 0
+        for key, value in staged:
+            layout.append([key, offset, len(value)])
+            offset += len(value)
+        self.layout = layout
+        encoded = json.dumps(layout).encode("utf-8")
+        start = _values_offset(len(encoded))
+        self.memory = shared_memory.SharedMemory(
+            name=name, create=True, size=start + max(offset, 1) * 8
+        )
+        self.name = self.memory.name
+        self._header = np.ndarray((HEADER,), dtype="uint64", buffer=self.memory.buf)
+        self._header[:] = (0, os.getpid(), len(encoded), offset)
+        self.memory.buf[HEADER * 8 : HEADER * 8 + len(encoded)] = encoded
+        self.values = np.ndarray(
+            (offset,), dtype="float64", buffer=self.memory.buf, offset=start
+        )
+        self._staging = np.empty(offset)
+        self._write(staged)
+
+    @staticmethod
+    def _walk(equipments):
+        # members of groups follow the group, each equipment once
+        stack, found = list(equipments), []
+        while stack:
+            equipment = stack.pop(0)
+            if all(equipment is not each for each in found):
+                found.append(equipment)
+                stack.extend(getattr(equipment, "members", None) or [])
+        return found
+
+    def _collect(self):
+        staged = []
+        for equipment in self.equipments:
+            for output, value in equipment.snapshot().items():
+                staged.append(("{}.{}".format(equipment.name, output), _floats(value)))
+        for key, function in self.extra.items():
+            staged.append((key, _floats(function())))
+        return staged
+
+    def _write(self, staged):
+        for (key, offset, size), (_, value) in zip(self.layout, staged):
+            if len(value) != size:
+                raise ValueError(
+                    "{} : {} values, the block was created for {}".format(
+                        key, len(value), size
+                    )
+                )
+            self._staging[offset : offset + size] = value
+        self._header[_SEQUENCE] += 1
+        self.values[:] = self._staging
+        self._header[_SEQUENCE] += 1
+        return int(self._header[_SEQUENCE])
+
+    def publish(self):
+        """
+        Take a snapshot of every equipment and publish it.
+        Returns the sequence (2 x number of publications).
+        """
+        return self._write(self._collect())
+
+    def close(self, unlink=True):
+        """
+        Release the block, and remove it (readers keep their mapping until
+        they close)
+        """
+        self._header = self.values = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "SharedState | {} | {} values".format(self.name, len(self._staging))
+
+
+class SharedStateReader(object):
+    """
+    Reader of a block made by SharedState, in any process.
+
+    :name: (str) name of the block
+    """
+
+    def __init__(self, name):
+        self.memory = shared_memory.SharedMemory(name=name)
+        self.name = name
+        self._header = np.ndarray((HEADER,), dtype="uint64", buffer=self.memory.buf)
+        if int(self._header[_PID]) != os.getpid():
+            # the block belongs to the writer, do not remove it when this
+            # process ends
+            resource_tracker.unregister(self.memory._name, "shared_memory")
+        size = int(self._header[_LAYOUT])
+        layout = json.loads(bytes(self.memory.buf[HEADER * 8 : HEADER * 8 + size]))
+        self.layout = {key: (offset, length) for key, offset, length in layout}
+        # zero copy view, use read() for consistent values
+        self.values = np.ndarray(
+            (int(self._header[_COUNT]),),
+            dtype="float64",
+            buffer=self.memory.buf,
+            offset=_values_offset(size),
+        )
+
+    @property
+    def names(self):
+        return list(self.layout)
+
+    @property
+    def sequence(self):
+        return int(self._header[_SEQUENCE])
+
+    def _consistent(self, copy, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            before = int(self._header[_SEQUENCE])
+            if not before % 2:
+                values = copy()
+                if int(self._header[_SEQUENCE]) == before:
+                    return before, values
+            if time.monotonic() > deadline:
+                raise TimeoutError("{} : writer did not finish".format(self.name))
+
+    def copy(self, timeout=1):
+        """
+        Consistent copy of the values array, with its sequence
+        """
+        return self._consistent(self.values.copy, timeout)
+
+    def read(self, timeout=1):
+        """
+        Latest values as a dict, float or array (several values)
+        """
+        _, values = self.copy(timeout)
+        result = {}
+        for key, (offset, size) in self.layout.items():
+            value = values[offset : offset + size]
+            result[key] = float(value[0]) if size == 1 else value
+        return result
+
+    def value(self, name, timeout=1):
+        offset, size = self.layout[name]
+        _, value = self._consistent(self.values[offset : offset + size].copy, timeout)
+        return float(value[0]) if size == 1 else value
+
+    def close(self):
+        self._header = self.values = None
+        self.memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "SharedStateReader | {} | sequence {}".format(self.name, self.sequence)
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
+#
+# Licensed under LGPLv3, see file LICENSE in this source tree.
+"""
+Parameter sweep and Monte Carlo runs over simulated equipments.
+
+Each variant builds the equipments of a config (same format as
+build.generate, without controller), changes some statics, plays an input
+scenario on a simulated clock (no waiting) and records the outputs at each
+time step. Variants run in a process pool.
+
+    result = sweep(
+        "pumps.yaml",
+        grid={"P1.tau": [2, 5, 10]},
+        distributions={"P1.max_flow": lambda rng: rng.normal(400, 20)},
+        samples=100,
+        scenario={"P1.start_command": lambda t: t > 10},
+        t=np.arange(0, 120, 1.0),
+        outputs=["P1.flow", "P1.pressure"],
+    )
+    result.data.shape   # (variants, outputs, time steps)
+"""
+
+import copy
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .batch import input_values, play
+from .build import create_equip, open_config_file
+from .equipment import Equipment, EquipmentGroup, Snapshot
+from .system import System
+from ..tools import VirtualClock
+
+SweepResult = namedtuple("SweepResult", ["parameters", "outputs", "t", "data"])
+
+
+def _split(name, config):
+    """
+    "EQUIP.variable" -> ("EQUIP", "variable"). When the config holds only
+    one equipment, "variable" is accepted.
+    """
+    if "." in name:
+        return tuple(name.split(".", 1))
+    if len(config) == 1:
+        return next(iter(config)), name
+    raise ValueError("Use EQUIPMENT.variable, config holds many equipments")
+
+
+def variants(config, grid=None, distributions=None, samples=1, seed=None):
+    """
+    List of parameter dicts : every combination of grid, each repeated
+    <samples> times with values drawn from distributions (callables taking a
+    numpy Generator).
+    """
+    grid = grid or {}
+    distributions = distributions or {}
+    rng = np.random.default_rng(seed)
+    _variants = []
+    for combination in itertools.product(*grid.values()):
+        for _ in range(samples if distributions else 1):
+            variant = dict(zip(grid.keys(), combination))
+            for name, distribution in distributions.items():
+                variant[name] = distribution(rng)
+            _variants.append(variant)
+    return _variants
+
+
+def run_variant(config, parameters, scenario, t, outputs, seed=None):
+    """
+    Build the equipments with <parameters>, play the scenario (arrays, one
+    value per time step) and return an array (outputs, time steps).
+    """
+    config = copy.deepcopy(config)
+    for name, value in parameters.items():
+        equipment, variable = _split(name, config)
+        statics = config[equipment].get("statics") or {}
+        statics[variable] = value
+        config[equipment]["statics"] = statics
+
+    # the variant has its own noise and registrations, the ones of the
+    # caller are put back (processes=1 runs in the caller's process)
+    noise_source = System.noise_source
+    registries = (Equipment.defined, EquipmentGroup.defined)
+    registered = [dict(registry) for registry in registries]
+    System.seed(seed)
+    clock = VirtualClock(start=t[0])
+    equipments = {}
+    try:
+        for name, params in config.items():
+            equipments[name] = create_equip(controller=None, config=params, name=name)
+            equipments[name].use_clock(clock.time)
+
+        inputs = []
+        for name, values in scenario.items():
+            equipment, variable = _split(name, config)
+            inputs.append((equipments[equipment], variable, values.tolist()))
+        requested = {}
+        for name in outputs:
+            equipment, method = _split(name, config)
+            requested.setdefault(equipment, []).append(method)
+        # requested outputs of one equipment at a time step come from one
+        # refresh
+        snapshots = {
+            name: Snapshot(
+                equipment,
+                max_age=0,
+                clock=clock.time,
+                outputs=[m for m in equipment.OUTPUTS if m in requested.get(name, ())],
+            )
+            for name, equipment in equipments.items()
+        }
+        readers = []
+        for name in outputs:
+            equipment, method = _split(name, config)
+            readers.append(snapshots[equipment].reader(method))
+        data = np.array(play(clock, t, inputs, readers))
+    finally:
+        System.noise_source = noise_source
+        # do not keep thousands of variants in the registries
+        for registry, before in zip(registries, registered):
+            for key in list(registry):
+                if key not in before:
+                    del registry[key]
+                elif registry[key] is not before[key]:
+                    registry[key] = before[key]
+    return data
+
+
+def _run(args):
+    return run_variant(*args)
+
+
+def sweep(
+    config,
+    t,
+    outputs=None,
+    scenario=None,
+    grid=None,
+    distributions=None,
+    samples=1,
+    seed=None,
+    processes=None,
+):
+    """
+    Run every variant and collect the trajectories.
+
+    :config: (dict or filename) equipments, build.generate format
+    :t: (array) simulation times in seconds
+    :outputs: (list) "EQUIP.method" to record, default : outputs of the config
+    :scenario: (dict) "EQUIP.variable" -> scalar, array or callable of t
+    :grid: (dict) "EQUIP.static" -> list of values
+    :distributions: (dict) "EQUIP.static" -> callable(numpy Generator)
+    :samples: (int) draws per grid point when distributions are given
+    :seed: (int) makes parameters and noise reproducible
+    :processes: (int) size of the process pool, 1 runs in this process
+
+    :returns: SweepResult(parameters DataFrame, outputs, t, data array of
+              shape (variants, outputs, time steps))
+    """
+    config = config if isinstance(config, dict) else open_config_file(config)
+    t = np.asarray(t, dtype="float64")
+    scenario = input_values(scenario or {}, t)
+    if outputs is None:
+        outputs = [
+            "{}.{}".format(name, variable)
+            for name, params in config.items()
+            for variable in (params.get("outputs") or {})
+        ]
+    _variants = variants(config, grid, distributions, samples, seed)
+    seeds = np.random.SeedSequence(seed).generate_state(len(_variants))
+    jobs = [
+        (config, variant, scenario, t, outputs, int(_seed))
+        for variant, _seed in zip(_variants, seeds)
+    ]
+    if processes == 1:
+        results = [_run(job) for job in jobs]
+    else:
+        workers = processes or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(jobs) // (4 * workers))
+            results = list(pool.map(_run, jobs, chunksize=chunksize))
+    data = np.stack(results) if results else np.empty((0, len(outputs), len(t)))
+    return SweepResult(pd.DataFrame(_variants), outputs, t, data)
@@ -8,7 +8,6 @@
 from collections import namedtuple, deque
 import time
 from datetime import datetime as dt
-from random import uniform
 import numpy as np
 import math
 
@@ -17,6 +16,9 @@ from ddcmath.airflow import cfm2ls, ls2cfm
 
 from BAC0.core.devices.Points import Point
 
+from .adapters import PointAdapter, adapt
+from .noise import Noise
+
 _ELEMENTS = namedtuple("INPUT_ELEMENTS", ["min", "max"])
 
 
@@ -42,34 +44,72 @@ class Dampening(object):
     
     """
 
+    __slots__ = (
+        "factor",
+        "tau",
+        "tmax",
+        "t0",
+        "running",
+        "rising",
+        "dropping",
+        "_dt",
+        "_rise",
+    )
+
+    # Number of points of the decay curve
+    points = 1000
+
     def __init__(self, tau=10):
         self.factor = 1
         self.tau = tau
         self.tmax = 10 * self.tau
-        self.t = None
-        self.y = None
         self.t0 = None
         self.running = False
         self.rising = False
         self.dropping = False
+        self._rise = None
 
     def calculate(self, t0, rise=True):
+        # The curve is evaluated on demand instead of being stored
+        # as two arrays of 1000 floats for every change.
         self.t0 = t0
-        self.t = np.linspace(0, self.tmax, 1000)
-        if rise:
-            self.y = self.factor - (self.factor * np.exp(-self.t / self.tau))
+        self._rise = rise
+
+    def _curve(self, t):
+        if self._rise:
+            return self.factor - (self.factor * np.exp(-t / self.tau))
         else:
-            self.y = -self.factor * np.exp(-self.t / self.tau)
+            return -self.factor * np.exp(-t / self.tau)
+
+    @property
+    def t(self):
+        if self._rise is None:
+            return None
+        return np.linspace(0, self.tmax, self.points)
+
+    @property
+    def y(self):
+        if self._rise is None:
+            return None
+        return self._curve(self.t)
 
     @property
     def value(self):
-        result = -1
         _now = dt.now()
-        self._dt = (_now - self.t0).seconds
-        for i, each in enumerate(self.t):
-            if self._dt <= each:
-                result = self.y[i]
-                break
+        return self.at((_now - self.t0).seconds)
+
+    def at(self, elapsed):
+        """
+        Value of the dampening factor <elapsed> seconds after t0
+        """
+        result = -1
+        self._dt = elapsed
+        step = self.tmax / (self.points - 1)
+        if step > 0:
+            # first point of the curve where t >= dt
+            i = math.ceil(self._dt / step)
+            if i < self.points:
+                result = self._curve(i * step)
         if result > 0.99 or result == -1:
             result = 1
             self.running = False
@@ -97,8 +137,8 @@ class Dampening(object):
 
     def __repr__(self):
         s = "\n{}\nDampening\n{}\n".format("=" * 20, "=" * 20)
-        for each in self.__dict__:
-            s += "    {} : {}\n".format(each, getattr(self, each))
+        for each in self.__slots__:
+            s += "    {} : {}\n".format(each, getattr(self, each, None))
         return s
 
 
@@ -110,6 +150,7 @@ class InputElement(object):
     it will slow down everythin.
     """
 
+    __slots__ = ()
     items = []
 
     @staticmethod
@@ -118,24 +159,34 @@ class InputElement(object):
         This will cover the case of a BAC0.point or Systems that
         could also become the "input" of another system
         """
-        if isinstance(item, Point):
-            return item.lastValue
+        if isinstance(item, PointAdapter):
+            return item.read()
         elif isinstance(item, System):
             return item.output
+        elif isinstance(item, Point):
+            # Point not attached through the element
+            return adapt(item).read()
         else:
             return item
 
+    @classmethod
+    def storage(cls, name):
+        """
+        Name of the attribute holding the raw input of an item.
+        Items exposed as read-only properties are stored with a _prefix.
+        """
+        prop = getattr(cls, name, None)
+        if isinstance(prop, property) and prop.fset is None:
+            return "_" + name
+        return name
+
     def __getitem__(self, name):
         if name in self.items:
             return getattr(self, name)
 
     def __setitem__(self, name, value):
         if name in self.items:
-            try:
-                setattr(self, name, value)
-            except AttributeError:
-                # _prefix
-                setattr(self, "_" + name, value)
+            setattr(self, self.storage(name), adapt(value))
 
 
 class ValueCommandElement(InputElement):
@@ -154,11 +205,12 @@ class ValueCommandElement(InputElement):
 
     """
 
+    __slots__ = ("_value", "_command")
     items = ["value", "command"]
 
     def __init__(self, value=None, command=None):
-        self._value = value
-        self._command = command
+        self._value = adapt(value)
+        self._command = adapt(command)
 
     @property
     def value(self):
@@ -191,11 +243,12 @@ class MixInputElement(InputElement):
 
     """
 
+    __slots__ = ("_value", "_quantity")
     items = ["value", "quantity"]
 
     def __init__(self, value=None, quantity=None):
-        self._value = value
-        self._quantity = quantity
+        self._value = adapt(value)
+        self._quantity = adapt(quantity)
 
     @property
     def value(self):
@@ -229,10 +282,11 @@ class ValueElement(InputElement):
 
     """
 
+    __slots__ = ("_value",)
     items = ["value"]
 
     def __init__(self, value=None):
-        self._value = value
+        self._value = adapt(value)
 
     @property
     def value(self):
@@ -242,6 +296,37 @@ class ValueElement(InputElement):
         return "Value : {}".format(self.value)
 
 
+class ProcessElement(InputElement):
+    """
+    Input of a controller : a process value and a setpoint.
+    Iteration is possible to allow :
+
+        pv, setpoint = element
+    """
+
+    __slots__ = ("_pv", "_setpoint")
+    items = ["pv", "setpoint"]
+
+    def __init__(self, pv=None, setpoint=None):
+        self._pv = adapt(pv)
+        self._setpoint = adapt(setpoint)
+
+    @property
+    def pv(self):
+        return InputElement.get_value(self._pv)
+
+    @property
+    def setpoint(self):
+        return InputElement.get_value(self._setpoint)
+
+    def __iter__(self):
+        for each in [self.pv, self.setpoint]:
+            yield each
+
+    def __repr__(self):
+        return "PV : {} | Setpoint : {}".format(self.pv, self.setpoint)
+
+
 class FlexibleInput(object):
     """
     Input of a system can be multiple things. I need something
@@ -251,6 +336,8 @@ class FlexibleInput(object):
     a list, another system or a function
     """
 
+    __slots__ = ("_input",)
+
     def __init__(self, flex_input):
         self._input = flex_input
 
@@ -267,8 +354,8 @@ class FlexibleInput(object):
         return "{} | Type : {}".format(self.value, type(self._input))
 
     def __iter__(self):
-        if isinstance(self._input, ValueCommandElement) or isinstance(
-            self._input, MixInputElement
+        if isinstance(
+            self._input, (ValueCommandElement, MixInputElement, ProcessElement)
         ):
             for each in self._input:
                 yield each
@@ -295,9 +382,37 @@ class System(object):
 
     Timing is provided to cover transient reaction of systems.
 
+    random_error is drawn from a seeded Noise stream (see noise.py). Each
+    system gets its own stream, derived from System.noise_source in creation
+    order. Use System.seed() before building a plant to make it reproducible,
+    or assign system.noise directly.
+
     """
 
+    __slots__ = (
+        "input",
+        "output_reference",
+        "t_0",
+        "last_execution",
+        "last_value",
+        "dt",
+        "name",
+        "random_error",
+        "noise",
+        "_keys",
+    )
     ids = 0
+    noise_source = Noise()
+    # attributes changing while the system runs (see checkpoint.py)
+    STATE = ("t_0", "last_execution", "last_value", "dt")
+
+    @staticmethod
+    def seed(seed=None, **kwargs):
+        """
+        Plant-wide noise : systems created after this call get streams derived
+        from <seed>. kwargs are passed to Noise (profile, correlation...).
+        """
+        System.noise_source = Noise(seed=seed, **kwargs)
 
     def __init__(self, system_input, system_output=None, name=None, random_error=0):
         self.input = self.define_input(system_input)
@@ -311,6 +426,8 @@ class System(object):
         self.name = name
         System.ids += 1
         self.random_error = random_error
+        self.noise = System.noise_source.spawn() if random_error else None
+        self._keys = self._index_keys()
 
     def _pre_process(self):
         if not self.t_0:
@@ -320,7 +437,9 @@ class System(object):
         out = self.process()
         self.last_execution = dt.now()
         if self.random_error != 0:
-            out += uniform(-self.random_error, self.random_error)
+            if self.noise is None:
+                self.noise = System.noise_source.spawn()
+            out = self.noise.apply(out, self.random_error)
         self.last_value = out
         return out
 
@@ -355,6 +474,46 @@ class System(object):
             new_input = FlexibleInput(system_input)
         return new_input
 
+    def _index_keys(self):
+        """
+        Build the name -> (element, attribute) map used by item access
+        so system[name] is a dict lookup instead of a walk through
+        INPUT_ELEMENT_FORMAT on every call.
+        """
+        keys = {}
+        element = getattr(self.input, "_input", None)
+        if isinstance(element, InputElement):
+            for item in element.items:
+                keys[item] = (element, element.storage(item))
+        return keys
+
+    def walk(self):
+        """
+        This system and every system used as its input, recursively.
+        """
+        yield self
+        inputs = self.input if isinstance(self.input, list) else [self.input]
+        for each in inputs:
+            _input = getattr(each, "_input", None)
+            if isinstance(_input, System):
+                yield from _input.walk()
+
+    def _attributes(self):
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                yield name
+        # Subclasses defined without __slots__ still get a __dict__
+        for name in getattr(self, "__dict__", ()):
+            yield name
+
+    def keys(self):
+        """
+        Names answered by system[name] : input items, then public attributes.
+        """
+        return list(self._keys) + [
+            k for k in self._attributes() if not k.startswith("_")
+        ]
+
     def print_config(self):
         s = "{}\nSpecific Config\n{}\n".format("=" * 20, "=" * 20)
         for each in self.CONFIG_PARAMS:
@@ -373,25 +532,19 @@ class System(object):
         )
 
     def __getitem__(self, name):
-        if isinstance(self.INPUT_ELEMENT_FORMAT, tuple):
-            for each in self.INPUT_ELEMENT_FORMAT:
-                if name in each.items:
-                    return self.input.value[name]
-        else:
-            if name in self.INPUT_ELEMENT_FORMAT.items:
-                return self.input.value[name]
-        return getattr(self, name)
+        try:
+            element, _ = self._keys[name]
+        except KeyError:
+            return getattr(self, name)
+        return getattr(element, name)
 
     def __setitem__(self, name, value):
-        if isinstance(self.INPUT_ELEMENT_FORMAT, tuple):
-            for each in self.INPUT_ELEMENT_FORMAT:
-                if name in each.items:
-                    self.input.value[name] = value
+        try:
+            element, attribute = self._keys[name]
+        except KeyError:
+            setattr(self, name, value)
         else:
-            if name in self.INPUT_ELEMENT_FORMAT.items:
-                self.input.value[name] = value
-            else:
-                self.name = value
+            setattr(element, attribute, adapt(value))
 
 
 class PASSTHRU(System):
@@ -400,6 +553,7 @@ class PASSTHRU(System):
     and give it back in its output
     """
 
+    __slots__ = ("element1",)
     INPUT_ELEMENTS = _ELEMENTS(min=1, max=1)
     INPUT_ELEMENT_FORMAT = (System, list, float, int)
     CONFIG_PARAMS = ["element1"]
@@ -420,6 +574,7 @@ class SELECT(System):
     The selected input becomes the output
     """
 
+    __slots__ = ("element1", "element2", "selection")
     INPUT_ELEMENTS = _ELEMENTS(min=2, max=2)
     INPUT_ELEMENT_FORMAT = (System, list, float, int)
     CONFIG_PARAMS = ["element1", "element2", "selection"]
@@ -446,6 +601,7 @@ class ADD(System):
     Input must be a list of things to add
     """
 
+    __slots__ = ("elements",)
     INPUT_ELEMENTS = _ELEMENTS(min=1, max=float("inf"))
     INPUT_ELEMENT_FORMAT = (System, list, float, int)
     CONFIG_PARAMS = ["elements"]
@@ -469,6 +625,7 @@ class SUB(System):
     Input must be a list of 2 things to subtract (first element - second element)
     """
 
+    __slots__ = ("element1", "element2")
     INPUT_ELEMENTS = _ELEMENTS(min=2, max=2)
     INPUT_ELEMENT_FORMAT = (System, list, float, int)
     CONFIG_PARAMS = ["element1", "element2"]
@@ -490,6 +647,7 @@ class HEAT(System):
     get the output
     """
 
+    __slots__ = ("power_kw", "power_btu", "flow_cfm", "flow_ls")
     INPUT_ELEMENTS = _ELEMENTS(min=2, max=2)
     INPUT_ELEMENT_FORMAT = ValueCommandElement
     CONFIG_PARAMS = ["power_kw", "power_btu", "flow_cfm", "flow_ls"]
@@ -513,7 +671,7 @@ class HEAT(System):
             self.power_btu = self.power_kw * 3412
         elif btu:
             self.power_btu = btu
-            self.powe_kw = self.power_btu / 3412
+            self.power_kw = self.power_btu / 3412
 
         if cfm:
             self.flow_cfm = cfm
@@ -533,6 +691,7 @@ class MIX(System):
     calculate the resulting output of mixing the 2 inputs.
     """
 
+    __slots__ = ("element1", "element2")
     INPUT_ELEMENTS = _ELEMENTS(min=2, max=2)
     INPUT_ELEMENT_FORMAT = MixInputElement
     CONFIG_PARAMS = ["element1", "element2"]
@@ -559,6 +718,7 @@ class LINEAR(System):
     maximum delta depending on a command.
     """
 
+    __slots__ = ("delta_max", "decrease")
     INPUT_ELEMENTS = _ELEMENTS(min=1, max=1)
     INPUT_ELEMENT_FORMAT = ValueCommandElement
     CONFIG_PARAMS = ["delta_max"]
@@ -598,6 +758,7 @@ class SPAN(System):
     maximum delta depending on a command.
     """
 
+    __slots__ = ("xrange_A", "xrange_B", "yrange_A", "yrange_B")
     INPUT_ELEMENTS = _ELEMENTS(min=1, max=1)
     INPUT_ELEMENT_FORMAT = (System, ValueElement, int, float)
     CONFIG_PARAMS = ["xrange_A", "xrange_B", "yrange_A", "yrange_B"]
@@ -650,10 +811,47 @@ class TRANSIENT(System):
 
     This system use the dampening function 
 
+    Two engines are available :
+
+    - "dampening" (default) : every change adds a Dampening object and the
+      output is the sum of all of them, so cost grows with the number of changes
+    - "lag" : a single state advanced as a first-order lag, using exact
+      discretization (exp(-dt/tau)) so any time step gives the right value.
+
+    :clock: (callable) time source in seconds for the lag engine
+            (default : time.monotonic)
+
     """
 
+    ENGINES = ("dampening", "lag")
+
+    __slots__ = (
+        "delta_max",
+        "min_output",
+        "max_output",
+        "last_command",
+        "last_input",
+        "last_offset",
+        "tau",
+        "decrease",
+        "engine",
+        "clock",
+        "_changes",
+        "_state",
+        "_target",
+        "_updated",
+    )
     INPUT_ELEMENTS = _ELEMENTS(min=1, max=1)
     INPUT_ELEMENT_FORMAT = (System, ValueCommandElement, ValueElement)
+    STATE = System.STATE + (
+        "last_command",
+        "last_input",
+        "last_offset",
+        "_changes",
+        "_state",
+        "_target",
+        "_updated",
+    )
     CONFIG_PARAMS = [
         "delta_max",
         "min_output",
@@ -663,6 +861,7 @@ class TRANSIENT(System):
         "last_offset",
         "tau",
         "decrease",
+        "engine",
     ]
 
     def __init__(
@@ -676,10 +875,16 @@ class TRANSIENT(System):
         tau=10,
         decrease=False,
         random_error=0,
+        engine="dampening",
+        clock=None,
     ):
         super().__init__(
             system_input, system_output, name=name, random_error=random_error
         )
+        if engine not in TRANSIENT.ENGINES:
+            raise ValueError(
+                "Provide TRANSIENT engine as one of {}".format(TRANSIENT.ENGINES)
+            )
         self.delta_max = delta_max
         self.min_output = min_output
         self.max_output = max_output
@@ -689,6 +894,11 @@ class TRANSIENT(System):
         self.tau = tau
         self._changes = []
         self.decrease = decrease
+        self.engine = engine
+        self.clock = clock if clock else time.monotonic
+        self._state = 0
+        self._target = 0
+        self._updated = None
 
     def _effect(self):
         # Select between increasing effect and decreasing effect
@@ -697,6 +907,22 @@ class TRANSIENT(System):
         else:
             return 1
 
+    def _advance(self, target):
+        """
+        Lag engine : move the state toward the target in force since the
+        last execution, then hold the new target until the next one.
+        """
+        now = self.clock()
+        if self._updated is not None:
+            if self.tau > 0:
+                alpha = math.exp(-(now - self._updated) / self.tau)
+                self._state = self._target + (self._state - self._target) * alpha
+            else:
+                self._state = self._target
+        self._updated = now
+        self._target = target
+        return self._state
+
     def calculcate_dT(self):
         _transient_over_list = []
         dT = 0
@@ -716,6 +942,12 @@ class TRANSIENT(System):
         if callable(command):
             command = command()
 
+        if self.engine == "lag":
+            dT = self._advance((command / 100) * self.delta_max)
+            self.last_command = command
+            self.last_offset = dT
+            return sensor + (self._effect() * dT)
+
         def _clean():
             _delta_T = (command / 100) * self.delta_max
             self._changes = [(_delta_T, 1)]
@@ -760,6 +992,12 @@ class TRANSIENT(System):
         if isinstance(new_input, System):
             new_input = new_input.output
 
+        if self.engine == "lag":
+            dT = self._advance(new_input)
+            self.last_input = new_input
+            self.last_offset = dT
+            return self._effect() * dT
+
         def _clean():
             new_dT, can_clean = self.calculcate_dT()
             dT = new_dT
@@ -816,3 +1054,180 @@ class TRANSIENT(System):
         #    _ = _clean()
 
         return output
+
+
+class PID(System):
+    """
+    Software PID controller giving an output in % :
+
+        output = bias + kp * (e + 1 / ti * integral(e dt) + td * de/dt)
+
+    with e = pv - setpoint when direct acting (cooling), setpoint - pv when
+    reverse acting (heating). The derivative acts on the PV only, a
+    setpoint change does not kick the output. The integral stops growing
+    while the output is held at min_output or max_output (anti-windup).
+
+    Input is a ProcessElement, PV and setpoint can be values, BAC0 points
+    or systems. The PV can be the system driven by this PID (ex. a
+    TRANSIENT commanded by it) : while the PID is computing, the plant
+    reading it gets its last output, which closes the loop.
+
+    :kp: (float) proportional gain, % per unit of PV
+    :ti: (float) integral time, seconds (0 : no integral)
+    :td: (float) derivative time, seconds
+    :direct_acting: (bool)
+    :bias: (float) output without error, %
+    :clock: (callable) time source in seconds (default : time.monotonic)
+    """
+
+    __slots__ = (
+        "kp",
+        "ti",
+        "td",
+        "direct_acting",
+        "bias",
+        "min_output",
+        "max_output",
+        "clock",
+        "_integral",
+        "_derivative",
+        "_last_pv",
+        "_updated",
+        "_busy",
+    )
+    INPUT_ELEMENTS = _ELEMENTS(min=1, max=1)
+    INPUT_ELEMENT_FORMAT = ProcessElement
+    STATE = System.STATE + ("_integral", "_derivative", "_last_pv", "_updated")
+    CONFIG_PARAMS = [
+        "kp",
+        "ti",
+        "td",
+        "direct_acting",
+        "bias",
+        "min_output",
+        "max_output",
+    ]
+
+    def __init__(
+        self,
+        system_input,
+        system_output=None,
+        name=None,
+        kp=10,
+        ti=60,
+        td=0,
+        direct_acting=True,
+        bias=0,
+        min_output=0,
+        max_output=100,
+        clock=None,
+        random_error=0,
+    ):
+        super().__init__(
+            system_input, system_output, name=name, random_error=random_error
+        )
+        if min_output >= max_output:
+            raise ValueError("Provide min_output lower than max_output")
+        self.kp = kp
+        self.ti = ti
+        self.td = td
+        self.direct_acting = direct_acting
+        self.bias = bias
+        self.min_output = min_output
+        self.max_output = max_output
+        self.clock = clock if clock else time.monotonic
+        self._busy = False
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the integral and the derivative (ex. when the loop is
+        disabled)
+        """
+        self._integral = 0
+        self._derivative = 0
+        self._last_pv = None
+        self._updated = None
+
+    def process(self):
+        if self._busy:
+            # read again by the plant it drives while reading the PV
+            if self.last_value is None:
+                return min(max(self.bias, self.min_output), self.max_output)
+            return self.last_value
+        self._busy = True
+        try:
+            pv, setpoint = self.input
+        finally:
+            self._busy = False
+        sign = 1 if self.direct_acting else -1
+        error = sign * (pv - setpoint)
+        now = self.clock()
+        integral = self._integral
+        if self._updated is None:
+            self._updated, self._last_pv = now, pv
+        elif now > self._updated:
+            elapsed = now - self._updated
+            if self.ti > 0:
+                integral += self.kp * error * elapsed / self.ti
+            # de/dt with a constant setpoint
+            self._derivative = sign * self.kp * self.td * (pv - self._last_pv) / elapsed
+            self._updated, self._last_pv = now, pv
+
+        output = self.bias + self.kp * error + integral + self._derivative
+        # anti-windup : no integration pushing further a saturated output
+        if (output > self.max_output and integral > self._integral) or (
+            output < self.min_output and integral < self._integral
+        ):
+            integral = self._integral
+            output = self.bias + self.kp * error + integral + self._derivative
+        self._integral = integral
+        return min(max(output, self.min_output), self.max_output)
+
+
+class REPLAY(System):
+    """
+    System whose output is a recorded trend (see replay.Trend) read at the
+    simulation clock. Can be used as an equipment input (ex. outdoor_air_temp)
+    to replay real conditions.
+
+    :start: (float) trend time (seconds) matching the first read, defaults
+            to the beginning of the trend
+    :speed: (float) trend seconds per clock second (ex. 60 replays one
+            minute of history every second)
+    :clock: (callable) time source in seconds (default : time.monotonic)
+    """
+
+    __slots__ = ("start", "speed", "clock", "_clock_0")
+    INPUT_ELEMENTS = _ELEMENTS(min=1, max=1)
+    INPUT_ELEMENT_FORMAT = None
+    STATE = System.STATE + ("_clock_0",)
+    CONFIG_PARAMS = ["start", "speed"]
+
+    def __init__(
+        self,
+        system_input,
+        system_output=None,
+        name=None,
+        start=None,
+        speed=1,
+        clock=None,
+        random_error=0,
+    ):
+        super().__init__(
+            system_input, system_output, name=name, random_error=random_error
+        )
+        self.start = start if start is not None else self.input.value.start
+        self.speed = speed
+        self.clock = clock if clock else time.monotonic
+        self._clock_0 = None
+
+    @property
+    def trend_time(self):
+        now = self.clock()
+        if self._clock_0 is None:
+            self._clock_0 = now
+        return self.start + (now - self._clock_0) * self.speed
+
+    def process(self):
+        return self.input.value.value_at(self.trend_time)
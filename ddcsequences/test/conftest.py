@@ -49,6 +49,7 @@ from bacpypes.basetypes import EngineeringUnits
 
 # from ddcsequences.simulate.equipment import Pump
 from ddcsequences.simulate.equipment import generate, Equipment
+from ddcsequences import tools
 
 BACNET_OBJECTS = [
     ObjectFactory.definition(
@@ -211,6 +212,14 @@ def network_and_devices():
     time.sleep(1)
 
 
+@pytest.fixture
+def virtual_clock():
+    # helpers of tools wait on a clock that does not sleep
+    old = tools.use_clock(tools.VirtualClock())
+    yield
+    tools.use_clock(old)
+
+
 """
 
 import BAC0
@@ -0,0 +1,83 @@
+"""
+Devices and points standing in for BAC0 in the tests that do not need a
+network : each point returns its values in order, then keeps the last one.
+"""
+
+
+class FakeProperties:
+    def __init__(self, device, name, type="analogValue"):
+        self.device = device
+        self.name = name
+        self.description = "Fake {}".format(name)
+        self.type = type
+        if "multiState" in type:
+            self.units_state = ["Satisfied", "Heating", "Cooling"]
+        else:
+            self.units_state = "degreesCelsius"
+
+
+class FakePoint:
+    def __init__(self, device, name, values, type="analogValue"):
+        self.properties = FakeProperties(device, name, type)
+        self.values = list(values)
+        self.lastValue = None
+
+    @property
+    def value(self):
+        self.properties.device.requests += 1
+        return self._next()
+
+    @property
+    def boolValue(self):
+        return self.value == "active"
+
+    def _next(self):
+        if len(self.values) > 1:
+            return self.values.pop(0)
+        return self.values[0]
+
+    def _set(self, value):
+        self.values = [value]
+
+    def write(self, value):
+        self.values = [value]
+
+    def __eq__(self, other):
+        return self.value == other
+
+    __hash__ = object.__hash__
+
+
+class FakeDevice:
+    """
+    :points: dict name -> (values,) or (values, type)
+    """
+
+    def __init__(self, points):
+        self.notes = []
+        # reads of the network, one per read_multiple or per point.value
+        self.requests = 0
+        # points looked up by name
+        self.resolved = 0
+        self.points = {
+            name: FakePoint(self, name, *definition)
+            for name, definition in points.items()
+        }
+
+    def __getitem__(self, name):
+        self.resolved += 1
+        return self.points[name]
+
+    def __setitem__(self, name, value):
+        self.points[name].write(value)
+
+    def __contains__(self, name):
+        return name in self.points
+
+    def read_multiple(self, names):
+        self.requests += 1
+        for name in names:
+            self.points[name].lastValue = self.points[name]._next()
+
+    def note(self, note):
+        self.notes.append(note)
@@ -0,0 +1,38 @@
+from ddcsequences import tools
+from ddcsequences.cache import CachedDevice
+from fakes import FakeDevice
+
+
+def test_cached_device():
+    clock = tools.VirtualClock()
+    device = FakeDevice({"ZN-T": ([21.0],), "SF-C": (["inactive"], "binaryOutput")})
+    controller = CachedDevice(device, ttl=1, clock=clock.time)
+    znt = controller["ZN-T"]
+    assert controller["ZN-T"] is znt
+    assert tools.var_name(znt) == "ZN-T (Fake ZN-T)"
+    assert znt.value == 21 and znt == 21 and znt < 22 and znt - 1 == 20
+    assert 1 + znt == 22
+    tools.format_variable_value(znt)
+    assert device.requests == 1
+    assert device.resolved == 1
+
+    clock.sleep(1)
+    assert znt.value == 21
+    assert device.requests == 2
+
+    # writes are seen at once
+    controller["ZN-T"] = 18
+    assert znt == 18
+    znt.write(17)
+    assert znt.value == 17
+    assert device.requests == 4
+
+    sf = controller["SF-C"]
+    assert sf != True and sf == "inactive"
+    device.points["SF-C"].write("active")
+    assert sf == False
+    controller.invalidate()
+    assert sf == True
+
+    tools.add_note(znt.properties.device, "note")
+    assert device.notes == ["note"]
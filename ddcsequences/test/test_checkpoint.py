@@ -0,0 +1,51 @@
+import math
+from datetime import timedelta
+
+from ddcsequences import tools
+from ddcsequences.simulate.checkpoint import Checkpoint
+from ddcsequences.simulate.equipments import Tank, Valve
+from ddcsequences.simulate.noise import Noise
+
+
+def test_checkpoint(tmp_path):
+    def plant(clock, seed):
+        tank = Tank(volume=1000, inflow=10, clock=clock.time, name="ckpt.tank")
+        valve = Valve(name="ckpt.valve", entering_temp=60, delta_T=20, tau=3600)
+        valve._leaving_flow.random_error = 0.5
+        valve._leaving_flow.noise = Noise(seed=seed)
+        return tank, valve
+
+    filename = str(tmp_path / "soak.ckpt")
+    old = tools.use_clock(tools.VirtualClock(100))
+    try:
+        clock = tools.VirtualClock()
+        tank, valve = plant(clock, 1)
+        # a soak test running for 30 minutes
+        for _, dampening in valve._temperature._changes:
+            dampening.t0 -= timedelta(seconds=1800)
+        clock.now = 45
+        assert math.isclose(tank.level_percent(), 45)
+        temp = valve.leaving_temp()
+        assert 67 < temp < 68
+        checkpoint = Checkpoint(filename, [tank, valve], compact_every=3)
+        first = checkpoint.save()
+        # nothing new : only the readings of the clocks
+        assert checkpoint.save() < first / 4
+        with open(filename, "ab") as file:
+            file.write(b"\x80\x05cut by a crash")
+        valve.leaving_temp()
+        expected = [valve._leaving_flow.noise.sample() for _ in range(3)]
+
+        tools.clock.now = 0
+        clock = tools.VirtualClock()
+        tank, valve = plant(clock, 2)
+        assert valve.leaving_temp() < 61
+        assert Checkpoint(filename, [tank, valve]).restore() > 10
+        assert tools.clock.now == 100
+        assert math.isclose(valve.leaving_temp(), temp, abs_tol=0.05)
+        assert [valve._leaving_flow.noise.sample() for _ in range(3)] == expected
+        # level integrated from the restored state, on the new clock
+        clock.now = 10
+        assert math.isclose(tank.level_percent(), 55)
+    finally:
+        tools.use_clock(old)
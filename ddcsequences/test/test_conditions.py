@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from ddcsequences import tools
+from ddcsequences.conditions import ConditionEngine, read_values, state_of
+from ddcsequences.vendors.jci.utils import Sensors_Feedback
+from fakes import FakeDevice
+
+
+class Replayed(FakeDevice):
+    # no read_multiple : points are read one by one
+    read_multiple = property()
+
+
+def test_condition_engine(virtual_clock):
+    ahu = FakeDevice(
+        {
+            "ZNT-STATE": ([1, 1, 2], "multiStateValue"),
+            "SF-C": (["inactive", "active"], "binaryOutput"),
+            "HTG-O": ([0, 0, 0, 30],),
+            "DA-T": ([13.0],),
+        }
+    )
+    boiler = FakeDevice({"HWS-T": ([60, 71],)})
+    engine = ConditionEngine()
+    called = []
+    engine.wait_for_state(ahu["ZNT-STATE"], "Heating")
+    engine.check_that(ahu["SF-C"], True, callback=lambda: called.append(1))
+    engine.wait_for_value_gt(ahu["HTG-O"], 0)
+    engine.check_isclose(boiler["HWS-T"], 70, rtol=0.05)
+    engine.wait_for_value_lt(ahu["DA-T"], 10, timeout=5)
+    assert engine.run() is False
+    assert called == [1]
+    # one request per device and per cycle, whatever the number of points
+    assert ahu.requests == 4
+    assert boiler.requests == 2
+    assert [c.success for c in engine.done].count(True) == 4
+    assert "Timeout" in ahu.notes[-1]
+
+    engine.wait_for_state(ahu["SF-C"], False, timeout=0, log_only=False)
+    with pytest.raises(TimeoutError):
+        engine.run()
+
+    replayed = Replayed({"A": ([1],), "B": ([2],)})
+    assert read_values([replayed["A"], replayed["B"], replayed["A"]]) == [1, 2, 1]
+    assert replayed.requests == 2
+
+    fan = ahu["SF-C"]
+    assert state_of(fan, "1: active") is True
+    assert state_of(fan, "0: inactive") is False
+    assert state_of(fan, 1) is True
+
+
+def test_stages_from_one_read():
+    controller = FakeDevice(
+        {
+            name: ([state], "binaryOutput")
+            for name, state in (
+                ("CLG1-C", "active"),
+                ("CLG2-C", "active"),
+                ("CLG3-C", "inactive"),
+                ("CLG4-C", "inactive"),
+                ("HTG1-C", "inactive"),
+                ("HTG2-C", "inactive"),
+            )
+        }
+    )
+    feedback = Sensors_Feedback()
+    feedback.controller = controller
+    assert feedback.number_clg_stages() == 2
+    assert feedback.number_htg_stages() == 0
+    assert controller.requests == 2
+
+
+def test_detect_trend(virtual_clock):
+    noise = np.random.default_rng(0).normal(0, 0.5, 150)
+    rising = list(np.arange(150) * 0.2 + noise)
+    device = FakeDevice({"CLG-O": (rising,), "HTG-O": ([40, 30, 20, 10, 0],)})
+    start = tools.clock.time()
+    assert tools.detect_rise_in_output(device["CLG-O"], maximum=100)
+    # decided in seconds, not after the minutes of fixed waits
+    assert tools.clock.time() - start < 60
+    assert "rising" in device.notes[-1]
+    assert not tools.detect_drop_in_output(device["CLG-O"])
+    # pinned at minimum
+    assert tools.detect_drop_in_output(device["HTG-O"], minimum=0)
+
+    flat = FakeDevice({"OUT": (list(noise),)})
+    assert not tools.detect_rise_in_output(flat["OUT"], timeout=200)
+    assert "Timeout" in flat.notes[-1]
@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from ddcsequences.pid import PID_Loop, fit_fopdt
+
+
+def fopdt(t, gain, tau, dead_time, step=1):
+    return gain * step * -np.expm1(-np.clip(t - dead_time, 0, None) / tau)
+
+
+def test_fit_fopdt():
+    t = np.arange(0, 600, 2.0)
+    y = 20 + fopdt(t, 2.5, 60, 14, step=4)
+    y += np.random.default_rng(0).normal(0, 0.05, len(t))
+    response = fit_fopdt(t, y, step=4)
+    assert math.isclose(response.gain, 2.5, rel_tol=0.02)
+    assert math.isclose(response.time_constant, 60, rel_tol=0.05)
+    assert abs(response.dead_time - 14) < 2
+    assert response.r2 > 0.99
+    # measured on the samples : noise only
+    assert response.overshoot < 2
+    # 2 % band : dead time + 3.9 tau, noise keeps it out a bit longer
+    assert 0 < response.settling_time - (14 + 60 * math.log(50)) < 40
+    # SIMC : tau_c = dead time
+    assert math.isclose(response.kp, 60 / (2.5 * 28), rel_tol=0.1)
+
+    # many loops fitted together
+    gains = np.array([1, -2, 0.5])
+    taus = np.array([20, 80, 150])
+    dead_times = np.array([0, 10, 30])
+    y = fopdt(t, gains[:, None], taus[:, None], dead_times[:, None])
+    responses = fit_fopdt(t, y)
+    assert np.allclose(responses.gain, gains, rtol=0.02)
+    assert np.allclose(responses.time_constant, taus, rtol=0.05)
+    assert np.allclose(responses.dead_time, dead_times, atol=2)
+
+
+class Trended:
+    def __init__(self, history):
+        self.history = history
+
+
+def test_step_response():
+    since = pd.Timestamp("2020-01-01 12:00:00")
+    index = since + pd.to_timedelta(np.arange(-10, 400, 5.0), unit="s")
+    t = (index - since).total_seconds().values
+    output = Trended(pd.Series(30 + fopdt(t, -1.5, 45, 10, step=-2), index=index))
+    pv = Trended(pd.Series(np.where(t < 0, 24, 22), index=index))
+    loop = PID_Loop(pv=pv, output=output)
+    response = loop.step_response(since)
+    assert math.isclose(response.gain, -1.5, rel_tol=0.02)
+    assert math.isclose(response.time_constant, 45, rel_tol=0.1)
@@ -0,0 +1,37 @@
+from ddcsequences import tools
+from ddcsequences.recorder import RecordingDevice, ReplayDevice
+from fakes import FakeDevice
+
+
+def plant():
+    return FakeDevice({"ZNT-STATE": (["Satisfied", "Heating"],), "ZN-T": ([21.0],)})
+
+
+def sequence(controller):
+    controller["ZN-T"].write(controller["ZN-T"].value - 5)
+    tools.wait_for_state(controller["ZNT-STATE"], "Heating", log_only=False)
+    return "RH-O" in controller
+
+
+def test_record_and_replay(tmp_path):
+    filename = str(tmp_path / "sequence.rec.gz")
+    recorder = RecordingDevice(plant(), filename)
+    old = tools.use_clock(tools.VirtualClock())
+    try:
+        assert sequence(recorder) is False
+    finally:
+        tools.use_clock(old)
+    recorder.close()
+    assert recorder.device.notes
+
+    device = ReplayDevice(filename)
+    with device.virtual_time():
+        assert sequence(device) is False
+    assert device.divergences == []
+    assert device["ZN-T"].properties.description == "Fake ZN-T"
+    assert device.notes == recorder.device.notes
+
+    device = ReplayDevice(filename)
+    with device.virtual_time():
+        device["ZN-T"].write(10)
+    assert device.divergences[0]["args"] == [10]
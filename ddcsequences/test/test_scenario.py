@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from ddcsequences.scenario import Scenario, ScenarioError
+from fakes import FakeDevice
+
+YAML = """
+name: AHU heating
+timeout: 60
+steps:
+    occupied:
+        write: {OCC-SCHEDULE: 2}
+    eff_occ:
+        wait_for_state: [EFF-OCC, Heating]
+        after: occupied
+    fan:
+        check_that: {point: SF-C, value: true, timeout: 10}
+    heating:
+        detect_rise: {point: HTG-O, maximum: 100}
+        after: [eff_occ, fan]
+    never:
+        wait_for_value_gt: [DA-T, 50]
+        timeout: 6
+    after_never:
+        note: not reached
+        after: never
+"""
+
+
+def test_scenario(virtual_clock, tmp_path):
+    filename = tmp_path / "ahu.yaml"
+    filename.write_text(YAML)
+    scenario = Scenario.open(str(filename))
+    assert scenario.order.index("heating") > scenario.order.index("eff_occ")
+    assert scenario.points == ["DA-T", "EFF-OCC", "HTG-O", "OCC-SCHEDULE", "SF-C"]
+
+    ahu = FakeDevice(
+        {
+            "OCC-SCHEDULE": ([1],),
+            "EFF-OCC": ([1, 1, 2], "multiStateValue"),
+            "SF-C": (["inactive", "active"], "binaryOutput"),
+            "HTG-O": ([0, 0, 10, 20, 40, 60, 80, 100],),
+            "DA-T": ([13.0],),
+        }
+    )
+    schedule = scenario.compile(ahu)
+    assert schedule.run() is False
+    assert schedule.results == {
+        "occupied": True,
+        "eff_occ": True,
+        "fan": True,
+        "heating": True,
+        "never": False,
+        "after_never": None,
+    }
+    assert ahu.points["OCC-SCHEDULE"].values == [2]
+    # independent branches polled together, one request per cycle (and the
+    # read of the note of the write)
+    assert ahu.requests <= 9
+
+
+def test_scenario_validation():
+    with pytest.raises(ScenarioError):
+        Scenario({"steps": {"a": {"wait": ["A", 1]}}})
+    with pytest.raises(ScenarioError):
+        Scenario({"steps": {"a": {"check_that": ["A"]}}})
+    with pytest.raises(ScenarioError):
+        Scenario({"steps": {"a": {"note": "x", "after": "b"}}})
+    with pytest.raises(ScenarioError, match="timout"):
+        Scenario(
+            {
+                "steps": {
+                    "a": {"wait_for_state": {"point": "A", "state": 1, "timout": 5}}
+                }
+            }
+        )
+    with pytest.raises(ScenarioError):
+        Scenario({"steps": {"a": {"detect_rise": {"point": "A", "rtol": 0.1}}}})
+    Scenario(
+        {"steps": {"a": {"check_isclose": {"point": "A", "value": 1, "rtol": 0.1}}}}
+    )
+    with pytest.raises(ScenarioError):
+        Scenario(
+            {
+                "steps": {
+                    "a": {"note": "x", "after": "b"},
+                    "b": {"note": "y", "after": "a"},
+                }
+            }
+        )
+    scenario = Scenario(json.loads('{"steps": {"a": {"check_that": ["MISSING", 1]}}}'))
+    with pytest.raises(ScenarioError):
+        scenario.compile(FakeDevice({}))
+
+
+def test_failed_write(virtual_clock):
+    scenario = Scenario(
+        {
+            "steps": {
+                "occupied": {"write": {"OCC-SCHEDULE": 2}},
+                "fan": {"check_that": ["SF-C", True], "after": "occupied"},
+            }
+        }
+    )
+    ahu = FakeDevice({"OCC-SCHEDULE": ([1],), "SF-C": (["active"], "binaryOutput")})
+
+    def rejected(value):
+        raise ValueError("write access denied")
+
+    ahu.points["OCC-SCHEDULE"]._set = rejected
+    schedule = scenario.compile(ahu)
+    assert schedule.run() is False
+    assert schedule.results == {"occupied": False, "fan": None}
+    assert "not been adjusted" in ahu.notes[-1]
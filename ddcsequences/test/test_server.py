@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+import pytest
+
+from ddcsequences.simulate.server import SimulationProcess, SimulationError, _Client
+
+
+def test_simulation_process():
+    config = {
+        "V1": {
+            "class": "Valve",
+            "description": "Heating valve",
+            "statics": {"entering_temp": 60, "modulation": 0, "tau": 0.01},
+        }
+    }
+    simulation = SimulationProcess(config, period=0.05)
+    client = simulation.start()
+    try:
+        assert client.names() == ["V1.leaving_temp", "V1.leaving_flow"]
+        assert client.get(["V1.leaving_temp", "V1.entering_temp"]) == [60, 60]
+        assert client.set({"V1.entering_temp": 50}) == 1
+        assert client.subscribe(["V1.leaving_temp"]) >= 1
+        updates = client.updates(timeout=5)
+        assert updates and updates[-1][1] == {"V1.leaving_temp": 50}
+        with pytest.raises(SimulationError):
+            client.get(["V2.leaving_temp"])
+        timing = client.timing()
+        assert timing["ticks"] >= 1 and timing["pid"] != os.getpid()
+        assert timing["duration_max"] < timing["period"]
+        assert client.ping() < 1
+    finally:
+        simulation.stop()
+    assert simulation.process is None
+
+
+class SlowConnection(object):
+    # a subscriber that stops reading
+    def __init__(self):
+        self.sent = []
+        self.release = threading.Event()
+
+    def send(self, message):
+        self.release.wait()
+        self.sent.append(message)
+
+    def close(self):
+        self.release.set()
+
+
+def test_slow_subscriber():
+    connection = SlowConnection()
+    client = _Client(connection, size=10)
+    client.names = ["V1.leaving_temp"]
+    start = time.monotonic()
+    for tick in range(200):
+        client.put(tick, {"V1.leaving_temp": tick, "V1.modulation": 0})
+    # the tick never waits for the connection
+    assert time.monotonic() - start < 0.5
+    assert len(client.queue) == 10 and client.dropped >= 189
+    connection.release.set()
+    deadline = time.monotonic() + 5
+    while client.queue and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert connection.sent[-1] == ("update", 199, {"V1.leaving_temp": 199})
+    client.close()
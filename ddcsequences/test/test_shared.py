@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from ddcsequences.simulate.equipments import AHU, Room, Valve
+from ddcsequences.simulate.shared import SharedState, SharedStateReader
+
+
+def test_shared_state():
+    valve = Valve(name="shared.valve", entering_temp=60, modulation=0)
+    room = Room(zones=3, name="shared.room")
+    with SharedState([valve, room], extra={"pid": lambda: 12.5}) as shared:
+        with SharedStateReader(shared.name) as reader:
+            assert reader.names == [
+                "shared.valve.leaving_temp",
+                "shared.valve.leaving_flow",
+                "shared.room.temperature",
+                "shared.room.return_temp",
+                "pid",
+            ]
+            values = reader.read()
+            assert values["shared.valve.leaving_temp"] == 60
+            assert np.allclose(values["shared.room.temperature"], [21] * 3)
+            assert reader.value("pid") == 12.5
+
+            valve.entering_temp = 70
+            assert shared.publish() == reader.sequence == 4
+            assert reader.value("shared.valve.leaving_temp") == 70
+            # writer stopped in the middle of a copy
+            shared._header[0] += 1
+            with pytest.raises(TimeoutError):
+                reader.read(timeout=0.01)
+            shared._header[0] += 1
+
+
+def test_shared_members():
+    ahu = AHU(name="shared.ahu", outdoor_air_temp=-10, return_air_temp=22)
+    zones = [np.zeros(3)]
+    with SharedState(
+        [ahu, ahu.members[0]], extra={"zones": lambda: zones[0]}
+    ) as shared:
+        names = [key for key, _, _ in shared.layout]
+        assert "shared.ahu.mixed_air_temp" in names
+        assert "shared.ahu.supply_fan.status" in names
+        # each equipment once
+        assert names.count("shared.ahu.dampers.mixed_air_temp") == 1
+
+        zones[0] = np.zeros(4)
+        with pytest.raises(ValueError, match="zones"):
+            shared.publish()
@@ -1,3 +1,9 @@
+import math
+import os
+import pytest
+import numpy as np
+import pandas as pd
+
 from ddcsequences.simulate.system import (
     System,
     ADD,
@@ -8,7 +14,31 @@ from ddcsequences.simulate.system import (
     MIX,
     LINEAR,
     TRANSIENT,
+    Dampening,
+    REPLAY,
+    PID,
+    ProcessElement,
+)
+from ddcsequences.simulate.adapters import adapt, BinaryAdapter
+from ddcsequences.simulate.noise import Noise
+from ddcsequences.simulate.replay import Trend
+from ddcsequences.simulate.sweep import sweep
+from ddcsequences.simulate.batch import simulate
+from ddcsequences.simulate.curves import Curve
+from ddcsequences.simulate.equipment import Equipment, EquipmentGroup, Snapshot
+from ddcsequences.simulate.equipments import (
+    AHU,
+    HydronicLoop,
+    ParallelPumps,
+    Pump,
+    Room,
+    Tank,
+    Valve,
+    fan,
 )
+from ddcsequences.simulate.hydronic import Network, CV_TO_SI
+from ddcsequences.tools import VirtualClock
+from BAC0.core.devices.Points import BooleanPoint
 
 
 def test_add():
@@ -43,3 +73,456 @@ def test_linear():
 #    VFD.output
 #    VFD["command"] = 50
 #    assert VFD.output == 10
+
+
+def test_item_access():
+    i = ValueCommandElement(10, 0)
+    t = TRANSIENT(i, delta_max=20, tau=1)
+    assert t["command"] == 0
+    t["command"] = 50
+    assert i.command == 50
+    assert t["tau"] == 1
+    m = MIX([MixInputElement(-20, 10), MixInputElement(21, 90)])
+    assert m["element1"] is m.element1
+    valve = Valve(entering_temp=60, delta_T=20, modulation=50)
+    assert valve["entering_temp"] == 60
+    # not indexed : first system answering
+    assert valve["output"] == 60
+    with pytest.raises(KeyError):
+        valve["missing"]
+    # systems change only by being bound again, which rebuilds the index
+    with pytest.raises(AttributeError):
+        valve.systems.append(ADD([1, 2]))
+    shadow = ValueCommandElement(70, 50)
+    valve.systems = [TRANSIENT(shadow, delta_max=20)] + list(valve.systems)
+    assert valve["value"] == 70
+
+
+class FakeBinary(BooleanPoint):
+    def __init__(self, state):
+        self.state = state
+
+    @property
+    def lastValue(self):
+        return self.state
+
+
+def test_point_adapters():
+    point = FakeBinary("active")
+    adapter = adapt(point)
+    assert isinstance(adapter, BinaryAdapter)
+    assert adapter.read() is True
+    assert adapter.read(convert_boolean=True) == 100
+    point.state = "0: inactive"
+    assert adapter.read(convert_boolean=True) == 0
+    assert adapter.state == "0: inactive"
+    assert adapt(12) == 12
+    i = ValueCommandElement(20, point)
+    point.state = "1: active"
+    assert i.command is True
+
+
+def test_slots():
+    d = Dampening(tau=10)
+    d.rise()
+    assert not hasattr(d, "__dict__")
+    assert len(d.t) == len(d.y) == 1000
+    assert d.value < 1
+    i = ValueCommandElement(0, 100)
+    t = TRANSIENT(i, delta_max=20)
+    assert not hasattr(i, "__dict__")
+    assert not hasattr(t, "__dict__")
+    assert "delta_max" in t.keys()
+
+
+def test_transient_lag_engine():
+    now = [0]
+    i = ValueCommandElement(10, 100)
+    t = TRANSIENT(
+        i,
+        delta_max=20,
+        tau=10,
+        decrease=True,
+        min_output=-5,
+        engine="lag",
+        clock=lambda: now[0],
+    )
+    assert t.output == 10
+    now[0] = 10
+    assert math.isclose(t.output, 10 - 20 * (1 - math.exp(-1)))
+    now[0] = 1000
+    assert t.output == -5
+    with pytest.raises(ValueError):
+        TRANSIENT(ValueCommandElement(0, 0), engine="unknown")
+
+
+def test_seeded_noise():
+    def run():
+        System.seed(1234)
+        a = ADD([2, 3], random_error=0.5)
+        return [a.output for _ in range(2000)]
+
+    first, second = run(), run()
+    assert first == second
+    assert all(4.5 <= each <= 5.5 for each in first)
+    assert first[0] != first[1]
+    for profile in Noise.PROFILES:
+        samples = Noise(seed=1, profile=profile, block=64).generate((100, 50))
+        assert samples.shape == (100, 50)
+    # colored : each sensor (column) filtered along its own time axis
+    sensors = Noise(seed=1, profile="colored").generate((200, 3))
+    white = np.random.default_rng(np.random.SeedSequence(1)).uniform(-1, 1, (200, 3))
+    for i in range(3):
+        alone = Noise(profile="colored")._colored(white[:, i])
+        assert np.allclose(sensors[:, i], alone)
+    q = Noise(seed=1, profile="quantized", resolution=0.5).generate(100)
+    assert set(q.tolist()) <= {-1.0, -0.5, 0.0, 0.5, 1.0}
+    with pytest.raises(ValueError):
+        Noise(profile="pink")
+
+
+def test_replay(tmp_path):
+    index = pd.date_range("2020-01-01", periods=4, freq="1min")
+    oat = pd.Series([0.0, 6.0, 12.0, 6.0], index=index, name="OA-T")
+    csv = str(tmp_path / "oat.csv")
+    oat.to_csv(csv)
+    assert not isinstance(Trend.from_csv(csv).t, np.memmap)
+    assert not os.path.exists(csv + ".npy")
+    trend = Trend.from_csv(csv, cache=True)
+    assert isinstance(trend.t, np.memmap)
+    assert Trend.from_csv(csv, cache=True).values[2] == 12.0
+
+    now = [0]
+    r = REPLAY(trend, speed=60, clock=lambda: now[0])
+    assert r.output == 0
+    now[0] = 0.5
+    assert math.isclose(r.output, 3)
+    now[0] = 1.5
+    assert math.isclose(r.output, 9)
+    now[0] = 100
+    assert r.output == 6
+
+    status = pd.Series(["inactive", "1: active", "inactive"], index=index[:3])
+    binary = Trend.from_series(status)
+    assert binary.interpolate is False
+    assert binary.value_at(binary.start + 90) == 1
+
+
+def test_sweep(monkeypatch):
+    config = {
+        "P1": {
+            "class": "Pump",
+            "description": "Pump",
+            "statics": None,
+            "inputs": None,
+            "outputs": {"flow": None},
+        }
+    }
+    t = np.arange(0, 60, 1.0)
+    kwargs = dict(
+        scenario={"P1.start_command": lambda t: t >= 10},
+        grid={"P1.max_flow": [100, 400]},
+        seed=1,
+    )
+    result = sweep(config, t, processes=1, **kwargs)
+    assert result.data.shape == (2, 1, 60)
+    assert list(result.parameters["P1.max_flow"]) == [100, 400]
+    flow = result.data[:, 0, :]
+    assert abs(flow[0, 5]) < 1
+    assert 95 < flow[0, -1] < 105
+    assert 390 < flow[1, -1] < 410
+    assert np.array_equal(flow, sweep(config, t, processes=1, **kwargs).data[:, 0])
+
+    # outputs not requested are not evaluated
+    def unrequested(self):
+        raise ZeroDivisionError
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Pump, "amperage", unrequested)
+        assert sweep(config, t, processes=1, **kwargs).data.shape == (2, 1, 60)
+
+    # an equipment of the caller, and its noise, are left alone
+    live = Pump(name="P1")
+    noise_source = System.noise_source
+    sweep(config, t, processes=1, **kwargs)
+    assert Equipment.defined["P1"] is live
+    assert System.noise_source is noise_source
+    Equipment.defined.pop("P1")
+    # same variants and seeds through the process pool
+    pooled = sweep(config, t, processes=2, **kwargs)
+    assert np.array_equal(flow, pooled.data[:, 0])
+
+    # a group created without members
+    group = EquipmentGroup(name="sweep.group")
+    group.use_clock(VirtualClock().time)
+    EquipmentGroup.defined.pop(group.id)
+
+
+def test_batch_simulate():
+    valve = Valve(mode="heating", entering_temp=60, delta_T=20, tau=30)
+    t = np.arange(0, 600, 1.0)
+    result = simulate(valve, {"modulation": lambda t: np.where(t >= 60, 100, 0)}, t)
+    assert set(result) == {"leaving_temp", "leaving_flow"}
+
+    # outputs not requested are not evaluated
+    other = Valve(mode="heating", entering_temp=60, delta_T=20, tau=30)
+    other.__dict__["leaving_flow"] = lambda: 1 / 0
+    assert list(simulate(other, {"modulation": 100}, t, ["leaving_temp"])) == [
+        "leaving_temp"
+    ]
+    temp = result["leaving_temp"]
+    assert temp.shape == (600,)
+    assert temp[59] == 60
+    assert math.isclose(temp[90], 60 + 20 * (1 - math.exp(-1)), abs_tol=0.01)
+    assert math.isclose(temp[-1], 80, abs_tol=0.01)
+
+    inputs = pd.DataFrame(
+        {"modulation": [0, 100, 100]},
+        index=pd.date_range("2020-01-01", periods=3, freq="30s"),
+    )
+    result = simulate(Valve(entering_temp=60, tau=30), inputs, outputs=["leaving_temp"])
+    assert list(result) == ["leaving_temp"]
+    assert math.isclose(result["leaving_temp"][2], 60 + 10 * (1 - math.exp(-1)))
+
+
+def test_room():
+    clock = VirtualClock()
+    flow = np.linspace(50, 150, 500)
+    room = Room(
+        zones=500,
+        supply_flow=flow,
+        supply_temp=13,
+        outdoor_temp=-10,
+        gains=1,
+        clock=clock.time,
+    )
+    assert np.all(room.temperature() == 21)
+    clock.now = 1e6
+    air = flow * 1.2 * 1.006 / 1000
+    balance = (air * 13 + 0.05 * -10 + 1) / (air + 0.05)
+    assert np.allclose(room.temperature(), balance)
+    assert min(balance) < room.return_temp() < max(balance)
+
+    single = Room(supply_flow=100, supply_temp=13, outdoor_temp=20, gains=0)
+    t = np.arange(0, 7200, 60.0)
+    result = simulate(single, {"supply_flow": lambda t: np.where(t < 3600, 100, 0)}, t)
+    temp = result["temperature"]
+    assert temp[0] == 21
+    assert temp[59] < temp[0]
+    # supply air stopped : back toward outdoor temperature
+    assert temp[59] < temp[-1] < 20
+
+
+def test_ahu():
+    ahu = AHU(outdoor_air_temp=-10, return_air_temp=22, damper_command=20)
+    t = np.arange(0, 300, 1.0)
+    result = simulate(
+        ahu,
+        {
+            "supply_fan_command": lambda t: t >= 10,
+            "heating_command": lambda t: np.where(t >= 150, 50, 0),
+        },
+        t,
+    )
+    assert result["supply_fan_status"][9] == 0
+    assert result["supply_fan_status"][10] == 1
+    assert math.isclose(result["mixed_air_temp"][140], 15.6, abs_tol=0.01)
+    assert math.isclose(result["discharge_air_temp"][140], 15.6, abs_tol=0.01)
+    assert math.isclose(result["discharge_air_temp"][-1], 28.1, abs_tol=0.01)
+    assert 245 < result["static_pressure"][-1] < 255
+    assert set(ahu.values) == {"MA-T", "DA-T", "SF-S", "SF-FLOW", "SA-SP"}
+
+    # command bound to a binary point
+    command = FakeBinary("active")
+    ahu = AHU(supply_fan_command=command)
+    assert ahu.supply_fan_status() is True
+    command.state = "inactive"
+    assert ahu.snapshot()["supply_fan_status"] is False
+
+    # outputs read together come from one refresh
+    refreshes = []
+    refresh = ahu.dampers.refresh
+    ahu.dampers.refresh = lambda: refreshes.append(refresh())
+    ahu.snapshot()
+    assert len(refreshes) == 1
+
+
+def test_hydronic_network():
+    net = Network()
+    net.add_pump("P1", "suction", "supply", head=250, max_flow=40)
+    net.add_pipe("main", "supply", "coil", k=0.05)
+    net.add_valve("V1", "coil", "return", cv=10, k=5)
+    net.add_pipe("return", "return", "suction", k=0.05)
+    net.solve()
+    k = 0.1 + 5 + 1 / (CV_TO_SI * 10) ** 2 + 250 / 40**2
+    assert math.isclose(net.flow("V1"), math.sqrt(250 / k), rel_tol=1e-6)
+    net.set("V1", position=0)
+    net.set("P1", speed=50)
+    net.solve()
+    assert abs(net.flow("P1")) < 1e-6
+    assert math.isclose(net.differential("supply", "suction"), 62.5)
+
+    loop = HydronicLoop(pumps=2, branches=20, pump_commands=[True, False])
+    one_pump = loop.flow()
+    assert loop.pump_flows()[1] == 0
+    # points of a list are wrapped once, when they are bound
+    loop.pump_commands = [FakeBinary("active"), FakeBinary("inactive")]
+    assert all(isinstance(each, BinaryAdapter) for each in loop.pump_commands)
+    assert math.isclose(loop.flow(), one_pump)
+    loop.pump_commands = True
+    flows = loop.pump_flows()
+    assert one_pump < loop.flow() < 2 * one_pump
+    assert math.isclose(flows[0], flows[1])
+    assert math.isclose(sum(loop.branch_flows()), loop.flow())
+    dp = loop.differential_pressure()
+    loop.valve_positions = 30
+    assert loop.differential_pressure() > dp
+    # a slower pump is held shut by its check valve
+    loop.pump_speeds = [100, 50]
+    assert loop.pump_flows()[1] == 0
+
+
+def test_pump_curve():
+    table = dict(
+        flow=[0, 10, 20, 30, 40],
+        head=[250, 245, 225, 185, 130],
+        power=[3, 5, 7, 8.5, 9.5],
+    )
+    curve = Curve(**table)
+    k = curve.system_k(30)
+    flow, head, power = curve.operating_point([50, 100], k)
+    # affinity laws on a system curve without static head
+    assert np.allclose(flow, [15, 30])
+    assert np.allclose(head, [185 / 4, 185])
+    assert np.allclose(power, [8.5 / 8, 8.5])
+    assert curve.operating_flow(100, k, static=300) == 0
+    with pytest.raises(ValueError):
+        Curve(flow=[0, 10], head=[100, 120])
+
+    pump = Pump(curve=table, max_flow=30, succion_pressure=0)
+    result = simulate(
+        pump,
+        {"start_command": True, "modulation": lambda t: np.where(t < 60, 100, 50)},
+        np.arange(0, 120, 1.0),
+    )
+    assert 29 < result["flow"][59] < 31
+    assert 14 < result["flow"][-1] < 16
+    assert 180 < result["pressure"][59] < 190
+    assert result["amperage"][-1] < result["amperage"][59] / 6
+
+
+def test_parallel_pumps():
+    pumps = [Pump(succion_pressure=10, delta_p=5) for _ in range(2)]
+    group = ParallelPumps(members=pumps)
+    # same header : the pressure of one pump, not the sum
+    assert 9 < group.pressure() < 11
+    assert fan.ParallelPumps is ParallelPumps
+
+
+def test_tank():
+    tank = Tank(number_of_switches=7)
+    for i in range(7):
+        tank._add_property("level{}".format(i), i)
+    assert not hasattr(Tank(), "level0")
+    tank.level = 8
+    assert tank.level0() and not tank.level1()
+    tank.level = 50
+    assert tank.proximity() == [True] * 4 + [False] * 3
+
+    clock = VirtualClock()
+    outflow = [0]
+    tank = Tank(
+        volume=1000,
+        inflow=10,
+        outflow=lambda: outflow[0],
+        hysteresis=10,
+        clock=clock.time,
+    )
+    clock.now = 45
+    assert math.isclose(tank.level_percent(), 45)
+    assert tank.proximity() == [True, True, False, False, False]
+    outflow[0] = 20
+    tank.refresh()
+    clock.now = 47
+    # 45 % : switch 2 (50 %) is off, it stays off until 55 %
+    assert math.isclose(tank.level_percent(), 43)
+    assert tank.proximity()[1]
+    clock.now = 50
+    # switch 1 (30 %) stays on down to 25 %
+    tank.level = 28
+    assert tank.proximity()[1]
+    tank.level = 24
+    assert not tank.proximity()[1]
+
+
+def test_snapshot():
+    valve = Valve(entering_temp=60, delta_T=20)
+    updates = []
+    update = valve.update_equipment
+    valve.__dict__["update_equipment"] = lambda: updates.append(update())
+    values = valve.snapshot()
+    assert list(values) == ["leaving_temp", "leaving_flow"]
+    assert len(updates) == 1
+    assert values["leaving_temp"] == valve._temperature.last_value
+
+    now = [0]
+    snapshot = Snapshot(valve, max_age=1, clock=lambda: now[0])
+    temp, flow = snapshot.reader("leaving_temp"), snapshot.reader("leaving_flow")
+    temp(), flow(), temp()
+    assert len(updates) == 2
+    now[0] = 2
+    flow()
+    assert len(updates) == 3
+
+    # outputs not bound to a point are not evaluated
+    def unbound():
+        raise ZeroDivisionError
+
+    valve.__dict__["leaving_flow"] = unbound
+    bound = Snapshot(valve, outputs=["leaving_temp"])
+    assert bound.value("leaving_temp") == valve._temperature.last_value
+    assert list(bound.values()) == ["leaving_temp"]
+
+    ahu = AHU(outdoor_air_temp=-10, return_air_temp=22, damper_command=20)
+    assert list(ahu.snapshot()) == list(AHU.OUTPUTS)
+    assert list(ahu.snapshot(["mixed_air_temp"])) == ["mixed_air_temp"]
+
+
+def test_pid_closed_loop():
+    clock = VirtualClock()
+    pid = PID(
+        ProcessElement(setpoint=30),
+        kp=5,
+        ti=60,
+        direct_acting=False,
+        clock=clock.time,
+    )
+    # heating coil : 20 degC + 20 degC at 100 %
+    plant = TRANSIENT(
+        ValueCommandElement(value=20, command=pid),
+        delta_max=20,
+        tau=60,
+        engine="lag",
+        clock=clock.time,
+    )
+    pid["pv"] = plant
+
+    def run(seconds):
+        for _ in range(seconds):
+            clock.now += 1
+            plant.output
+        return plant.last_value
+
+    assert math.isclose(run(900), 30, abs_tol=0.05)
+    assert math.isclose(pid.last_value, 50, abs_tol=0.5)
+    # unreachable setpoint : output held at 100 % without winding up
+    pid["setpoint"] = 50
+    assert math.isclose(run(900), 40, abs_tol=0.05)
+    assert pid.last_value > 99.9
+    pid["setpoint"] = 30
+    run(5)
+    assert pid.last_value < 100
+    assert math.isclose(run(900), 30, abs_tol=0.05)
+
+    with pytest.raises(ValueError):
+        PID(ProcessElement(), min_output=100, max_output=0)
@@ -8,14 +8,57 @@
 This modules contains helper functions to be used with BAC0 to test
 DDC Sequences of operation
 """
+import math
 import time
 import logging
+from statistics import NormalDist
+
 import pandas as pd
 import numpy as np
 
 log = logging.getLogger("sequence")
 
 
+class Clock(object):
+    """
+    Time source of the wait and check helpers (wall clock by default).
+    """
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    Clock that does not wait : sleep() moves the time forward instantly.
+    Useful when the device is replayed or simulated (no real time needed).
+    """
+
+    def __init__(self, start=0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+clock = Clock()
+
+
+def use_clock(new_clock):
+    """
+    Replace the clock used by the helpers. Returns the previous one.
+    """
+    global clock
+    old, clock = clock, new_clock
+    return old
+
+
 def var_name(point):
     """
     Given a BAC0 point, return a formatted string in the form 
@@ -52,7 +95,7 @@ def wait_for_state(point, state, *, callback=None, timeout=180, log_only=True):
     :param timeout: float
     
     """
-    tout = time.time() + timeout
+    tout = clock.time() + timeout
     while True:
         if point == state:
             add_note(
@@ -60,7 +103,7 @@ def wait_for_state(point, state, *, callback=None, timeout=180, log_only=True):
                 "%s is now in state %s" % (var_name(point), state),
             )
             break
-        elif time.time() > tout:
+        elif clock.time() > tout:
             msg = "Timeout : {} in wrong state ({} != {}) after {} sec".format(
                 var_name(point), format_variable_value(point), state, timeout
             )
@@ -70,7 +113,7 @@ def wait_for_state(point, state, *, callback=None, timeout=180, log_only=True):
             else:
                 add_error(point.properties.device, msg)
                 break
-        time.sleep(2)
+        clock.sleep(2)
     # State is now correct, execute callback
     if callback is not None:
         callback()
@@ -92,7 +135,7 @@ def wait_for_state_not(point, state, *, callback=None, timeout=180, log_only=Tru
     :param timeout: float
     
     """
-    tout = time.time() + timeout
+    tout = clock.time() + timeout
     while True:
         if point != state:
             add_note(
@@ -100,7 +143,7 @@ def wait_for_state_not(point, state, *, callback=None, timeout=180, log_only=Tru
                 "%s left state %s for %s" % (var_name(point), state, point.value),
             )
             break
-        elif time.time() > tout:
+        elif clock.time() > tout:
             msg = "Timeout : {} in wrong state ({} != {}) after {} sec".format(
                 var_name(point), format_variable_value(point), state, timeout
             )
@@ -110,7 +153,7 @@ def wait_for_state_not(point, state, *, callback=None, timeout=180, log_only=Tru
             else:
                 add_error(point.properties.device, msg)
                 break
-        time.sleep(2)
+        clock.sleep(2)
     # State is now correct, execute callback
     if callback is not None:
         callback()
@@ -141,7 +184,7 @@ def wait_for_value_gt(
         else:
             return False
 
-    tout = time.time() + timeout
+    tout = clock.time() + timeout
     while True:
         if point.value > value or test_max(point, maximum):
             add_note(
@@ -150,7 +193,7 @@ def wait_for_value_gt(
                 % (var_name(point), value, format_variable_value(point)),
             )
             break
-        elif time.time() > tout:
+        elif clock.time() > tout:
             msg = "Timeout : {} in wrong state ({} != {}) after {} sec".format(
                 var_name(point), format_variable_value(point), state, timeout
             )
@@ -161,7 +204,7 @@ def wait_for_value_gt(
             else:
                 add_error(point.properties.device, msg)
                 break
-        time.sleep(2)
+        clock.sleep(2)
     # State is now correct, execute callback
     if callback is not None:
         callback()
@@ -192,7 +235,7 @@ def wait_for_value_lt(
         else:
             return False
 
-    tout = time.time() + timeout
+    tout = clock.time() + timeout
     while True:
         if point.value < value or test_min(point, minimum):
             add_note(
@@ -201,7 +244,7 @@ def wait_for_value_lt(
                 % (var_name(point), value, point),
             )
             break
-        elif time.time() > tout:
+        elif clock.time() > tout:
             msg = "Timeout : {} in wrong state ({} != {}) after {} sec".format(
                 var_name(point), format_variable_value(point), state, timeout
             )
@@ -212,7 +255,7 @@ def wait_for_value_lt(
             else:
                 add_error(point.properties.device, msg)
                 break
-        time.sleep(2)
+        clock.sleep(2)
     # State is now correct, execute callback
     if callback is not None:
         callback()
@@ -233,12 +276,12 @@ def check_that(point, value, *, callback=None, timeout=90, log_only=True):
     :param timeout: float
     
     """
-    tout = time.time() + timeout
+    tout = clock.time() + timeout
     while True:
         if point == value:
             add_note(point.properties.device, "%s is %s" % (var_name(point), value))
             break
-        elif time.time() > tout:
+        elif clock.time() > tout:
             msg = "Timeout : {} in wrong state ({} != {}) after {} sec".format(
                 var_name(point), format_variable_value(point), state, timeout
             )
@@ -247,7 +290,7 @@ def check_that(point, value, *, callback=None, timeout=90, log_only=True):
             else:
                 add_error(point.properties.device, msg)
             break
-        time.sleep(2)
+        clock.sleep(2)
     # State is now correct, execute callback
     if callback is not None:
         callback()
@@ -271,14 +314,14 @@ def check_isclose(
     
     """
 
-    tout = time.time() + timeout
+    tout = clock.time() + timeout
     while True:
         if np.isclose(point.value, value, rtol=rtol, atol=atol):
             add_note(
                 point.properties.device, "%s is close to %s" % (var_name(point), value)
             )
             break
-        elif time.time() > tout:
+        elif clock.time() > tout:
             msg = "Timeout : {} is not close to {}, it is {} after {} sec".format(
                 var_name(point), format_variable_value(point), state, timeout
             )
@@ -287,82 +330,155 @@ def check_isclose(
             else:
                 add_error(point.properties.device, msg)
             break
-        time.sleep(2)
+        clock.sleep(2)
     # State is now correct, execute callback
     if callback is not None:
         callback()
 
 
-def detect_rise_in_output(output, timeout=300, minimum=None, maximum=None):
+class TrendDetector(object):
+    """
+    Slope of samples (time, value) updated with each sample (least
+    squares), with a t test telling when it is clearly not noise.
+
+    The test is repeated after each sample, so each look only spends part
+    of the error allowed (1 - confidence) : look k accepts an error of
+    (1 - confidence) * 6 / (pi k)^2, they add up to (1 - confidence).
+
+    :param confidence: float, probability that a detected trend is real
+    :param min_samples: int, samples needed before deciding
+    :param resolution: float, smallest slope (units / s) taken as a trend
+    """
+
+    def __init__(self, confidence=0.99, min_samples=5, resolution=0):
+        self.error = 1 - confidence
+        self.min_samples = max(3, min_samples)
+        self.resolution = resolution
+        self.n = 0
+        self._t = self._y = 0.0
+        self._stt = self._sty = self._syy = 0.0
+
+    def add(self, t, value):
+        # centered sums (Welford), no precision lost on epoch times
+        self.n += 1
+        dt, dy = t - self._t, value - self._y
+        self._t += dt / self.n
+        self._y += dy / self.n
+        self._stt += dt * (t - self._t)
+        self._sty += dt * (value - self._y)
+        self._syy += dy * (value - self._y)
+
+    @property
+    def slope(self):
+        return self._sty / self._stt if self._stt > 0 else 0.0
+
+    def stderr(self):
+        if self.n < 3 or self._stt <= 0:
+            return math.inf
+        residuals = max(0.0, self._syy - self._sty * self.slope)
+        return math.sqrt(residuals / (self.n - 2) / self._stt)
+
+    def critical(self):
+        look = self.n - self.min_samples + 1
+        error = self.error * 6 / (math.pi * look) ** 2
+        z = NormalDist().inv_cdf(1 - error / 2)
+        # Student t from the normal quantile (Cornish-Fisher, first term)
+        return z * (1 + (z ** 2 + 1) / (4 * (self.n - 2)))
+
+    def trend(self):
+        """
+        1 when rising, -1 when dropping, 0 when not clear (yet)
+        """
+        slope = self.slope
+        if self.n < self.min_samples or abs(slope) <= self.resolution:
+            return 0
+        stderr = self.stderr()
+        if stderr == 0 or abs(slope) / stderr > self.critical():
+            return 1 if slope > 0 else -1
+        return 0
+
+
+def _detect_trend(output, direction, timeout, limit, period, confidence):
+    """
+    Sample <output> every <period> until its trend is clear, it reaches
+    <limit> in the expected direction or <timeout> expires.
+    """
+    detector = TrendDetector(confidence=confidence)
+    tout = clock.time() + timeout
+    while True:
+        value = output.value
+        if limit is not None and (value - limit) * direction >= 0:
+            add_note(
+                output.properties.device,
+                "%s has reached %s" % (var_name(output), limit),
+            )
+            return True
+        detector.add(clock.time(), value)
+        trend = detector.trend()
+        if trend:
+            add_note(
+                output.properties.device,
+                "%s is %s (%.3g / sec over %d samples)"
+                % (
+                    var_name(output),
+                    "rising" if trend > 0 else "dropping",
+                    detector.slope,
+                    detector.n,
+                ),
+            )
+            return trend == direction
+        if clock.time() > tout:
+            add_error(
+                output.properties.device,
+                "Timeout : no clear trend for %s after %s sec"
+                % (var_name(output), timeout),
+            )
+            return False
+        clock.sleep(period)
+
+
+def detect_rise_in_output(
+    output, timeout=300, minimum=None, maximum=None, *, period=2, confidence=0.99
+):
     """
     This function will monitor an output and check if there is a growing
     trend. If the output gets higher with time.
-    
-    Three tests will be made and if at least test #3 is greater than test #1 
-    we will consider that the output is rising (success).
-    
+
+    The output is sampled every period and the slope of the samples is
+    tested as they come. The function returns as soon as a rise (success)
+    or a drop (failure) is statistically clear, or when the output reaches
+    maximum (success).
+
     :param output: BAC0.point
     :param minimum: float lowest possible value
     :param maximum: float highest possible value
     :param timeout: float timeout duration in seconds
+    :param period: float seconds between two samples
+    :param confidence: float, higher needs more samples to decide
     """
-    timeout_each_test = (timeout - 3) / 3
-    initial_out_value = output.value
-    wait_for_value_gt(
-        output, initial_out_value, timeout=timeout_each_test, maximum=maximum
-    )
-    time.sleep(20)
-    second_out_value = output.value
-    wait_for_value_gt(
-        output, second_out_value, timeout=timeout_each_test, maximum=maximum
-    )
-    time.sleep(20)
-    third_out_value = output.value
-    wait_for_value_gt(
-        output, third_out_value, timeout=timeout_each_test, maximum=maximum
-    )
-    if (
-        third_out_value > second_out_value and second_out_value > initial_out_value
-    ) or (third_out_value > initial_out_value):
-        return True
-    else:
-        return False
+    return _detect_trend(output, 1, timeout, maximum, period, confidence)
 
 
-def detect_drop_in_output(output, timeout=300, minimum=None, maximum=None):
+def detect_drop_in_output(
+    output, timeout=300, minimum=None, maximum=None, *, period=2, confidence=0.99
+):
     """
     This function will monitor an output and check if there is a droping
     trend. If the output gets lower with time.
-    
-    Three tests will be made and if at least test #3 is less than test #1 
-    we will consider that the output is droping (success).
-    
+
+    The output is sampled every period and the slope of the samples is
+    tested as they come. The function returns as soon as a drop (success)
+    or a rise (failure) is statistically clear, or when the output reaches
+    minimum (success).
+
     :param output: BAC0.point
     :param minimum: float lowest possible value
     :param maximum: float highest possible value
     :param timeout: float timeout duration in seconds
+    :param period: float seconds between two samples
+    :param confidence: float, higher needs more samples to decide
     """
-    timeout_each_test = (timeout - 3) / 3
-    initial_out_value = output.value
-    wait_for_value_lt(
-        output, initial_out_value, timeout=timeout_each_test, minimum=minimum
-    )
-    time.sleep(20)
-    second_out_value = output.value
-    wait_for_value_lt(
-        output, second_out_value, timeout=timeout_each_test, minimum=minimum
-    )
-    time.sleep(20)
-    third_out_value = output.value
-    wait_for_value_lt(
-        output, third_out_value, timeout=timeout_each_test, minimum=minimum
-    )
-    if (
-        third_out_value < second_out_value and second_out_value < initial_out_value
-    ) or (third_out_value < initial_out_value):
-        return True
-    else:
-        return False
+    return _detect_trend(output, -1, timeout, minimum, period, confidence)
 
 
 def format_variable_value(point):
@@ -390,6 +506,7 @@ def adjust(point, value):
     
     :param point: BAC0.point
     :param value: float or str
+    :returns: True when the value was written
     """
     try:
         point._set(value)
@@ -404,6 +521,8 @@ def adjust(point, value):
             "%s has not been adjusted to %s and is still %s (%s)"
             % (var_name(point), value, format_variable_value(point), e),
         )
+        return False
+    return True
 
 
 def which_pump(pump_1, pump_2):
@@ -4,6 +4,9 @@
 # Copyright (C) 2015 by Christian Tremblay, P.Eng <christian.tremblay@servisys.com>
 #
 # Licensed under LGPLv3, see file LICENSE in this source tree.
+from ...conditions import read_values, state_of
+
+
 class Occupancy(object):
     def to_occupied(self):
         self.note("Switching to occupied")
@@ -300,35 +303,27 @@ class Sensors_Feedback(object):
         dat = mat - (self.number_clg_stages() * 4) + (self.number_htg_stages() * 5)
         return dat
 
+    def _stages_on(self, names):
+        # every stage command from one read per device
+        points = [self.controller[name] for name in names]
+        return sum(
+            state_of(point, value) == True
+            for point, value in zip(points, read_values(points))
+        )
+
     def number_clg_stages(self):
-        num = 0
-        if self.controller["CLG1-C"] == True:
-            num += 1
-        if self.controller["CLG2-C"] == True:
-            num += 1
-        if self.controller["CLG3-C"] == True:
-            num += 1
-        if self.controller["CLG4-C"] == True:
-            num += 1
-        return num
+        return self._stages_on(("CLG1-C", "CLG2-C", "CLG3-C", "CLG4-C"))
 
     def number_htg_stages(self):
-        num = 0
-        if self.controller["HTG1-C"] == True:
-            num += 1
-        if self.controller["HTG2-C"] == True:
-            num += 1
-        # if self.controller['HTG3-C']:
-        #    num += 1
-        # if self.controller['HTG4-C']:
-        #    num += 1
-        return num
+        # HTG3-C and HTG4-C are not wired
+        return self._stages_on(("HTG1-C", "HTG2-C"))
 
     def fake_mat(self):
-        fresh_air_pct = self.controller["OAD-O"].value / 100
-        mat = (self.controller["OA-T"] * fresh_air_pct) + (
-            self.controller["RA-T"] * (1 - fresh_air_pct)
+        oad, oat, rat = read_values(
+            [self.controller[name] for name in ("OAD-O", "OA-T", "RA-T")]
         )
+        fresh_air_pct = oad / 100
+        mat = (oat * fresh_air_pct) + (rat * (1 - fresh_air_pct))
         return mat
 
     def fake_rat(self):